@@ -0,0 +1,337 @@
+import asyncio
+import threading
+from time import time
+from collections import deque
+from asyncio.subprocess import PIPE, STDOUT
+from chec_operator.utils import filepaths
+from chec_operator.camera_server.communicator import Communicator
+from chec_operator.camera_server.stats import CommandStats
+
+
+class AsyncCommunicator:
+    """
+    asyncio-based connection to control_cs. The stdout of the subprocess is
+    read without blocking the event loop, and every line of a reply must
+    arrive within `timeout` seconds, otherwise the command is abandoned.
+
+    After an abandoned command, the next one is preceded by a sentinel (see
+    `Communicator._resync`) and everything up to the sentinel is discarded,
+    so a late reply does not get attributed to the following command.
+    Output that is not a reply (neither prompt-prefixed nor exactly the
+    done marker) is kept in a bounded log instead.
+    """
+    def __init__(self, timeout=10, log_size=1000):
+        self.cs = None
+        self.beginning = b'CS> '
+        self.get_done = "done"
+        self.set_done = "done"
+        self.timeout = timeout
+        self._lock = None
+        self._desynced = False
+        self._syncs = 0
+        self._prompt_consumed = False
+        self.log = deque(maxlen=log_size)
+        self.stats = CommandStats()
+
+    @property
+    def lock(self):
+        # Created lazily so that it belongs to the running event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def connect(self, ip='0.0.0.0',
+                      log_path=filepaths.default_paths.log, exe_path=None):
+        if self.cs:
+            print("[ERROR] Server already connected, disconnect first")
+            return
+        if exe_path is None:
+            exe_path = filepaths.default_paths.exe
+        print("Connecting to camera sever:")
+        print("\t exe: {}".format(exe_path))
+        print("\t ip: {}".format(ip))
+        print("\t log: {}".format(log_path))
+        cmd = "{} {} -f {} --trust\n".format(exe_path, ip, log_path)
+        print(cmd)
+
+        try:
+            p = await asyncio.create_subprocess_shell(cmd, stdin=PIPE,
+                                                      stdout=PIPE,
+                                                      stderr=STDOUT)
+        except OSError:
+            print("[ERROR] Invalid cmd for subprocess: {}".format(cmd))
+            raise
+        try:
+            banner = await asyncio.wait_for(
+                p.stdout.readuntil(self.beginning), self.timeout
+            )
+            print(banner)
+        except asyncio.TimeoutError:
+            print("[WARNING] No prompt received from camera server")
+        except asyncio.IncompleteReadError:
+            print("[ERROR] Camera server exited during connection")
+            raise
+        self.cs = p
+        self._desynced = False
+        # The prompt was read above, it is put back in front of the next line
+        self._prompt_consumed = True
+        print("CONNECTED")
+
+    async def disconnect(self):
+        if not self.cs:
+            print("[ERROR] No server connected")
+            return
+        print("Disconnecting from camera server")
+        self.cs.stdin.write(b"exit\n")
+        await self.cs.stdin.drain()
+        self.cs = None
+        print("DISCONNECTED")
+
+    def is_response(self, line):
+        # As in `StdoutDemultiplexer.is_response`
+        return (line.startswith(self.beginning) or
+                line.strip() == self.get_done.encode())
+
+    async def _read_line(self):
+        line = await self.cs.stdout.readline()
+        if self._prompt_consumed and line:
+            self._prompt_consumed = False
+            line = self.beginning + line
+        return line
+
+    async def _read_reply_line(self):
+        while True:
+            line = await self._read_line()
+            if not line or self.is_response(line):
+                return line
+            self.log.append(line)
+
+    async def readline(self, timeout=None):
+        """
+        Reads the next reply line from the stdout of control_cs. Raises
+        TimeoutError if it was not received within timeout seconds.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            line = await asyncio.wait_for(self._read_reply_line(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError
+        return line.decode()
+
+    async def _discard_until(self, marker):
+        while True:
+            line = await self._read_line()
+            if not line:
+                return
+            self.log.append(line)
+            if marker in line:
+                return
+
+    async def _resync(self):
+        """
+        Sends a sentinel after a failed command and discards every line up
+        to it, as in `Communicator._resync`. Returns False if the sentinel
+        was not seen within the timeout.
+        """
+        if not self._desynced:
+            return True
+        self._syncs += 1
+        sentinel = "chec_operator_sync{}".format(self._syncs)
+        self.cs.stdin.write("{}\n".format(sentinel).encode())
+        await self.cs.stdin.drain()
+        try:
+            await asyncio.wait_for(self._discard_until(sentinel.encode()),
+                                   self.timeout)
+        except asyncio.TimeoutError:
+            print("[WARNING] No answer from control_cs to {}"
+                  .format(sentinel))
+            return False
+        self._desynced = False
+        return True
+
+    async def _send(self, cmds):
+        """
+        Writes the commands to control_cs. Returns False if they were not
+        sent because control_cs could not be resynchronised.
+        """
+        if not await self._resync():
+            return False
+        batch = "".join("{}\n".format(cmd) for cmd in cmds)
+        self.cs.stdin.write(batch.encode())
+        await self.cs.stdin.drain()
+        return True
+
+    async def _read_get_response(self, cmd, timeout, start):
+        try:
+            line = await self.readline(timeout)
+            response = line.replace(self.beginning.decode(), '').strip()
+            done = (await self.readline(timeout)).strip()
+        except TimeoutError:
+            self.stats.record_timeout(cmd)
+            self._desynced = True
+            raise
+        if self.get_done not in done:
+            print("[ERROR] {} unexpected readline response".format(cmd))
+            self.stats.record_error(cmd)
+            self._desynced = True
+            raise ValueError
+        self.stats.record(cmd, time() - start)
+        return response
+
+    async def get(self, cmd, timeout=None):
+        response = None
+        if self.cs:
+            async with self.lock:
+                if not await self._send([cmd]):
+                    return response
+                start = time()
+                try:
+                    response = await self._read_get_response(cmd, timeout,
+                                                             start)
+                except TimeoutError:
+                    print("[WARNING] {} timeout".format(cmd))
+        return response
+
+    async def get_many(self, cmds, timeout=None):
+        """
+        Pipelined `get`: all commands are written before any reply is read.
+        The deadline applies to each reply line individually. If any reply
+        times out or is unexpected the whole batch is discarded, as later
+        replies may be shifted. Latencies are recorded as in
+        `Communicator._get_many`.
+        """
+        responses = [None] * len(cmds)
+        if self.cs:
+            async with self.lock:
+                if not await self._send(cmds):
+                    return responses
+                start = time()
+                previous = start
+                for i, cmd in enumerate(cmds):
+                    try:
+                        responses[i] = await self._read_get_response(
+                            cmd, timeout, previous
+                        )
+                    except TimeoutError:
+                        print("[WARNING] {} timeout".format(cmd))
+                        self.stats.record_timeout("batch")
+                        return [None] * len(cmds)
+                    except ValueError:
+                        self.stats.record_error("batch")
+                        return [None] * len(cmds)
+                    previous = time()
+                self.stats.record("batch", previous - start)
+        return responses
+
+    async def set(self, cmd, timeout=None):
+        if self.cs:
+            print("Sending cmd: {}".format(cmd))
+            async with self.lock:
+                if not await self._send([cmd]):
+                    print("[ERROR] {} not sent, control_cs is not "
+                          "responding".format(cmd))
+                    return
+                start = time()
+                try:
+                    done = (await self.readline(timeout)).strip()
+                except TimeoutError:
+                    print("[WARNING] {} timeout".format(cmd))
+                    self.stats.record_timeout(cmd)
+                    self._desynced = True
+                    return
+                if self.set_done not in done:
+                    print("[ERROR] {} unexpected readline response"
+                          .format(cmd))
+                    self.stats.record_error(cmd)
+                    self._desynced = True
+                    raise ValueError
+                self.stats.record(cmd, time() - start)
+            print("SUCCESS")
+        else:
+            print("[WARNING] No connection to camera server")
+
+    async def get_status(self, fields=None):
+        queries = Communicator.status_queries
+        if fields is not None:
+            queries = [q for q in queries if q[0] in fields]
+        if not queries:
+            return dict()
+        responses = await self.get_many([cmd for _, cmd, _ in queries])
+        status = dict()
+        for (field, _, parser), response in zip(queries, responses):
+            parse = getattr(Communicator, parser)
+            try:
+                status[field] = parse(response)
+            except (ValueError, KeyError):
+                print("[ERROR] Unexpected {} response: {}"
+                      .format(field, response))
+                status[field] = parse(None)
+        return status
+
+
+class AsyncCommunicatorFacade(Communicator):
+    """
+    Blocking drop-in replacement for `Communicator`, backed by an
+    `AsyncCommunicator` whose event loop runs in a daemon thread. A hung
+    control_cs reply costs at most `timeout` seconds instead of freezing
+    the caller.
+    """
+    def __init__(self, timeout=10):
+        self.async_communicator = AsyncCommunicator(timeout)
+        super().__init__()
+        self.timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever)
+        self._loop_thread.daemon = True
+        self._loop_thread.start()
+
+    # The connection state lives in the `AsyncCommunicator`, the
+    # attributes set by `Communicator.__init__` are forwarded to it
+
+    @property
+    def cs(self):
+        return self.async_communicator.cs
+
+    @cs.setter
+    def cs(self, val):
+        self.async_communicator.cs = val
+
+    @property
+    def stats(self):
+        return self.async_communicator.stats
+
+    @stats.setter
+    def stats(self, val):
+        self.async_communicator.stats = val
+
+    @property
+    def timeout(self):
+        return self.async_communicator.timeout
+
+    @timeout.setter
+    def timeout(self, val):
+        self.async_communicator.timeout = val
+
+    def get_log(self):
+        log = list(self.async_communicator.log)
+        return [line.decode(errors='replace') for line in log]
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def connect(self, ip='0.0.0.0', log_path=filepaths.default_paths.log,
+                exe_path=None):
+        self._run(self.async_communicator.connect(ip, log_path, exe_path))
+
+    def disconnect(self):
+        self._run(self.async_communicator.disconnect())
+
+    def _get(self, cmd):
+        return self._run(self.async_communicator.get(cmd))
+
+    def _get_many(self, cmds):
+        return self._run(self.async_communicator.get_many(cmds))
+
+    def _set(self, cmd):
+        self._run(self.async_communicator.set(cmd))
@@ -0,0 +1,138 @@
+from time import time
+from threading import RLock
+from chec_operator.camera_server.communicator import Communicator
+
+
+class CachedCommunicator:
+    """
+    Cache of the configuration file paths, wrapped around any communicator
+    (`Communicator`, `AsyncCommunicatorFacade` or `DummyCommunicator`).
+
+    The paths only change through our own setters. As a set may time out
+    or be refused without the communicator telling, a set path is not
+    cached but invalidated, so the next status refresh reads back what the
+    camera server actually has. Cached paths are revalidated against the
+    camera server every `interval` seconds, and after every state
+    transition, connection or disconnection. Everything else is delegated
+    to the wrapped communicator unchanged.
+    """
+    filetypes = ['config', 'monitorconfig', 'settings', 'run', 'hv', 'led',
+                 'trigger']
+
+    def __init__(self, communicator, interval=30):
+        self._communicator = communicator
+        self.interval = interval
+        self._paths = dict()
+        self._updated = dict()
+        self._lock = RLock()
+
+    def __getattr__(self, name):
+        return getattr(self._communicator, name)
+
+    def invalidate(self, filetype=None):
+        with self._lock:
+            if filetype is None:
+                self._updated = dict()
+            else:
+                self._updated.pop(filetype, None)
+
+    def _valid(self, filetype):
+        t = self._updated.get(filetype)
+        return t is not None and time() - t < self.interval
+
+    def _store(self, filetype, fp):
+        # Empty paths are what the communicator returns when disconnected
+        # or on timeout, they are never cached
+        if fp:
+            self._paths[filetype] = fp
+            self._updated[filetype] = time()
+
+    def _get_path(self, filetype):
+        with self._lock:
+            if self._communicator.cs and self._valid(filetype):
+                return self._paths[filetype]
+            getter = "get_{}_filepath".format(filetype)
+            fp = getattr(self._communicator, getter)()
+            if self._communicator.cs:
+                self._store(filetype, fp)
+            return fp
+
+    def _set_path(self, filetype, fp, default):
+        with self._lock:
+            setter = "set_{}_filepath".format(filetype)
+            getattr(self._communicator, setter)(fp, default)
+            self.invalidate(filetype)
+
+    def get_status(self, fields=None):
+        with self._lock:
+            if fields is None:
+                fields = [f for f, _, _ in Communicator.status_queries]
+            cached = dict()
+            if self._communicator.cs:
+                for filetype in self.filetypes:
+                    field = filetype + 'path'
+                    if field in fields and self._valid(filetype):
+                        cached[field] = self._paths[filetype]
+            fields = [f for f in fields if f not in cached]
+            status = self._communicator.get_status(fields)
+            if self._communicator.cs:
+                for filetype in self.filetypes:
+                    field = filetype + 'path'
+                    if field in status:
+                        self._store(filetype, status[field])
+            status.update(cached)
+            return status
+
+    def connect(self, *args, **kwargs):
+        self.invalidate()
+        self._communicator.connect(*args, **kwargs)
+
+    def disconnect(self):
+        self.invalidate()
+        self._communicator.disconnect()
+
+    def go_to_state(self, state):
+        self._communicator.go_to_state(state)
+        self.invalidate()
+
+    def get_config_filepath(self):
+        return self._get_path('config')
+
+    def get_monitorconfig_filepath(self):
+        return self._get_path('monitorconfig')
+
+    def get_settings_filepath(self):
+        return self._get_path('settings')
+
+    def get_run_filepath(self):
+        return self._get_path('run')
+
+    def get_hv_filepath(self):
+        return self._get_path('hv')
+
+    def get_led_filepath(self):
+        return self._get_path('led')
+
+    def get_trigger_filepath(self):
+        return self._get_path('trigger')
+
+    def set_config_filepath(self, fp='', default=False):
+        self._set_path('config', fp, default)
+
+    def set_monitorconfig_filepath(self, fp='', default=False):
+        self._set_path('monitorconfig', fp, default)
+
+    def set_settings_filepath(self, fp='', default=False):
+        self._set_path('settings', fp, default)
+
+    def set_run_filepath(self, fp='', default=False):
+        self._set_path('run', fp, default)
+
+    def set_hv_filepath(self, fp='', default=False):
+        self._set_path('hv', fp, default)
+
+    def set_led_filepath(self, fp='', default=False):
+        self._set_path('led', fp, default)
+
+    def set_trigger_filepath(self, fp='', default=False):
+        self._set_path('trigger', fp, default)
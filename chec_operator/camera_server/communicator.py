@@ -1,6 +1,8 @@
 from time import sleep, time
 import subprocess
 from chec_operator.utils import filepaths
+from chec_operator.camera_server.demultiplexer import StdoutDemultiplexer
+from chec_operator.camera_server.stats import CommandStats
 from chec_operator.utils.enums import OnOffState, CameraState, \
     CameraTriggerSettings
 
@@ -8,30 +10,29 @@ from chec_operator.utils.enums import OnOffState, CameraState, \
 class Communicator:
     def __init__(self):
         self.cs = None
+        self.demux = None
         self.beginning = b'CS> '
         self.get_done = "done"
         self.set_done = "done"
         self.timeout = 10
-
-    def readable(self, p, timeout):
-        return not p.stdout.peek() == self.beginning
-        t = time()+timeout
-        while True:
-            r = not p.stdout.peek() == self.beginning
-            if r:
-                return True
-            if time() > t:
-                return False
-
-    def connect(self, ip='0.0.0.0', log_path=filepaths.default_paths.log):
+        # Set when a reply timed out or was unexpected, so that late reply
+        # lines may still arrive and must be flushed before the next command
+        self._desynced = False
+        self._syncs = 0
+        self.stats = CommandStats()
+
+    def connect(self, ip='0.0.0.0', log_path=filepaths.default_paths.log,
+                exe_path=None):
         """
-        Returns a subprocess with stdin as blocking pipe and stdout as
-        non-blocking pipe.
+        Starts control_cs as a subprocess. Its stdout is consumed by a
+        `StdoutDemultiplexer` thread, which separates command replies from
+        the banner and any other unsolicited output.
         """
         if self.cs:
             print("[ERROR] Server already connected, disconnect first")
             return
-        exe_path = filepaths.default_paths.exe
+        if exe_path is None:
+            exe_path = filepaths.default_paths.exe
         print("Connecting to camera sever:")
         print("\t exe: {}".format(exe_path))
         print("\t ip: {}".format(ip))
@@ -44,10 +45,9 @@ class Communicator:
                                  stdin=subprocess.PIPE,
                                  stdout=subprocess.PIPE,
                                  stderr=subprocess.STDOUT)
-            while self.readable(p, 1):
-                line = p.stdout.readline()
-                print(line)
-            print("here")
+            self.demux = StdoutDemultiplexer(p.stdout, self.beginning,
+                                             self.get_done.encode())
+            self.demux.start()
             self.cs = p
         except OSError:
             print("[ERROR] Invalid cmd for subprocess: {}".format(cmd))
@@ -62,7 +62,7 @@ class Communicator:
         self.cs.stdin.write(b"exit\n")
         self.cs.stdin.flush()
         # try:
-        #     done = self.readline(self.cs, self.timeout).strip()
+        #     done = self.readline(self.timeout).strip()
         #     if not done == self.done:
         #         raise ValueError
         # except TimeoutError:
@@ -71,187 +71,309 @@ class Communicator:
         #     print("[ERROR] disconnect incorrect done string")
         #     raise
         self.cs = None
+        self.demux = None
+        self._desynced = False
         print("DISCONNECTED")
 
-    def readline(self, p, timeout=1.0):
+    def readline(self, timeout=1.0):
+        """
+        Returns the next reply line from control_cs. Raises TimeoutError if
+        no reply was received within timeout seconds.
+        """
+        return self.demux.get_response(timeout).decode()
+
+    def get_log(self):
+        """
+        Returns the most recent output of control_cs that was not a reply
+        to a command.
+        """
+        if self.demux:
+            return self.demux.get_log()
+        return []
+
+    def _resync(self):
+        """
+        Makes sure no late reply of a timed out command can be read as the
+        reply to the next one. After a failure, an unknown command with a
+        unique name is sent as a sentinel: control_cs answers commands in
+        order, so once it logs the sentinel every earlier reply has arrived
+        and is discarded. Returns False if the sentinel was not seen within
+        the timeout, in which case the next command should not be sent.
         """
-        Reads a line from a process's stdout. Raises TimeoutError if no data
-        was available within timeout seconds. Careful, this will hang
-        if bytes are received within the given timeout, but no newline
-        is encountered.
+        if not self._desynced:
+            self.demux.clear_responses()
+            return True
+        self._syncs += 1
+        sentinel = "chec_operator_sync{}".format(self._syncs)
+        self.demux.expect(sentinel.encode())
+        self.cs.stdin.write("{}\n".format(sentinel).encode())
+        self.cs.stdin.flush()
+        if not self.demux.marker_seen.wait(self.timeout):
+            print("[WARNING] No answer from control_cs to {}"
+                  .format(sentinel))
+            return False
+        self._desynced = False
+        return True
+
+    def _read_get_response(self, cmd, start):
+        """
+        Reads the reply to a get command, recording the time elapsed since
+        `start` in the command statistics.
         """
-        # if not self.readable(p, timeout):
-        #     raise TimeoutError
-        # else:
-        line = p.stdout.readline().decode()
-        # print("line:", line)
-        # print(type(line))
-        return line
+        response = None
+        try:
+            line = self.readline(self.timeout)
+            response = line.replace(self.beginning.decode(), '').strip()
+            done = self.readline(self.timeout).strip()
+            if self.get_done not in done:
+                raise ValueError
+        except TimeoutError:
+            print("[WARNING] {} timeout".format(cmd))
+            self.stats.record_timeout(cmd)
+            self._desynced = True
+            raise
+        except ValueError:
+            print("[ERROR] {} unexpected readline response".format(cmd))
+            self.stats.record_error(cmd)
+            self._desynced = True
+            raise
+        self.stats.record(cmd, time() - start)
+        return response
 
     def _get(self, cmd):
         response = None
         if self.cs:
             # print("Sending cmd: {}".format(cmd))
+            if not self._resync():
+                return None
+            start = time()
             self.cs.stdin.write("{}\n".format(cmd).encode())
             self.cs.stdin.flush()
             try:
-                line = self.readline(self.cs, self.timeout)
-                response = line.replace(self.beginning.decode(), '').strip()
-                done = self.readline(self.cs, self.timeout).strip()
-                if self.get_done not in done:
-                    raise ValueError
+                response = self._read_get_response(cmd, start)
             except TimeoutError:
-                print("[WARNING] {} timeout".format(cmd))
-            except ValueError:
-                print("[ERROR] {} unexpected readline response".format(cmd))
-                raise
+                pass
             # print("SUCCESS")
         return response
 
+    def _get_many(self, cmds):
+        """
+        Pipelined version of `_get`. Every command is written to control_cs
+        before any reply is read, so the whole set costs roughly one round
+        trip instead of one per command. Replies are returned in the order
+        of `cmds`. As replies carry no command identifier, a single lost
+        reply would shift every later one, so if any reply times out or is
+        unexpected the whole batch is discarded (all None).
+
+        The latency recorded for each command is the time since the
+        previous reply, i.e. its share of the batch. The whole batch is
+        recorded under the name "batch".
+        """
+        responses = [None] * len(cmds)
+        if self.cs:
+            batch = "".join("{}\n".format(cmd) for cmd in cmds)
+            if not self._resync():
+                return responses
+            start = time()
+            self.cs.stdin.write(batch.encode())
+            self.cs.stdin.flush()
+            previous = start
+            for i, cmd in enumerate(cmds):
+                try:
+                    responses[i] = self._read_get_response(cmd, previous)
+                except (TimeoutError, ValueError):
+                    # The replies of the rest of the batch may still come,
+                    # they are flushed by the next `_resync`
+                    self.stats.record_timeout("batch")
+                    return [None] * len(cmds)
+                previous = time()
+            self.stats.record("batch", previous - start)
+        return responses
+
     def _set(self, cmd):
         if self.cs:
             print("Sending cmd: {}".format(cmd))
+            if not self._resync():
+                print("[ERROR] {} not sent, control_cs is not responding"
+                      .format(cmd))
+                return
+            start = time()
             self.cs.stdin.write("{}\n".format(cmd).encode())
             self.cs.stdin.flush()
             try:
-                done = self.readline(self.cs, self.timeout).strip()
+                done = self.readline(self.timeout).strip()
                 print(done, self.set_done, self.set_done in done)
                 if self.set_done not in done:
                     raise ValueError
+                self.stats.record(cmd, time() - start)
             except TimeoutError:
                 print("[WARNING] {} timeout".format(cmd))
+                self.stats.record_timeout(cmd)
+                self._desynced = True
             except ValueError:
                 print("[ERROR] {} unexpected readline response".format(cmd))
+                self.stats.record_error(cmd)
+                self._desynced = True
                 raise
             print("SUCCESS")
         else:
             print("[WARNING] No connection to camera server")
 
-    def get_current_state(self):
-        response = self._get('state')
+    # Queries that make up a full status snapshot, as
+    # (ServerStatus attribute, control_cs command, response parser)
+    status_queries = [
+        ('state', 'state', '_parse_state'),
+        ('transitions', 'transition', '_parse_transitions'),
+        ('hv', 'hvch', '_parse_onoff'),
+        ('flasher', 'flch', '_parse_onoff'),
+        ('data_sending', 'dach', '_parse_onoff'),
+        ('configpath', 'getconfig', '_parse_filepath'),
+        ('monitorconfigpath', 'getmon', '_parse_filepath'),
+        ('settingspath', 'getset', '_parse_filepath'),
+        ('runpath', 'getrun', '_parse_filepath'),
+        ('hvpath', 'gethv', '_parse_filepath'),
+        ('ledpath', 'getled', '_parse_filepath'),
+        ('triggerpath', 'gettrigger', '_parse_filepath'),
+        ('camera_trigger', 'trch', '_parse_trigger_type'),
+    ]
+
+    @staticmethod
+    def _parse_state(response):
         if response:
             state = CameraState[response.upper().split()[-1]]
         else:
             state = CameraState.UNKNOWN
-        # print("Current camera state: {}".format(state))
         return state
 
-    def get_allowed_transitions(self):
-        response = self._get('transition')
+    @staticmethod
+    def _parse_transitions(response):
         if response:
             transitions_str = response.lower().split()
             transitions = [CameraState[s.upper()] for s in transitions_str]
         else:
             transitions = []
-        # print("Allowed state transitions: {}".format(transitions))
         return transitions
 
-    def get_hv_status(self):
-        response = self._get('hvch')
+    @staticmethod
+    def _parse_onoff(response):
         if response:
-            hv = OnOffState(int(response.split()[-1]))
+            onoff = OnOffState(int(response.split()[-1]))
         else:
-            hv = OnOffState.MAYBEON
-        # print("Current hv state: {}".format(hv.name))
-        return hv
+            onoff = OnOffState.MAYBEON
+        return onoff
 
-    def get_flasher_status(self):
-        response = self._get('flch')
+    @staticmethod
+    def _parse_filepath(response):
         if response:
-            flasher = OnOffState(int(response.split()[-1]))
+            fp = response.split()[-1]
         else:
-            flasher = OnOffState.MAYBEON
-        # print("Current flasher state: {}".format(flasher.name))
-        return flasher
+            fp = ""
+        return fp
 
-    def get_data_sending_status(self):
-        response = self._get('dach')
+    @staticmethod
+    def _parse_trigger_type(response):
         if response:
-            ds = OnOffState(int(response.split()[-1]))
+            trigger = CameraTriggerSettings(int(response.split()[-1]))
         else:
-            ds = OnOffState.MAYBEON
-        # print("Current data sending state: {}".format(ds.name))
-        return ds
+            trigger = CameraTriggerSettings.UNKNOWN
+        return trigger
 
-    def get_config_filepath(self):
-        response = self._get('getconfig')
+    @staticmethod
+    def _parse_count(response):
         if response:
-            fp = response.split()[-1]
+            count = int(response.split()[-1])
         else:
-            fp = ""
-        # print("Current config filepath: {}".format(fp))
-        return fp
+            count = 0
+        return count
+
+    def _get_parsed(self, cmd, parse):
+        """
+        Sends a get command and parses its reply. A reply that cannot be
+        parsed (e.g. a line left over from a timed out command) is reported
+        and treated as no reply, like in `get_status`.
+        """
+        response = None
+        try:
+            response = self._get(cmd)
+            return parse(response)
+        except (ValueError, KeyError):
+            print("[ERROR] Unexpected {} response: {}".format(cmd, response))
+            return parse(None)
+
+    def get_status(self, fields=None):
+        """
+        Obtain the values of the status snapshot with a single pipelined
+        exchange with control_cs.
+
+        Parameters
+        ----------
+        fields : list
+            `ServerStatus` attribute names to query. All are queried if
+            None.
+
+        Returns
+        -------
+        dict
+            Parsed values keyed by their `ServerStatus` attribute name.
+        """
+        queries = self.status_queries
+        if fields is not None:
+            queries = [q for q in queries if q[0] in fields]
+        if not queries:
+            return dict()
+        responses = self._get_many([cmd for _, cmd, _ in queries])
+        status = dict()
+        for (field, _, parser), response in zip(queries, responses):
+            parse = getattr(self, parser)
+            try:
+                status[field] = parse(response)
+            except (ValueError, KeyError):
+                print("[ERROR] Unexpected {} response: {}"
+                      .format(field, response))
+                status[field] = parse(None)
+        return status
+
+    def get_current_state(self):
+        return self._get_parsed('state', self._parse_state)
+
+    def get_allowed_transitions(self):
+        return self._get_parsed('transition', self._parse_transitions)
+
+    def get_hv_status(self):
+        return self._get_parsed('hvch', self._parse_onoff)
+
+    def get_flasher_status(self):
+        return self._get_parsed('flch', self._parse_onoff)
+
+    def get_data_sending_status(self):
+        return self._get_parsed('dach', self._parse_onoff)
+
+    def get_config_filepath(self):
+        return self._get_parsed('getconfig', self._parse_filepath)
 
     def get_monitorconfig_filepath(self):
-        response = self._get('getmon')
-        if response:
-            fp = response.split()[-1]
-        else:
-            fp = ""
-        # print("Current monitorconfig filepath: {}".format(fp))
-        return fp
+        return self._get_parsed('getmon', self._parse_filepath)
 
     def get_settings_filepath(self):
-        response = self._get('getset')
-        if response:
-            fp = response.split()[-1]
-        else:
-            fp = ""
-        # print("Current settings filepath: {}".format(fp))
-        return fp
+        return self._get_parsed('getset', self._parse_filepath)
 
     def get_run_filepath(self):
-        response = self._get('getrun')
-        if response:
-            fp = response.split()[-1]
-        else:
-            fp = ""
-        # print("Current run filepath: {}".format(fp))
-        return fp
+        return self._get_parsed('getrun', self._parse_filepath)
 
     def get_hv_filepath(self):
-        response = self._get('gethv')
-        if response:
-            fp = response.split()[-1]
-        else:
-            fp = ""
-        # print("Current hv filepath: {}".format(fp))
-        return fp
+        return self._get_parsed('gethv', self._parse_filepath)
 
     def get_led_filepath(self):
-        response = self._get('getled')
-        if response:
-            fp = response.split()[-1]
-        else:
-            fp = ""
-        # print("Current hv filepath: {}".format(fp))
-        return fp
+        return self._get_parsed('getled', self._parse_filepath)
 
     def get_trigger_filepath(self):
-        response = self._get('gettrigger')
-        if response:
-            fp = response.split()[-1]
-        else:
-            fp = ""
-        # print("Current trigger filepath: {}".format(fp))
-        return fp
+        return self._get_parsed('gettrigger', self._parse_filepath)
 
     def get_trigger_type(self):
-        response = self._get('trch')
-        if response:
-            trigger = CameraTriggerSettings(int(response.split()[-1]))
-        else:
-            trigger = CameraTriggerSettings.UNKNOWN
-        # print("Current hv state: {}".format(hv.name))
-        return trigger
+        return self._get_parsed('trch', self._parse_trigger_type)
 
     def get_backplane_trigger_count(self):
-        response = self._get('trch')
-        if response:
-            count = int(response.split()[-1])
-        else:
-            count = 0
-        return count
+        return self._get_parsed('trch', self._parse_count)
 
     def go_to_state(self, state):
         self._set('to{}'.format(state.name.lower()))
@@ -336,6 +458,7 @@ class DummyCommunicator:
             cs.FAULT: [cs.MAINTENANCE]
         }
         self.cs = None
+        self.stats = CommandStats()
         self.current_state = CameraState.READY#OFF
         self.hv_state = OnOffState.OFF
         self.flasher_state = OnOffState.OFF
@@ -359,11 +482,13 @@ class DummyCommunicator:
         self.led_filepath = self.default_hv_filepath
         self.trigger_filepath = self.default_hv_filepath
 
-    def connect(self, ip='0.0.0.0', log_path=filepaths.default_paths.log):
+    def connect(self, ip='0.0.0.0', log_path=filepaths.default_paths.log,
+                exe_path=None):
         if self.cs:
             print("[ERROR] Server already connected, disconnect first")
             return
-        exe_path = filepaths.default_paths.exe
+        if exe_path is None:
+            exe_path = filepaths.default_paths.exe
         print("Connecting to camera sever:")
         print("\t exe: {}".format(exe_path))
         print("\t ip: {}".format(ip))
@@ -469,6 +594,48 @@ class DummyCommunicator:
             setting = self.trigger_type
         return setting
 
+    @staticmethod
+    def _parse_count(response):
+        if response:
+            count = int(response.split()[-1])
+        else:
+            count = 0
+        return count
+
+    def _get_parsed(self, cmd, parse):
+        """
+        Sends a get command and parses its reply. A reply that cannot be
+        parsed (e.g. a line left over from a timed out command) is reported
+        and treated as no reply, like in `get_status`.
+        """
+        response = None
+        try:
+            response = self._get(cmd)
+            return parse(response)
+        except (ValueError, KeyError):
+            print("[ERROR] Unexpected {} response: {}".format(cmd, response))
+            return parse(None)
+
+    def get_status(self, fields=None):
+        status = dict(
+            state=self.get_current_state(),
+            transitions=self.get_allowed_transitions(),
+            hv=self.get_hv_status(),
+            flasher=self.get_flasher_status(),
+            data_sending=self.get_data_sending_status(),
+            configpath=self.get_config_filepath(),
+            monitorconfigpath=self.get_monitorconfig_filepath(),
+            settingspath=self.get_settings_filepath(),
+            runpath=self.get_run_filepath(),
+            hvpath=self.get_hv_filepath(),
+            ledpath=self.get_led_filepath(),
+            triggerpath=self.get_trigger_filepath(),
+            camera_trigger=self.get_trigger_type(),
+        )
+        if fields is not None:
+            status = {k: v for k, v in status.items() if k in fields}
+        return status
+
     def get_backplane_trigger_count(self):
         self.backplane_trigger_count += 1
         return self.backplane_trigger_count
@@ -0,0 +1,79 @@
+import threading
+from collections import deque
+from queue import Queue, Empty
+
+
+class StdoutDemultiplexer(threading.Thread):
+    """
+    Continuously consumes the stdout of control_cs in a daemon thread.
+
+    Lines that begin with the prompt, or that are exactly the done marker,
+    are replies to commands and are placed on the response queue. Everything
+    else (the banner, log messages, warnings) is kept in a bounded ring
+    buffer so stray output can never be mistaken for a reply.
+
+    A line containing the marker set with `expect` discards every reply
+    queued before it and sets `marker_seen`, which is how the replies of
+    timed out commands are flushed without counting their lines.
+    """
+    def __init__(self, stdout, prompt=b'CS> ', done=b'done', log_size=1000):
+        super().__init__()
+        self.daemon = True
+        self.stdout = stdout
+        self.prompt = prompt
+        self.done = done
+        self.responses = Queue()
+        self.log = deque(maxlen=log_size)
+        self.closed = threading.Event()
+        self.marker_seen = threading.Event()
+        self._marker = None
+
+    def is_response(self, line):
+        return line.startswith(self.prompt) or line.strip() == self.done
+
+    def run(self):
+        for line in iter(self.stdout.readline, b''):
+            marker = self._marker
+            if marker is not None and marker in line:
+                self.log.append(line)
+                self.clear_responses()
+                self._marker = None
+                self.marker_seen.set()
+            elif self.is_response(line):
+                self.responses.put(line)
+            else:
+                self.log.append(line)
+        self.closed.set()
+
+    def expect(self, marker):
+        """
+        Arms the marker (bytes). Must be called before the command that
+        produces it is sent.
+        """
+        self.marker_seen.clear()
+        self._marker = marker
+
+    def get_response(self, timeout=None):
+        """
+        Returns the next reply line. Raises TimeoutError if none arrives
+        within timeout seconds.
+        """
+        try:
+            return self.responses.get(timeout=timeout)
+        except Empty:
+            raise TimeoutError
+
+    def clear_responses(self):
+        """
+        Discards replies that nobody is waiting for, e.g. the late reply to
+        a command that already timed out.
+        """
+        while True:
+            try:
+                line = self.responses.get_nowait()
+            except Empty:
+                return
+            self.log.append(line)
+
+    def get_log(self):
+        return [line.decode(errors='replace') for line in list(self.log)]
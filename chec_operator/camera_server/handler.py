@@ -4,6 +4,7 @@ from chec_operator.utils import filepaths
 from os.path import dirname, realpath, join
 from datetime import timedelta
 from time import sleep
+from contextlib import nullcontext
 from chec_operator.threads.observation import ObservingThread
 
 
@@ -25,13 +26,17 @@ class ServerStatus:
         self.gui_trigger = None
         self.camera_trigger = None
 
+    def update(self, values):
+        for field, value in values.items():
+            setattr(self, field, value)
+
 
 class TransitionError(RuntimeError):
     pass
 
 
 class ServerHandler:
-    def __init__(self, communicator, pulse_gen, lock):
+    def __init__(self, communicator, pulse_gen, lock, ip=None, name=None):
         self.known_states = list(CameraState.__members__.values())
         self.known_filetypes = ['config', 'monitorconfig', 'trigger',
                                 'settings', 'run', 'hv', 'led']
@@ -39,9 +44,15 @@ class ServerHandler:
         self._communicator = communicator
         self._pulse_gen = pulse_gen
         self.lock = lock
+        self.ip = ip
+        self.name = name
         self._gui_config_update = False
         dir_ = dirname(realpath(__file__))
-        self.gui_config_path = join(dir_, '../config/gui.cfg')
+        if name:
+            gui_config = 'gui_{}.cfg'.format(name)
+        else:
+            gui_config = 'gui.cfg'
+        self.gui_config_path = join(dir_, '../config', gui_config)
         self.server_status = None
         self.building_status = None
 
@@ -49,10 +60,14 @@ class ServerHandler:
         self._observation_trigger_duration = 0
         self.pulse_generator_active = False
         self.observing_thread = None
+        self._observation_worker = None
 
     def connect(self):
         with self.lock:
-            self._communicator.connect()
+            if self.ip:
+                self._communicator.connect(self.ip)
+            else:
+                self._communicator.connect()
             self.enable_gui_config()
 
     def disconnect(self):
@@ -66,21 +81,9 @@ class ServerHandler:
             if self._communicator.cs:
                 self.building_status = ServerStatus()
                 bs = self.building_status
-                bs.state = c.get_current_state()
-                bs.transitions = c.get_allowed_transitions()
-                bs.hv = c.get_hv_status()
-                bs.flasher = c.get_flasher_status()
-                bs.data_sending = c.get_data_sending_status()
-                bs.configpath = c.get_config_filepath()
-                bs.monitorconfigpath = c.get_monitorconfig_filepath()
-                bs.settingspath = c.get_settings_filepath()
-                bs.runpath = c.get_run_filepath()
-                bs.hvpath = c.get_hv_filepath()
-                bs.ledpath = c.get_led_filepath()
-                bs.triggerpath = c.get_trigger_filepath()
+                bs.update(c.get_status())
                 bs.hv_level = self._refresh_hv_level(bs.hvpath)
                 bs.gui_trigger = self._refresh_trigger(bs.triggerpath)
-                bs.camera_trigger = c.get_trigger_type()
                 self.server_status = self.building_status
                 self._write_gui_config()
             elif self.server_status:
@@ -105,21 +108,11 @@ class ServerHandler:
             else:
                 self.building_status = ServerStatus()
                 bs = self.building_status
+                bs.update(c.get_status())
                 bs.state = CameraState.DISCONNECTED
                 bs.transitions = []
-                bs.hv = c.get_hv_status()
-                bs.flasher = c.get_flasher_status()
-                bs.data_sending = c.get_data_sending_status()
-                bs.configpath = c.get_config_filepath()
-                bs.monitorconfigpath = c.get_monitorconfig_filepath()
-                bs.settingspath = c.get_settings_filepath()
-                bs.runpath = c.get_run_filepath()
-                bs.hvpath = c.get_hv_filepath()
-                bs.ledpath = c.get_led_filepath()
-                bs.triggerpath = c.get_trigger_filepath()
                 bs.hv_level = self._refresh_hv_level(bs.hvpath)
                 bs.gui_trigger = self._refresh_trigger(bs.triggerpath)
-                bs.camera_trigger = c.get_trigger_type()
                 self.server_status = self.building_status
             print(self.server_status.camera_trigger)
             print(self.get_observation_time())
@@ -148,30 +141,65 @@ class ServerHandler:
             pass
         return level
 
+    def get_command_stats(self):
+        """
+        Latency statistics of the camera server commands, see
+        `CommandStats.summary`. Does not need the communicator lock.
+        """
+        return self._communicator.stats.summary()
+
+    def get_queue_stats(self):
+        """
+        Time spent by the commands waiting in the priority queue, if the
+        communicator is a `ScheduledCommunicator`.
+        """
+        wait_stats = getattr(self._communicator, 'wait_stats', None)
+        if wait_stats is None:
+            return []
+        return wait_stats.summary()
+
+    def _command_lock(self, safety=False):
+        """
+        The lock to hold while sending a command. Safety commands skip it
+        when the communicator schedules them ahead of queued work itself,
+        so they are not stuck behind a refresh or a transition.
+        """
+        if safety and getattr(self._communicator, 'preemptive', False):
+            return nullcontext()
+        return self.lock
+
     def get_backplane_trigger_count(self):
         with self.lock:
             return self._communicator.get_backplane_trigger_count()
 
     def go_to_state(self, req_state):
+        status = self.server_status
+        print("Going to state: {}".format(req_state.name))
+        allowed = False
+        if req_state not in self.known_states:
+            print("Attempted transition to unknown state "
+                  "refused: {}".format(req_state.name))
+        elif req_state not in status.transitions:
+            print("Attempt to perfom restricted transition refused: "
+                  "{} -> {}".format(status.state.name, req_state.name))
+        else:
+            allowed = True
+        sent = False
+        if allowed and req_state == CameraState.SAFE:
+            # Only the command itself skips the lock (if the communicator
+            # schedules it ahead of queued work), the bookkeeping below
+            # must not interleave with another transition
+            with self._command_lock(True):
+                self._communicator.go_to_state(req_state)
+            sent = True
         with self.lock:
-            status = self.server_status
-            try:
-                print("Going to state: {}".format(req_state.name))
-                if req_state not in self.known_states:
-                    raise KeyError
-                if req_state not in status.transitions:
-                    raise ValueError
+            if allowed:
                 if self.observing_thread:
                     self._interrupt_observation()
-                self._communicator.go_to_state(req_state)
+                if not sent:
+                    self._communicator.go_to_state(req_state)
                 if req_state == CameraState.OBSERVING:
                     self._begin_observation()
-            except KeyError:
-                print("Attempted transition to unknown state "
-                      "refused: {}".format(req_state.name))
-            except ValueError:
-                print("Attempt to perfom restricted transition refused: "
-                      "{} -> {}".format(status.state.name, req_state.name))
             if not self._communicator.get_current_state() == req_state:
                 msg = ("[ERROR] State transition failed: {} -> {}"
                        .format(status.state.name, req_state.name))
@@ -185,8 +213,12 @@ class ServerHandler:
             if ct == CameraTriggerSettings.EXTERNAL:
                 self._pulse_gen.activate()
             if time or triggers:
-                self.observing_thread = ObservingThread(self, time, triggers)
-                self.observing_thread.start()
+                # One worker serves every observation, e.g. the consecutive
+                # runs of a TFRun
+                if self._observation_worker is None:
+                    self._observation_worker = ObservingThread(self)
+                self._observation_worker.begin(time, triggers)
+                self.observing_thread = self._observation_worker
 
     def _interrupt_observation(self):
         self.observing_thread.interrupt_observation()
@@ -232,21 +264,21 @@ class ServerHandler:
             #     return ""
 
     def set_hv_state(self, req_state):
-        with self.lock:
+        with self._command_lock(req_state == OnOffState.OFF):
             if req_state == OnOffState.ON:
                 self._communicator.hv_turn_on()
             elif req_state == OnOffState.OFF:
                 self._communicator.hv_turn_off()
 
     def set_flasher_state(self, req_state):
-        with self.lock:
+        with self._command_lock(req_state == OnOffState.OFF):
             if req_state == OnOffState.ON:
                 self._communicator.flasher_turn_on()
             elif req_state == OnOffState.OFF:
                 self._communicator.flasher_turn_off()
 
     def set_data_sending_state(self, req_state):
-        with self.lock:
+        with self._command_lock(req_state == OnOffState.OFF):
             # self.go_to_state(CameraState.STANDBY)
             if req_state == OnOffState.ON:
                 self._communicator.data_send_turn_on()
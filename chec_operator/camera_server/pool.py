@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CameraPool:
+    """
+    Drives several cameras, each through its own `ServerHandler` (and
+    therefore its own communicator and lock). Operations are fanned out to
+    the cameras concurrently, so their wall-clock cost is that of the
+    slowest camera rather than the sum over all cameras.
+
+    Parameters
+    ----------
+    handlers : list
+        (name, ServerHandler) pairs. The first is the primary camera.
+    """
+    def __init__(self, handlers):
+        self.handlers = OrderedDict(handlers)
+        n_workers = max(1, len(self.handlers))
+        self._executor = ThreadPoolExecutor(max_workers=n_workers)
+
+    @property
+    def names(self):
+        return list(self.handlers.keys())
+
+    @property
+    def primary(self):
+        return next(iter(self.handlers.values()))
+
+    def _map(self, f, names=None):
+        """
+        Calls f(handler) for the selected cameras concurrently.
+
+        Returns
+        -------
+        dict
+            The result of each call, or the exception it raised, keyed by
+            camera name.
+        """
+        if names is None:
+            names = self.names
+        futures = OrderedDict()
+        for name in names:
+            futures[name] = self._executor.submit(f, self.handlers[name])
+        results = OrderedDict()
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print("[ERROR] Camera {}: {}".format(name, e))
+                results[name] = e
+        return results
+
+    def refresh(self):
+        return self._map(lambda h: h.refresh())
+
+    def connect(self, names=None):
+        return self._map(lambda h: h.connect(), names)
+
+    def disconnect(self, names=None):
+        return self._map(lambda h: h.disconnect(), names)
+
+    def go_to_state(self, state, names=None):
+        return self._map(lambda h: h.go_to_state(state), names)
+
+    def set_hv_state(self, state, names=None):
+        return self._map(lambda h: h.set_hv_state(state), names)
+
+    def set_data_sending_state(self, state, names=None):
+        return self._map(lambda h: h.set_data_sending_state(state), names)
+
+    def get_status(self):
+        """
+        The latest `ServerStatus` of each camera, keyed by name.
+        """
+        return OrderedDict((name, h.server_status)
+                           for name, h in self.handlers.items())
+
+    def get_aggregate_state(self, names=None):
+        """
+        The state shared by all the selected cameras, or None if they
+        differ or any has not reported yet.
+        """
+        if names is None:
+            names = self.names
+        states = set()
+        for name in names:
+            status = self.handlers[name].server_status
+            if status is None:
+                return None
+            states.add(status.state)
+        return states.pop() if len(states) == 1 else None
+
+    def get_common_transitions(self, names=None):
+        """
+        The transitions allowed for every one of the selected cameras.
+        """
+        if names is None:
+            names = self.names
+        common = None
+        for name in names:
+            status = self.handlers[name].server_status
+            if status is None:
+                return []
+            transitions = set(status.transitions)
+            common = transitions if common is None else common & transitions
+        return sorted(common) if common else []
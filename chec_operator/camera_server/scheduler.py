@@ -0,0 +1,114 @@
+import threading
+from concurrent.futures import Future
+from itertools import count
+from queue import PriorityQueue
+from time import time
+from chec_operator.camera_server.stats import CommandStats
+from chec_operator.utils.enums import CameraState
+
+# Priorities, lower is served first
+SAFETY = 0
+CONTROL = 1
+POLL = 2
+
+SAFETY_METHODS = {'hv_turn_off', 'data_send_turn_off', 'flasher_turn_off'}
+
+
+class ScheduledCommunicator:
+    """
+    Prioritised command scheduler between `ServerHandler` and a
+    communicator. A single worker thread owns the communicator and executes
+    the queued calls in priority order:
+
+        SAFETY: hv_turn_off, data_send_turn_off, flasher_turn_off and
+                go_to_state(SAFE)
+        CONTROL: every other command that changes the camera
+        POLL: the get_* status queries
+
+    A safety command therefore waits for at most the call already in
+    progress. Identical status polls that are still pending (and whose
+    arguments are hashable) are coalesced into a single call. The time
+    every call spends queued is recorded in `wait_stats`.
+
+    Calls are routed through the queue only for the communicator's public
+    methods, everything else (e.g. `cs`, `stats`) is read directly.
+    """
+    # Tells `ServerHandler` that safety commands need not take its lock
+    preemptive = True
+
+    def __init__(self, communicator):
+        self._communicator = communicator
+        self._queue = PriorityQueue()
+        self._sequence = count()
+        self._pending_polls = dict()
+        self._pending_lock = threading.Lock()
+        self.wait_stats = CommandStats()
+        self._worker = threading.Thread(target=self._run)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def __getattr__(self, name):
+        attr = getattr(self._communicator, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    @staticmethod
+    def get_priority(name, args):
+        if name in SAFETY_METHODS:
+            return SAFETY
+        if name == 'go_to_state' and args and args[0] == CameraState.SAFE:
+            return SAFETY
+        if name.startswith('get_'):
+            return POLL
+        return CONTROL
+
+    def submit(self, name, *args, **kwargs):
+        """
+        Queues a call of the communicator's method `name`.
+
+        Returns
+        -------
+        concurrent.futures.Future
+        """
+        priority = self.get_priority(name, args)
+        key = None
+        if priority == POLL and not kwargs:
+            key = (name, args)
+            try:
+                hash(key)
+            except TypeError:
+                # Unhashable arguments (e.g. a list), not coalesced
+                key = None
+        if key is not None:
+            with self._pending_lock:
+                future = self._pending_polls.get(key)
+                if future is not None:
+                    return future
+                future = Future()
+                self._pending_polls[key] = future
+        else:
+            future = Future()
+        item = (name, args, kwargs, future, key, time())
+        self._queue.put((priority, next(self._sequence), item))
+        return future
+
+    def call(self, name, *args, **kwargs):
+        return self.submit(name, *args, **kwargs).result()
+
+    def _run(self):
+        while True:
+            _, _, item = self._queue.get()
+            name, args, kwargs, future, key, queued = item
+            if key is not None:
+                with self._pending_lock:
+                    self._pending_polls.pop(key, None)
+            self.wait_stats.record(name, time() - queued)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = getattr(self._communicator, name)(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
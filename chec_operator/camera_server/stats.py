@@ -0,0 +1,117 @@
+from math import log10, floor
+from threading import Lock
+
+
+class LatencyHistogram:
+    """
+    Fixed-memory histogram of latencies, with logarithmic bins between
+    `min_` and `max_` seconds. Percentiles are reported as the upper edge of
+    the bin they fall in, so their resolution is set by `bins_per_decade`.
+    """
+    def __init__(self, min_=1e-4, max_=100, bins_per_decade=20):
+        self.min = min_
+        self.max = max_
+        self.bins_per_decade = bins_per_decade
+        self._log_min = log10(min_)
+        n_bins = int(round((log10(max_) - self._log_min) * bins_per_decade))
+        # First and last bins hold the underflow and overflow
+        self.counts = [0] * (n_bins + 2)
+        self.count = 0
+        self.total = 0
+        self.largest = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def _bin(self, seconds):
+        if seconds < self.min:
+            return 0
+        i = int(floor((log10(seconds) - self._log_min) *
+                      self.bins_per_decade)) + 1
+        return min(i, len(self.counts) - 1)
+
+    def _upper_edge(self, i):
+        if i == len(self.counts) - 1:
+            return self.largest
+        return 10 ** (self._log_min + i / self.bins_per_decade)
+
+    def record(self, seconds):
+        self.counts[self._bin(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.largest:
+            self.largest = seconds
+
+    def percentile(self, q):
+        """
+        Latency (in seconds) below which a fraction `q` of the recorded
+        latencies fall.
+        """
+        if not self.count:
+            return 0
+        target = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            cumulative += n
+            if cumulative >= target:
+                return min(self._upper_edge(i), self.largest)
+        return self.largest
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+
+class CommandStats:
+    """
+    Thread-safe collection of a `LatencyHistogram` per camera server
+    command name (the first word of the command).
+    """
+    def __init__(self):
+        self._histograms = dict()
+        self._lock = Lock()
+
+    def _get_histogram(self, cmd):
+        name = cmd.split()[0] if cmd else cmd
+        hist = self._histograms.get(name)
+        if hist is None:
+            hist = LatencyHistogram()
+            self._histograms[name] = hist
+        return hist
+
+    def record(self, cmd, seconds):
+        with self._lock:
+            self._get_histogram(cmd).record(seconds)
+
+    def record_timeout(self, cmd):
+        with self._lock:
+            self._get_histogram(cmd).timeouts += 1
+
+    def record_error(self, cmd):
+        with self._lock:
+            self._get_histogram(cmd).errors += 1
+
+    def reset(self):
+        with self._lock:
+            self._histograms = dict()
+
+    def summary(self):
+        """
+        Returns a list with one dict per command, sorted by command name,
+        with latencies in seconds.
+        """
+        with self._lock:
+            rows = []
+            for name in sorted(self._histograms):
+                hist = self._histograms[name]
+                rows.append(dict(
+                    command=name,
+                    count=hist.count,
+                    timeouts=hist.timeouts,
+                    errors=hist.errors,
+                    mean=hist.mean,
+                    p50=hist.percentile(0.5),
+                    p95=hist.percentile(0.95),
+                    p99=hist.percentile(0.99),
+                    max=hist.largest,
+                ))
+            return rows
@@ -0,0 +1,232 @@
+from collections import deque
+from fnmatch import fnmatch
+from os.path import dirname, realpath, join
+from threading import Lock
+import numpy as np
+
+OK = 0
+WARNING = 1
+CRITICAL = 2
+LEVEL_NAMES = ['OK', 'WARNING', 'CRITICAL']
+
+# Columns of a limits rule after the measurement and component
+LIMITS = ['warning_low', 'warning_high', 'critical_low', 'critical_high',
+          'hysteresis', 'max_rate']
+
+
+def default_limits_path():
+    return join(dirname(realpath(__file__)), '../config', 'alarms.cfg')
+
+
+def read_limits(path):
+    """
+    Reads the rules of a limits file (see config/alarms.cfg).
+
+    Returns
+    -------
+    list
+        (measurement, component pattern, dict of the set limits) per rule.
+    """
+    rules = []
+    with open(path) as f:
+        for i, line in enumerate(f):
+            line = line.split('#')[0].split()
+            if not line:
+                continue
+            if len(line) != len(LIMITS) + 2:
+                print("[WARNING] Ignoring line {} of {}: expected {} columns"
+                      .format(i + 1, path, len(LIMITS) + 2))
+                continue
+            limits = {name: float(v) for name, v in zip(LIMITS, line[2:])
+                      if v != '-'}
+            rules.append((line[0], line[1], limits))
+    return rules
+
+
+class AlarmEvent:
+    def __init__(self, number, time, measurement, component, value, level,
+                 previous, reason):
+        self.number = number
+        self.time = time
+        self.measurement = measurement
+        self.component = component
+        self.value = value
+        self.level = level
+        self.previous = previous
+        self.reason = reason
+
+    def __str__(self):
+        return "{} [{}] {} {} = {:.3g} ({} -> {}{})".format(
+            self.time, LEVEL_NAMES[self.level], self.measurement,
+            self.component, self.value, LEVEL_NAMES[self.previous],
+            LEVEL_NAMES[self.level],
+            ", {}".format(self.reason) if self.reason else "")
+
+
+class AlarmEngine:
+    """
+    Checks the latest value of every monitored component against its
+    warning and critical limits, and its rate of change.
+
+    The limits are held in arrays with the layout of a `MonitorSnapshot`'s
+    latest-value arrays (measurement by component), so a snapshot is
+    evaluated by a handful of array operations over all the components at
+    once, whatever their number. Only the components whose alarm level
+    changes are visited one by one, to emit their events.
+
+    An alarm is cleared only once the value is back inside the limit by
+    `hysteresis`, so a value hovering around a limit does not toggle it.
+    The rate of change is between consecutive samples of a component, and
+    raises a warning above `max_rate` per minute.
+
+    Events are printed, appended to `log_path` if given, and kept in
+    `events` for the GUIs (see `events_since`).
+
+    Parameters
+    ----------
+    rules : list
+        As returned by `read_limits`, read from config/alarms.cfg if None.
+    log_path : str
+    n_events : int
+        Number of recent events kept.
+    """
+    def __init__(self, rules=None, log_path=None, n_events=1000):
+        if rules is None:
+            rules = read_limits(default_limits_path())
+        self.rules = rules
+        self.log_path = log_path
+        self.events = deque(maxlen=n_events)
+        self.n_events = 0
+        self._lock = Lock()
+        self._names = ([], [])
+        self.limits = dict()
+        self.level = np.zeros((0, 0), dtype=np.int8)
+        self._rate_level = np.zeros((0, 0), dtype=np.int8)
+        self._time = np.zeros((0, 0), dtype='datetime64[us]')
+        self._value = np.zeros((0, 0))
+
+    def _resize(self, shape):
+        def grow(array, fill):
+            new = np.full(shape, fill, dtype=array.dtype)
+            new[:array.shape[0], :array.shape[1]] = array
+            return new
+        self.level = grow(self.level, OK)
+        self._rate_level = grow(self._rate_level, OK)
+        self._time = grow(self._time, np.datetime64('NaT'))
+        self._value = grow(self._value, np.nan)
+
+    def _build_limits(self, measurements, components, shape):
+        """
+        Limits arrays for the snapshot names, NaN where unset.
+        """
+        self.limits = {name: np.full(shape, np.nan) for name in LIMITS}
+        rows = {name: i for i, name in enumerate(measurements)}
+        for measurement, pattern, limits in self.rules:
+            m = rows.get(measurement)
+            if m is None:
+                continue
+            columns = [c for c, name in enumerate(components)
+                       if fnmatch(name, pattern)]
+            for name, value in limits.items():
+                self.limits[name][m, columns] = value
+        self.limits['hysteresis'][np.isnan(self.limits['hysteresis'])] = 0
+        self._names = (list(measurements), list(components))
+
+    def evaluate(self, snapshot):
+        """
+        Updates the alarm levels with the latest values of `snapshot`.
+
+        Returns
+        -------
+        list
+            `AlarmEvent` of the components whose level changed.
+        """
+        times, values = snapshot.latest_table()
+        shape = values.shape
+        if (not self.limits or
+                len(snapshot.measurements) != len(self._names[0]) or
+                len(snapshot.components) != len(self._names[1]) or
+                self.limits['hysteresis'].shape != shape):
+            self._build_limits(snapshot.measurements, snapshot.components,
+                               shape)
+        if self.level.shape != shape:
+            self._resize(shape)
+        limits = self.limits
+        level = self.level
+
+        # Limits move inwards by the hysteresis while in alarm
+        hyst = limits['hysteresis']
+        in_warning = np.where(level >= WARNING, hyst, 0)
+        in_critical = np.where(level >= CRITICAL, hyst, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            critical = ((values >= limits['critical_high'] - in_critical) |
+                        (values <= limits['critical_low'] + in_critical))
+            warning = ((values >= limits['warning_high'] - in_warning) |
+                       (values <= limits['warning_low'] + in_warning))
+
+            # Rate of change, updated on new samples only
+            new = times != self._time
+            dt = times - self._time
+            dt = np.where(np.isnat(dt), np.nan,
+                          dt.astype(np.int64) / 60e6)
+            rate = np.abs(values - self._value) / dt
+            fast = new & (rate > limits['max_rate'])
+            self._rate_level[new] = np.where(fast[new], WARNING, OK)
+            self._time = times.copy()
+            self._value = values.copy()
+
+        new_level = np.where(critical, CRITICAL,
+                             np.where(warning, WARNING, OK)).astype(np.int8)
+        new_level = np.maximum(new_level, self._rate_level)
+        new_level[np.isnat(times)] = OK
+
+        changed = np.nonzero(new_level != level)
+        events = []
+        if len(changed[0]):
+            measurements, components = self._names
+            for m, c in zip(*changed):
+                reason = ''
+                if self._rate_level[m, c] and not (critical[m, c] or
+                                                   warning[m, c]):
+                    reason = 'rate {:.3g}/min'.format(rate[m, c])
+                events.append(self._event(
+                    times[m, c], measurements[m], components[c],
+                    values[m, c], new_level[m, c], level[m, c], reason))
+        self.level = new_level
+        if events:
+            self._log(events)
+        return events
+
+    def _event(self, time, measurement, component, value, level, previous,
+               reason):
+        with self._lock:
+            self.n_events += 1
+            event = AlarmEvent(self.n_events, time, measurement, component,
+                               float(value), int(level), int(previous),
+                               reason)
+            self.events.append(event)
+        return event
+
+    def _log(self, events):
+        lines = [str(e) for e in events]
+        for line in lines:
+            print(line)
+        if self.log_path:
+            with open(self.log_path, 'a') as f:
+                f.write(''.join(l + '\n' for l in lines))
+
+    def events_since(self, number):
+        """
+        The kept events after event `number` (0 for all of them).
+        """
+        with self._lock:
+            return [e for e in self.events if e.number > number]
+
+    def active(self, measurement):
+        """
+        Alarm level of each component of `measurement`.
+        """
+        measurements, components = self._names
+        if measurement not in measurements:
+            return np.zeros(len(components), dtype=np.int8)
+        return self.level[measurements.index(measurement), :len(components)]
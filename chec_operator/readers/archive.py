@@ -0,0 +1,270 @@
+import json
+import os
+from os.path import join, exists
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+def _replace_file(path, write):
+    """
+    Writes a file through a temporary one, so it is never seen half written.
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class MonitorArchive:
+    """
+    Append-only on-disk store of parsed monitor records.
+
+    The records are kept column by column (time, measurement, component,
+    value) in chunks of `chunk_size` records, one .npy file per column and
+    chunk, which are read back as memory maps. An index of the chunks
+    holds the number of records and the time range of each, so a time
+    range query only maps the chunks it overlaps.
+
+    Measurement and component codes are the archive's own, their names are
+    kept in names.json. Records are expected to be appended in time order.
+    The read offsets of the monitor files the records come from are kept
+    in offsets.json.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the archive, created if it does not exist.
+    chunk_size : int
+        Number of records per chunk.
+    """
+    columns = [('time', 'datetime64[us]'),
+               ('measurement', 'u1'),
+               ('component', 'u2'),
+               ('value', 'f8')]
+    index_dtype = np.dtype([('n', 'i8'),
+                            ('start', 'datetime64[us]'),
+                            ('stop', 'datetime64[us]')])
+
+    def __init__(self, path, chunk_size=2**16):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._index_path = join(path, 'index.npy')
+        self._names_path = join(path, 'names.json')
+        self._offsets_path = join(path, 'offsets.json')
+
+        if exists(self._index_path):
+            self.index = np.load(self._index_path)
+            chunk_size = int(np.load(join(path, self._chunk_file(0, 'time')),
+                                     mmap_mode='r').shape[0])
+        else:
+            self.index = np.zeros(0, dtype=self.index_dtype)
+        self.chunk_size = chunk_size
+
+        self.measurements = []
+        self.components = []
+        if exists(self._names_path):
+            with open(self._names_path) as f:
+                names = json.load(f)
+            self.measurements = names['measurements']
+            self.components = names['components']
+        self._measurement_codes = {n: i for i, n in
+                                   enumerate(self.measurements)}
+        self._component_codes = {n: i for i, n in enumerate(self.components)}
+
+        self._writing = None
+        self._readers = dict()
+
+    def __len__(self):
+        return int(self.index['n'].sum())
+
+    @property
+    def start(self):
+        """
+        Time of the first record, NaT if empty.
+        """
+        if not len(self.index):
+            return np.datetime64('NaT')
+        return self.index['start'][0]
+
+    @property
+    def stop(self):
+        """
+        Time of the last record, NaT if empty.
+        """
+        if not len(self.index):
+            return np.datetime64('NaT')
+        return self.index['stop'][-1]
+
+    @staticmethod
+    def _chunk_file(chunk, column):
+        return '{:06d}_{}.npy'.format(chunk, column)
+
+    def _open_chunk(self, chunk, mode):
+        return {name: open_memmap(join(self.path,
+                                       self._chunk_file(chunk, name)),
+                                  mode=mode, dtype=dtype,
+                                  shape=(self.chunk_size,))
+                for name, dtype in self.columns}
+
+    def _write_index(self):
+        _replace_file(self._index_path, lambda f: np.save(f, self.index))
+
+    def _write_names(self):
+        names = dict(measurements=self.measurements,
+                     components=self.components)
+        _replace_file(self._names_path,
+                      lambda f: f.write(json.dumps(names).encode()))
+
+    def _translate(self, codes, names, archive_names, archive_codes):
+        """
+        Maps `codes` (indices into `names`) to the archive's codes for the
+        same names, adding the names the archive does not know yet.
+        """
+        lookup = np.zeros(len(names), dtype=np.int64)
+        added = False
+        for i in np.unique(codes):
+            name = names[i]
+            code = archive_codes.get(name)
+            if code is None:
+                code = len(archive_names)
+                archive_names.append(name)
+                archive_codes[name] = code
+                added = True
+            lookup[i] = code
+        return lookup[codes], added
+
+    def append(self, times, measurements, components, values,
+               measurement_names, component_names):
+        """
+        Appends a block of records, with their measurement and component
+        codes given as indices into `measurement_names` and
+        `component_names` (e.g. a `MonitorContainer`'s).
+        """
+        times = np.asarray(times)
+        if times.dtype != np.dtype('datetime64[us]'):
+            times = times.astype(np.int64).view('datetime64[us]')
+        n = len(times)
+        if not n:
+            return
+        measurements, m_added = self._translate(
+            np.asarray(measurements), measurement_names, self.measurements,
+            self._measurement_codes)
+        components, c_added = self._translate(
+            np.asarray(components), component_names, self.components,
+            self._component_codes)
+        if m_added or c_added:
+            self._write_names()
+        columns = dict(time=times, measurement=measurements,
+                       component=components, value=np.asarray(values))
+
+        written = 0
+        while written < n:
+            if not len(self.index) or self.index['n'][-1] == self.chunk_size:
+                self._close_writing()
+                new = np.zeros(1, dtype=self.index_dtype)
+                self.index = np.concatenate([self.index, new])
+                chunk = len(self.index) - 1
+                self._writing = (chunk, self._open_chunk(chunk, 'w+'))
+            elif self._writing is None:
+                chunk = len(self.index) - 1
+                self._writing = (chunk, self._open_chunk(chunk, 'r+'))
+            chunk, arrays = self._writing
+            entry = self.index[chunk]
+            start = int(entry['n'])
+            count = min(n - written, self.chunk_size - start)
+            for name, array in arrays.items():
+                array[start:start + count] = \
+                    columns[name][written:written + count]
+            if start == 0:
+                entry['start'] = times[written]
+            entry['stop'] = times[written + count - 1]
+            entry['n'] = start + count
+            self.index[chunk] = entry
+            for array in arrays.values():
+                array.flush()
+            self._readers.pop(chunk, None)
+            written += count
+        # The index is only updated once the records are on disk
+        self._write_index()
+
+    def _close_writing(self):
+        if self._writing is not None:
+            for array in self._writing[1].values():
+                array.flush()
+            self._writing = None
+
+    def _get_reader(self, chunk):
+        arrays = self._readers.get(chunk)
+        if arrays is None:
+            arrays = self._open_chunk(chunk, 'r')
+            self._readers[chunk] = arrays
+        return arrays
+
+    def read(self, start=None, stop=None):
+        """
+        The records with start <= time < stop.
+
+        Returns
+        -------
+        dict
+            time, measurement, component and value arrays. The codes index
+            `measurements` and `components`.
+        """
+        if start is not None:
+            start = np.datetime64(start, 'us')
+        if stop is not None:
+            stop = np.datetime64(stop, 'us')
+        parts = {name: [] for name, _ in self.columns}
+        for chunk, entry in enumerate(self.index):
+            n = int(entry['n'])
+            if not n:
+                continue
+            if start is not None and entry['stop'] < start:
+                continue
+            if stop is not None and entry['start'] >= stop:
+                continue
+            arrays = self._get_reader(chunk)
+            times = arrays['time'][:n]
+            i0 = 0 if start is None else np.searchsorted(times, start)
+            i1 = n if stop is None else np.searchsorted(times, stop)
+            for name, _ in self.columns:
+                parts[name].append(arrays[name][i0:i1])
+        records = dict()
+        for name, dtype in self.columns:
+            if parts[name]:
+                records[name] = np.concatenate(parts[name])
+            else:
+                records[name] = np.zeros(0, dtype=dtype)
+        return records
+
+    def load_offsets(self):
+        """
+        The read offsets of the monitor files, as saved by `save_offsets`.
+        """
+        if not exists(self._offsets_path):
+            return dict()
+        with open(self._offsets_path) as f:
+            return json.load(f)
+
+    def save_offsets(self, offsets):
+        """
+        Saves the read offsets of the monitor files (a JSON-serialisable
+        dict), to be called once the records read up to them are archived.
+        """
+        _replace_file(self._offsets_path,
+                      lambda f: f.write(json.dumps(offsets).encode()))
+
+    def iter_chunks(self):
+        """
+        Yields the records of each chunk in turn, as dicts of memory mapped
+        column arrays.
+        """
+        for chunk, entry in enumerate(self.index):
+            n = int(entry['n'])
+            if n:
+                arrays = self._get_reader(chunk)
+                yield {name: arrays[name][:n] for name, _ in self.columns}
+
+    def close(self):
+        self._close_writing()
+        self._readers = dict()
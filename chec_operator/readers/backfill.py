@@ -0,0 +1,138 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from chec_operator.readers.compressed import open_monitor
+from chec_operator.readers.line_types import LineParser
+from chec_operator.readers.timestamp import TimestampParser
+
+
+def split_range(path, start, stop, n):
+    """
+    Splits the byte range [start, stop) of a file into at most `n` ranges
+    of similar size, each starting at the start of a line.
+
+    Returns
+    -------
+    list
+        (start, stop) pairs.
+    """
+    bounds = [start]
+    with open_monitor(path) as f:
+        for i in range(1, n):
+            offset = start + (stop - start) * i // n
+            if offset <= bounds[-1]:
+                continue
+            f.seek(offset - 1)
+            f.readline()
+            offset = f.tell()
+            if offset >= stop:
+                break
+            if offset > bounds[-1]:
+                bounds.append(offset)
+    bounds.append(stop)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class _Names:
+    """
+    Codes of the names met in a range, in order of appearance.
+    """
+    def __init__(self):
+        self.names = []
+        self._codes = dict()
+
+    def code(self, name):
+        code = self._codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self._codes[name] = code
+            self.names.append(name)
+        return code
+
+
+def parse_range(path, start, stop):
+    """
+    Parses the records of the complete lines in the byte range
+    [start, stop) of a monitor file (of its decompressed content, if
+    compressed), which should start at the start of a line.
+
+    Returns
+    -------
+    dict
+        'time' (us since epoch), 'measurement', 'component' and 'value'
+        arrays, with the codes indexing the 'measurements' and
+        'components' name lists, along with the time of the last "Start
+        Monitoring" line ('start_time', None if there is none), the number
+        of lines that failed to parse ('errors') and the offset after the
+        last complete line ('end').
+    """
+    with open_monitor(path) as f:
+        f.seek(start)
+        data = f.read(stop - start)
+    end = start + data.rfind(b'\n') + 1
+    lines = data[:end - start].decode(errors='replace').split('\n')[:-1]
+
+    measurements = _Names()
+    components = _Names()
+    parser = LineParser(TimestampParser(), measurements.code,
+                        components.code)
+    times = []
+    measurement_codes = []
+    component_codes = []
+    values = []
+    start_time = None
+    errors = 0
+    for line in lines:
+        try:
+            kind, parsed = parser.parse(line)
+        except (ValueError, IndexError):
+            errors += 1
+            continue
+        if kind == LineParser.RECORD:
+            times.append(parsed[0])
+            measurement_codes.append(parsed[1])
+            component_codes.append(parsed[2])
+            values.append(parsed[3])
+        elif kind == LineParser.START:
+            start_time = parsed
+    return dict(time=np.array(times, dtype=np.int64),
+                measurement=np.array(measurement_codes, dtype=np.int64),
+                component=np.array(component_codes, dtype=np.int64),
+                value=np.array(values, dtype=np.float64),
+                measurements=measurements.names,
+                components=components.names,
+                start_time=start_time, errors=errors, end=end)
+
+
+def _parse_range(args):
+    return parse_range(*args)
+
+
+def parse_parallel(path, start, stop, processes, chunks_per_process=4):
+    """
+    Parses the byte range [start, stop) of a monitor file with a pool of
+    `processes` worker processes, splitting it at line boundaries into
+    `chunks_per_process` chunks per process (so a slow chunk does not hold
+    up the others).
+
+    Returns
+    -------
+    list
+        The `parse_range` result of each chunk, in file order.
+    """
+    if processes <= 1:
+        return [parse_range(path, start, stop)]
+    ranges = split_range(path, start, stop, processes * chunks_per_process)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_parse_range,
+                                 [(path, lo, hi) for lo, hi in ranges]))
+
+
+def default_processes():
+    """
+    Number of CPUs available to this process.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
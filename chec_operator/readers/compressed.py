@@ -0,0 +1,304 @@
+import json
+import os
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+from threading import Lock
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Checkpoint tables of the compressed files recently opened in this process,
+# keyed by file (device, inode, modification time, size), shared by all the
+# `CompressedFile` opened on the same file. Only the MAX_TABLES most recently
+# opened are kept, as each holds a decompressor state per checkpoint (an open
+# file keeps its own table regardless)
+MAX_TABLES = 16
+_TABLES = OrderedDict()
+_TABLES_LOCK = Lock()
+
+# Suffix of the sidecar file in which the decompressed size of a compressed
+# file, and the offsets of its gzip members or zstd frames, are saved once
+# it has been read to its end, so other processes need not decompress it
+# again to find them. Decompressor states cannot be saved, the checkpoints
+# within a member or frame are only kept in memory
+TABLE_SUFFIX = '.ckpt'
+
+
+def compression(path):
+    """
+    'gzip' or 'zstd' if the file `path` is compressed with either, from
+    its magic number, else None.
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if magic[:2] == GZIP_MAGIC:
+        return 'gzip'
+    if magic == ZSTD_MAGIC:
+        return 'zstd'
+    return None
+
+
+def supported(path):
+    """
+    Whether the file `path` can be read, i.e. it is not zstd compressed
+    without zstandard being installed.
+    """
+    return compression(path) != 'zstd' or zstandard is not None
+
+
+def open_monitor(path):
+    """
+    Opens a monitor file for reading in binary mode, decompressing it on
+    the fly if it is gzip or zstd compressed.
+    """
+    if compression(path) is not None:
+        return CompressedFile(path)
+    return open(path, 'rb')
+
+
+def file_size(file):
+    """
+    Size of a file opened by `open_monitor` (decompressed, if compressed).
+    """
+    if isinstance(file, CompressedFile):
+        return file.size()
+    return os.fstat(file.fileno()).st_size
+
+
+class _CheckpointTable:
+    def __init__(self):
+        # Decompressed offset, compressed offset and decompressor state
+        # (None for the start of a gzip member or zstd frame)
+        self.checkpoints = [(0, 0, None)]
+        self.offsets = [0]
+        self.size = None
+
+    def add(self, offset, raw_offset, state):
+        i = bisect_right(self.offsets, offset)
+        if offset > self.offsets[i - 1]:
+            self.checkpoints.insert(i, (offset, raw_offset, state))
+            self.offsets.insert(i, offset)
+
+    @classmethod
+    def load(cls, path, stat):
+        """
+        The table saved for the compressed file `path` (with os.stat
+        `stat`), or None if there is none or it is for another version of
+        the file.
+        """
+        try:
+            with open(path + TABLE_SUFFIX) as f:
+                saved = json.load(f)
+            if (saved['mtime_ns'] != stat.st_mtime_ns or
+                    saved['raw_size'] != stat.st_size):
+                return None
+            table = cls()
+            for offset, raw_offset in saved['checkpoints']:
+                table.add(offset, raw_offset, None)
+            table.size = saved['size']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return table
+
+    def save(self, path, stat):
+        saved = dict(mtime_ns=stat.st_mtime_ns, raw_size=stat.st_size,
+                     size=self.size,
+                     checkpoints=[c[:2] for c in self.checkpoints
+                                  if c[2] is None])
+        tmp = path + TABLE_SUFFIX + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(saved, f)
+            os.replace(tmp, path + TABLE_SUFFIX)
+        except OSError as e:
+            print("[WARNING] Cannot write checkpoint table {} ({}), keeping "
+                  "it in memory".format(path + TABLE_SUFFIX, e))
+
+    def find(self, offset):
+        return self.checkpoints[bisect_right(self.offsets, offset) - 1]
+
+
+class CompressedFile:
+    """
+    Read-only binary file object over the decompressed content of a gzip
+    or zstd compressed file, decompressed incrementally as it is read.
+
+    Seeking uses a table of checkpoints, held in memory and shared by all
+    the `CompressedFile` of a file: the decompressor state is saved every
+    `checkpoint_spacing` decompressed bytes (gzip), and at the start of
+    every gzip member or zstd frame. A seek then decompresses from the
+    closest checkpoint before the offset rather than from the start of the
+    file. zstd decompressor states cannot be saved, so single-frame zstd
+    files are decompressed from their start on backward seeks.
+
+    Once the file has been read to its end, its size and the member or
+    frame checkpoints are saved alongside it (`TABLE_SUFFIX`), and loaded
+    by the next process to open it.
+
+    Parameters
+    ----------
+    path : str
+    checkpoint_spacing : int
+        Decompressed bytes between checkpoints.
+    """
+    chunk_size = 2**16
+
+    def __init__(self, path, checkpoint_spacing=2**22):
+        self.path = path
+        self.checkpoint_spacing = checkpoint_spacing
+        self.codec = compression(path)
+        if self.codec == 'zstd' and zstandard is None:
+            raise ImportError("zstandard is required to read {}"
+                              .format(path))
+        self.raw = open(path, 'rb')
+        self._stat = os.fstat(self.raw.fileno())
+        stat = self._stat
+        key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with _TABLES_LOCK:
+            self._table = _TABLES.get(key)
+            if self._table is None:
+                self._table = _CheckpointTable.load(path, stat)
+                if self._table is None:
+                    self._table = _CheckpointTable()
+                _TABLES[key] = self._table
+                while len(_TABLES) > MAX_TABLES:
+                    _TABLES.popitem(last=False)
+            else:
+                _TABLES.move_to_end(key)
+        self._restore(self._table.checkpoints[0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _decompressor(self):
+        if self.codec == 'gzip':
+            return zlib.decompressobj(zlib.MAX_WBITS | 16)
+        return zstandard.ZstdDecompressor().decompressobj()
+
+    def _restore(self, checkpoint):
+        offset, raw_offset, state = checkpoint
+        self.raw.seek(raw_offset)
+        self._raw_offset = raw_offset
+        self._decomp = self._decompressor() if state is None else state.copy()
+        # Decompressed bytes, of which those from `_pos` (at offset
+        # `_start` in the file) are not returned yet
+        self._buffer = b''
+        self._pos = 0
+        self._start = offset
+        self._eof = False
+
+    @property
+    def _available(self):
+        return len(self._buffer) - self._pos
+
+    def _fill(self):
+        """
+        Decompresses the next chunk into the buffer, returning False at the
+        end of the file.
+        """
+        if self._eof:
+            return False
+        chunk = self.raw.read(self.chunk_size)
+        end = self._start + self._available
+        if not chunk:
+            self._eof = True
+            if self._table.size is None:
+                self._table.size = end
+                self._table.save(self.path, self._stat)
+            return False
+        out = []
+        data = chunk
+        while data:
+            out.append(self._decomp.decompress(data))
+            end += len(out[-1])
+            if not self._decomp.eof:
+                break
+            # End of a gzip member or zstd frame, another may follow
+            data = self._decomp.unused_data
+            raw_offset = self._raw_offset + len(chunk) - len(data)
+            self._decomp = self._decompressor()
+            self._table.add(end, raw_offset, None)
+        self._raw_offset += len(chunk)
+        if (self.codec == 'gzip' and not self._decomp.eof and
+                end - self._table.find(end)[0] >= self.checkpoint_spacing):
+            self._table.add(end, self._raw_offset, self._decomp.copy())
+        out.insert(0, self._buffer[self._pos:])
+        self._buffer = b''.join(out)
+        self._pos = 0
+        return True
+
+    def tell(self):
+        return self._start
+
+    def read(self, size=-1):
+        parts = []
+        n = 0
+        while size < 0 or n < size:
+            if not self._available and not self._fill():
+                break
+            take = self._available if size < 0 else \
+                min(self._available, size - n)
+            parts.append(self._buffer[self._pos:self._pos + take])
+            self._pos += take
+            self._start += take
+            n += take
+        return b''.join(parts)
+
+    def readline(self):
+        i = self._buffer.find(b'\n', self._pos)
+        while i < 0:
+            searched = self._available
+            if not self._fill():
+                break
+            i = self._buffer.find(b'\n', searched)
+        return self.read(i + 1 - self._pos if i >= 0 else -1)
+
+    def _skip(self, n):
+        n = min(n, self._available)
+        self._pos += n
+        self._start += n
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._start
+        elif whence == 2:
+            offset += self.size()
+        if not self._start <= offset <= self._start + self._available:
+            checkpoint = self._table.find(offset)
+            if not checkpoint[0] <= self._start <= offset:
+                self._restore(checkpoint)
+            # Decompress up to the offset
+            while self._start + self._available < offset:
+                self._skip(self._available)
+                if not self._fill():
+                    break
+        self._skip(offset - self._start)
+        return self._start
+
+    def size(self):
+        """
+        Decompressed size, found by decompressing to the end of the file
+        the first time unless it was saved by an earlier process.
+        """
+        if self._table.size is None:
+            position = self._start
+            self.seek(self._table.checkpoints[-1][0])
+            self._skip(self._available)
+            while self._fill():
+                self._skip(self._available)
+            self.seek(position)
+        return self._table.size
+
+    def fileno(self):
+        return self.raw.fileno()
+
+    def close(self):
+        self.raw.close()
@@ -0,0 +1,303 @@
+from threading import Lock
+import numpy as np
+
+US = 1000000
+
+
+def _to_us(time):
+    return int(np.datetime64(time, 'us').astype(np.int64))
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling of the series (x, y) to
+    `n_out` points, which keeps the visual shape of the series.
+
+    Returns
+    -------
+    numpy.ndarray
+        Indices of the selected points.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.zeros(n_out, dtype=np.int64)
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the last bucket)
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        next_hi = max(next_hi, hi + 1)
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) -
+                      (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+class _Aggregate:
+    """
+    Min, max, sum and count of a series' values in consecutive buckets of
+    `width` microseconds. Once more than twice `max_buckets` buckets are
+    held, the oldest are dropped down to `max_buckets`.
+
+    Blocks are expected to follow the stored buckets, a block overlapping
+    or preceding them (e.g. a backfill) is merged into them at a higher
+    cost, so the buckets stay sorted by start.
+    """
+    _columns = ('start', 'min', 'max', 'sum', 'count')
+
+    def __init__(self, width, max_buckets):
+        self.width = width
+        self.max_buckets = max_buckets
+        self.n = 0
+        self.start = np.zeros(64, dtype=np.int64)
+        self.min = np.zeros(64)
+        self.max = np.zeros(64)
+        self.sum = np.zeros(64)
+        self.count = np.zeros(64, dtype=np.int64)
+
+    def _reserve(self, extra):
+        if self.n + extra > 2 * self.max_buckets:
+            drop = min(self.n, self.n + extra - self.max_buckets)
+            for name in self._columns:
+                array = getattr(self, name)
+                array[:self.n - drop] = array[drop:self.n]
+            self.n -= drop
+        size = len(self.start)
+        if self.n + extra > size:
+            size = max(2 * size, self.n + extra)
+            for name in self._columns:
+                old = getattr(self, name)
+                new = np.zeros(size, dtype=old.dtype)
+                new[:self.n] = old[:self.n]
+                setattr(self, name, new)
+
+    def add(self, times, values):
+        """
+        Adds a time-ordered block of samples (times in us).
+        """
+        buckets = times // self.width
+        first = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+        start = buckets[first] * self.width
+        mins = np.minimum.reduceat(values, first)
+        maxs = np.maximum.reduceat(values, first)
+        sums = np.add.reduceat(values, first)
+        counts = np.diff(np.append(first, len(values)))
+        if self.n and start[0] < self.start[self.n - 1]:
+            self._merge(start, mins, maxs, sums, counts)
+            return
+        if self.n and start[0] == self.start[self.n - 1]:
+            # Continues the last bucket
+            i = self.n - 1
+            self.min[i] = min(self.min[i], mins[0])
+            self.max[i] = max(self.max[i], maxs[0])
+            self.sum[i] += sums[0]
+            self.count[i] += counts[0]
+            start, mins, maxs = start[1:], mins[1:], maxs[1:]
+            sums, counts = sums[1:], counts[1:]
+        m = len(start)
+        if not m:
+            return
+        self._reserve(m)
+        sl = slice(self.n, self.n + m)
+        self.start[sl] = start
+        self.min[sl] = mins
+        self.max[sl] = maxs
+        self.sum[sl] = sums
+        self.count[sl] = counts
+        self.n += m
+
+    def _merge(self, start, mins, maxs, sums, counts):
+        """
+        Merges buckets (sorted by start) into the stored ones, wherever they
+        fall.
+        """
+        n = self.n
+        starts = np.concatenate([self.start[:n], start])
+        order = np.argsort(starts, kind='stable')
+        starts = starts[order]
+        first = np.flatnonzero(np.diff(starts, prepend=starts[0] - 1))
+        merged = dict(start=starts[first])
+        for name, new, reduce in (('min', mins, np.minimum),
+                                  ('max', maxs, np.maximum),
+                                  ('sum', sums, np.add),
+                                  ('count', counts, np.add)):
+            column = np.concatenate([getattr(self, name)[:n], new])[order]
+            merged[name] = reduce.reduceat(column, first)
+        m = len(first)
+        keep = slice(m - self.max_buckets, m) \
+            if m > 2 * self.max_buckets else slice(0, m)
+        self.n = 0
+        self._reserve(keep.stop - keep.start)
+        for name in self._columns:
+            getattr(self, name)[:keep.stop - keep.start] = merged[name][keep]
+        self.n = keep.stop - keep.start
+
+    def range(self, start, stop):
+        i0 = np.searchsorted(self.start[:self.n], start - self.width + 1)
+        i1 = np.searchsorted(self.start[:self.n], stop)
+        return slice(i0, i1)
+
+
+class MonitorHistory:
+    """
+    Multi-resolution aggregates of every monitored series, for plotting
+    long time ranges.
+
+    Each (measurement, component) series is aggregated (min, max, sum and
+    count) in buckets at every level of `levels` seconds, updated
+    incrementally as records are added. A query chooses the coarsest level
+    that still gives at least one bucket per pixel, and rebins it to the
+    requested width, so its cost and the number of points returned are
+    bounded by the plot width whatever the time range.
+
+    Each level keeps the latest `max_buckets` buckets (up to twice as many
+    between trims), so with the default levels the finest (1 s) covers
+    about a day and the coarsest over ten years.
+    """
+    def __init__(self, levels=(1, 10, 60, 600, 3600), max_buckets=100000):
+        self.levels = [int(level * US) for level in sorted(levels)]
+        self.max_buckets = max_buckets
+        self._series = dict()
+        self._lock = Lock()
+
+    @property
+    def series(self):
+        with self._lock:
+            return list(self._series.keys())
+
+    def _get_series(self, key):
+        aggregates = self._series.get(key)
+        if aggregates is None:
+            aggregates = [_Aggregate(width, self.max_buckets)
+                          for width in self.levels]
+            self._series[key] = aggregates
+        return aggregates
+
+    def append(self, times, measurements, components, values,
+               measurement_names, component_names):
+        """
+        Adds a block of records, in time order for each series, with their
+        measurement and component codes given as indices into
+        `measurement_names` and `component_names`.
+        """
+        times = np.asarray(times)
+        if times.dtype.kind == 'M':
+            times = times.astype('datetime64[us]')
+        times = times.astype(np.int64)
+        if not len(times):
+            return
+        measurements = np.asarray(measurements, dtype=np.int64)
+        components = np.asarray(components, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        key = measurements * (len(component_names) + 1) + components
+        order = np.lexsort((times, key))
+        key = key[order]
+        bounds = np.flatnonzero(np.diff(key)) + 1
+        bounds = np.concatenate([[0], bounds, [len(key)]])
+        with self._lock:
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                i = order[lo]
+                name = (measurement_names[measurements[i]],
+                        component_names[components[i]])
+                t = times[order[lo:hi]]
+                v = values[order[lo:hi]]
+                valid = ~np.isnan(v)
+                if not valid.all():
+                    t, v = t[valid], v[valid]
+                    if not len(t):
+                        continue
+                for aggregate in self._get_series(name):
+                    aggregate.add(t, v)
+
+    def backfill(self, archive):
+        """
+        Adds every record of a `MonitorArchive`, a chunk at a time.
+        """
+        for records in archive.iter_chunks():
+            self.append(records['time'], records['measurement'],
+                        records['component'], records['value'],
+                        archive.measurements, archive.components)
+
+    def query(self, measurement, components, start, stop, width,
+              method='minmax'):
+        """
+        Decimated series of `components` of `measurement` between `start`
+        and `stop`, with at most `width` points each.
+
+        Parameters
+        ----------
+        measurement : str
+        components : list
+        start, stop : datetime or numpy.datetime64
+        width : int
+            Number of points, typically the plot width in pixels.
+        method : str
+            'minmax': min, max and mean per pixel.
+            'lttb': Largest-Triangle-Three-Buckets selection of the mean
+            series.
+
+        Returns
+        -------
+        dict
+            Per component, a dict of datetime64[us] 'time' and float 'min',
+            'max' and 'mean' arrays ('minmax'), or 'time' and 'value'
+            arrays ('lttb').
+        """
+        start = _to_us(start)
+        stop = _to_us(stop)
+        width = max(int(width), 1)
+        pixel = max((stop - start) // width, 1)
+        level = 0
+        for i, level_width in enumerate(self.levels):
+            if level_width <= pixel:
+                level = i
+        result = dict()
+        with self._lock:
+            for component in components:
+                aggregates = self._series.get((measurement, component))
+                if aggregates is None:
+                    result[component] = self._empty(method)
+                    continue
+                result[component] = self._decimate(
+                    aggregates[level], start, stop, width, pixel, method)
+        return result
+
+    @staticmethod
+    def _empty(method):
+        times = np.zeros(0, dtype='datetime64[us]')
+        if method == 'lttb':
+            return dict(time=times, value=np.zeros(0))
+        return dict(time=times, min=np.zeros(0), max=np.zeros(0),
+                    mean=np.zeros(0))
+
+    @staticmethod
+    def _decimate(aggregate, start, stop, width, pixel, method):
+        sl = aggregate.range(start, stop)
+        times = aggregate.start[sl]
+        sums = aggregate.sum[sl]
+        counts = aggregate.count[sl]
+        if method == 'lttb':
+            means = sums / counts
+            selected = lttb(times, means, width)
+            return dict(time=times[selected].view('datetime64[us]'),
+                        value=means[selected])
+        if not len(times):
+            return MonitorHistory._empty(method)
+        # Rebin the level's buckets into pixels
+        pixels = np.clip((times - start) // pixel, 0, width - 1)
+        first = np.flatnonzero(np.diff(pixels, prepend=pixels[0] - 1))
+        return dict(
+            time=(start + pixels[first] * pixel).view('datetime64[us]'),
+            min=np.minimum.reduceat(aggregate.min[sl], first),
+            max=np.maximum.reduceat(aggregate.max[sl], first),
+            mean=(np.add.reduceat(sums, first) /
+                  np.add.reduceat(counts, first)),
+        )
@@ -0,0 +1,258 @@
+import os
+import numpy as np
+from chec_operator.readers.compressed import CompressedFile, open_monitor, \
+    file_size
+
+# First row of an index file: the magic number, the inode of the indexed
+# file and the stride
+MAGIC = int.from_bytes(b'MONIDX01', 'little')
+
+
+class MonitorIndex:
+    """
+    Sidecar index of a monitor file (`<path>.idx`), mapping times to byte
+    offsets so a time range is read by seeking straight to it.
+
+    An entry is added for the first record after every `stride` bytes,
+    and for every "Start Monitoring" line (a session), giving the time of
+    the record (or session) and the offset of the start of its line.
+    `update` indexes what was written to the file since the last call,
+    appending the new entries to the index file, so the index follows the
+    file as it is tailed for the cost of one parsed line per `stride`
+    bytes.
+
+    Offsets of compressed files are offsets in their decompressed content,
+    which `CompressedFile` seeks to from its closest checkpoint.
+
+    The index file holds the inode of the file it indexes, and is rebuilt
+    if it does not match the file (e.g. after rotation) or the file is
+    truncated. If it cannot be written, the index is only kept in memory.
+
+    Parameters
+    ----------
+    path : str
+        Path of the monitor file.
+    parser : `TimestampParser`
+    stride : int
+        Bytes between entries.
+    """
+    dtype = np.dtype([('time', '<i8'), ('offset', '<i8'), ('kind', '<i8')])
+    RECORD = 0
+    SESSION = 1
+    # Bytes read at a time when catching up with the file
+    block_size = 2**22
+
+    def __init__(self, path, parser, stride=2**16):
+        self.path = path
+        self.parser = parser
+        self.stride = stride
+        self.inode = os.stat(path).st_ino
+        self.entries = np.zeros(0, dtype=self.dtype)
+        # Offset up to which the file is indexed, always a line start
+        self.end = 0
+        self._next = 0
+        self.persist = True
+        self._write_header()
+
+    @property
+    def index_path(self):
+        return self.path + '.idx'
+
+    @classmethod
+    def load(cls, path, parser):
+        """
+        The saved index of the monitor file `path`, or None if there is
+        none or it does not match the file.
+        """
+        try:
+            raw = np.fromfile(path + '.idx', dtype=cls.dtype)
+            with open_monitor(path) as f:
+                inode = os.fstat(f.fileno()).st_ino
+                size = file_size(f)
+                compressed = isinstance(f, CompressedFile)
+        except (OSError, ValueError, ImportError):
+            return None
+        if (not len(raw) or raw[0]['time'] != MAGIC or
+                raw[0]['offset'] != inode):
+            return None
+        index = cls.__new__(cls)
+        index.path = path
+        index.parser = parser
+        index.stride = int(raw[0]['kind'])
+        index.inode = inode
+        index.entries = raw[1:]
+        index.persist = True
+        if len(index.entries):
+            last = index.entries[-1]
+            # Compressed files are not written in place, and checking the
+            # last entry would decompress up to it
+            if last['offset'] >= size or (not compressed and
+                                          not index._check(last)):
+                return None
+            index.end = int(last['offset'])
+            index._next = index.end + index.stride
+        else:
+            index.end = 0
+            index._next = 0
+        return index
+
+    def _check(self, entry):
+        """
+        Whether the line at the offset of `entry` has its time.
+        """
+        with open_monitor(self.path) as f:
+            f.seek(int(entry['offset']))
+            line = f.readline().decode(errors='replace')
+        try:
+            time = self._line_time(line, entry['kind'] == self.SESSION)
+        except (ValueError, IndexError):
+            return False
+        return time == entry['time']
+
+    def _line_time(self, line, session):
+        if session:
+            s = line.split(" ")
+            line = "{} {}".format(s[2], s[3])
+        return self.parser.parse_us(line)
+
+    def _write_header(self):
+        header = np.array([(MAGIC, self.inode, self.stride)], dtype=self.dtype)
+        self._write(header, 'wb')
+
+    def _write(self, entries, mode):
+        if not self.persist:
+            return
+        try:
+            with open(self.index_path, mode) as f:
+                entries.tofile(f)
+        except OSError as e:
+            print("[WARNING] Cannot write monitor index {} ({}), keeping it "
+                  "in memory".format(self.index_path, e))
+            self.persist = False
+
+    def rename(self, path):
+        """
+        Follows the indexed file to its new `path` (e.g. after rotation),
+        moving the index file along.
+        """
+        if path == self.path:
+            return
+        old = self.index_path
+        self.path = path
+        if self.persist:
+            try:
+                os.replace(old, self.index_path)
+            except OSError:
+                self._write_header()
+                self._write(self.entries, 'ab')
+
+    def _rebuild(self):
+        print("[INFO] Rebuilding monitor index {}".format(self.index_path))
+        self.inode = os.stat(self.path).st_ino
+        self.entries = np.zeros(0, dtype=self.dtype)
+        self.end = 0
+        self._next = 0
+        self.persist = True
+        self._write_header()
+
+    def _index_block(self, data, base):
+        """
+        Entries for the complete lines of `data`, which starts at offset
+        `base` at the start of a line.
+        """
+        entries = []
+        last = self.entries['offset'][-1] if len(self.entries) else -1
+        i = data.find(b'Start Monitoring')
+        while i >= 0:
+            start = data.rfind(b'\n', 0, i) + 1
+            stop = data.find(b'\n', i)
+            line = data[start:stop].decode(errors='replace')
+            try:
+                entries.append((self._line_time(line, True), base + start,
+                                self.SESSION))
+            except (ValueError, IndexError):
+                pass
+            i = data.find(b'Start Monitoring', stop)
+        while self._next < base + len(data):
+            if self._next <= base:
+                start = 0
+            else:
+                start = data.find(b'\n', self._next - base - 1) + 1
+                if start == 0:
+                    break
+            # First record from there
+            while start < len(data):
+                stop = data.find(b'\n', start)
+                try:
+                    time = self.parser.parse_us(
+                        data[start:stop].decode(errors='replace'))
+                    break
+                except (ValueError, IndexError):
+                    start = stop + 1
+            else:
+                # Looked for again from the next update
+                break
+            entries.append((time, base + start, self.RECORD))
+            self._next = base + start + self.stride
+        entries = [e for e in entries if e[1] > last]
+        entries.sort(key=lambda e: e[1])
+        return np.array(entries, dtype=self.dtype)
+
+    def update(self):
+        """
+        Indexes the complete lines written since the last call.
+        """
+        try:
+            f = open_monitor(self.path)
+        except FileNotFoundError:
+            return
+        with f:
+            if (os.fstat(f.fileno()).st_ino != self.inode or
+                    file_size(f) < self.end):
+                self._rebuild()
+            f.seek(self.end)
+            while True:
+                data = f.read(self.block_size)
+                complete = data.rfind(b'\n') + 1
+                if not complete:
+                    break
+                new = self._index_block(data[:complete], self.end)
+                if len(new):
+                    self.entries = np.concatenate([self.entries, new])
+                    self._write(new, 'ab')
+                self.end += complete
+                if len(data) < self.block_size:
+                    break
+                f.seek(self.end)
+
+    def seek(self, time):
+        """
+        Offset of a line boundary at or before the first record at or after
+        `time` (datetime64 or datetime).
+        """
+        time = np.datetime64(time, 'us').astype(np.int64)
+        i = np.searchsorted(self.entries['time'], time) - 1
+        if i < 0:
+            return 0
+        return int(self.entries['offset'][i])
+
+    def range(self, start, stop):
+        """
+        Byte range holding the records with start <= time < stop (and
+        possibly a few around them).
+        """
+        lo = self.seek(start)
+        stop = np.datetime64(stop, 'us').astype(np.int64)
+        i = np.searchsorted(self.entries['time'], stop)
+        hi = int(self.entries['offset'][i]) if i < len(self.entries) \
+            else self.end
+        return lo, max(lo, hi)
+
+    def sessions(self):
+        """
+        Start time (datetime64[us]) and offset of every monitoring session.
+        """
+        sessions = self.entries[self.entries['kind'] == self.SESSION]
+        return [(t, int(o)) for t, o in
+                zip(sessions['time'].view('datetime64[us]'),
+                    sessions['offset'])]
@@ -0,0 +1,211 @@
+# Registry of the monitor file line types.
+#
+# A record line is "<date> <time> <type> <token>...", e.g.
+#
+#     2017-05-04 13:01:02:123456 Temperature0 TM 3 25.1
+#     2017-05-04 13:01:02:123456 Chiller GetWaterTemperature 18.2
+#
+# Each line type declares once, for its type token (and, for types that
+# report several quantities, the token that follows it), which measurement
+# it records, how its component is named and where its value is. Tokens are
+# indexed from the start of the line, so the type token is at index 2.
+
+from string import Formatter
+
+LINE_TYPES = dict()
+
+
+def _onoff(token):
+    if token in ('ON', 'On', 'on'):
+        return 1.
+    if token in ('OFF', 'Off', 'off'):
+        return 0.
+    return float(token)
+
+
+class Field:
+    """
+    Quantity recorded by a line type.
+
+    Parameters
+    ----------
+    measurement : str
+    component : str
+        Component name, formatted with the line's tokens, e.g. 'TM{4}_0'.
+    value : int
+        Index of the value token.
+    convert : callable
+        Converts the value token to a float.
+    strip : str
+        Prefix removed from the component name.
+    """
+    def __init__(self, measurement, component, value, convert=float,
+                 strip=''):
+        self.measurement = measurement
+        self.component = component
+        self.value = value
+        self.convert = convert
+        self.strip = strip
+        # Indices of the tokens the component name depends on
+        self.name_tokens = tuple(int(f) for _, f, _, _ in
+                                 Formatter().parse(component) if f)
+
+    def component_name(self, tokens):
+        name = self.component.format(*tokens)
+        if self.strip and name.startswith(self.strip):
+            name = name[len(self.strip):]
+        return name
+
+
+class LineType:
+    """
+    The fields of a type token. Types reporting a single quantity have one
+    field, others select theirs with the token at index `key`, either
+    exactly or, failing that, by one of the `prefixes`.
+    """
+    def __init__(self, token, key=3):
+        self.token = token
+        self.key = key
+        self.field = None
+        self.fields = dict()
+        self.prefixes = []
+
+    def get_field(self, tokens):
+        if self.field is not None:
+            return self.field
+        sub = tokens[self.key]
+        field = self.fields.get(sub)
+        if field is None:
+            for prefix, f in self.prefixes:
+                if sub.startswith(prefix):
+                    return f
+        return field
+
+
+def get_field(tokens):
+    """
+    The field recorded by a line split into `tokens`, None if the line is
+    not a known record.
+    """
+    line_type = LINE_TYPES.get(tokens[2])
+    if line_type is None:
+        return None
+    return line_type.get_field(tokens)
+
+
+def register(token, measurement, component, value, sub=None, prefix=None,
+             convert=float, strip=''):
+    """
+    Registers the quantity reported by lines of type `token` (whose token
+    at index 3 is `sub`, or starts with `prefix`, if given).
+    """
+    line_type = LINE_TYPES.get(token)
+    if line_type is None:
+        line_type = LineType(token)
+        LINE_TYPES[token] = line_type
+    field = Field(measurement, component, value, convert, strip)
+    if sub is not None:
+        line_type.fields[sub] = field
+    elif prefix is not None:
+        line_type.prefixes.append((prefix, field))
+    else:
+        line_type.field = field
+    return field
+
+
+class LineParser:
+    """
+    Decodes monitor file lines, shared by `MonitorReader` and the backfill
+    workers.
+
+    A record's measurement and component are returned as the codes given
+    by `measurement_code` and `component_code` (name -> int), which are
+    only called once per component name.
+
+    Parameters
+    ----------
+    timestamps : `TimestampParser`
+    measurement_code : callable
+    component_code : callable
+    """
+    # Kinds of line returned by `parse`
+    START = 'start'
+    EVENT_DONE = 'event_done'
+    RECORD = 'record'
+
+    def __init__(self, timestamps, measurement_code, component_code):
+        self.timestamps = timestamps
+        self.measurement_code = measurement_code
+        self.component_code = component_code
+        self._codes = dict()
+
+    def parse(self, line):
+        """
+        Decodes a line (with or without its newline).
+
+        Returns
+        -------
+        tuple
+            (START, start datetime) for a "Start Monitoring" line,
+            (EVENT_DONE, None) for the end of a monitoring event,
+            (RECORD, (time in us, measurement code, component code, value))
+            for a record, and (None, None) for any other line.
+
+        Raises
+        ------
+        ValueError, IndexError
+            If the line cannot be decoded.
+        """
+        if 'Start Monitoring' in line:
+            start = line.replace('\n', '').split(" ")
+            return self.START, self.timestamps.parse(
+                "{} {}".format(start[2], start[3]))
+        if 'Number of packets' in line:
+            return None, None
+        if 'Monitoring Event Done' in line:
+            return self.EVENT_DONE, None
+        tokens = line.replace('\n', '').split(" ")
+        field = get_field(tokens)
+        if field is None:
+            return None, None
+        time = self.timestamps.parse_us(line)
+        value = field.convert(tokens[field.value])
+        key = (field,) + tuple(tokens[i] for i in field.name_tokens)
+        codes = self._codes.get(key)
+        if codes is None:
+            codes = (self.measurement_code(field.measurement),
+                     self.component_code(field.component_name(tokens)))
+            self._codes[key] = codes
+        return self.RECORD, (time,) + codes + (value,)
+
+
+# Temperatures
+register('Temperature0', 'temperature', 'TM{4}_0', 5)
+register('Temperature1', 'temperature', 'TM{4}_1', 5)
+register('DACQ1', 'temperature', 'DACQ1', 4, sub='Temperature')
+register('DACQ2', 'temperature', 'DACQ2', 4, sub='Temperature')
+register('Chiller', 'temperature', 'chiller_ambient', 4,
+         sub='GetAmbientTemperature')
+register('Chiller', 'temperature', 'chiller_water', 4,
+         sub='GetWaterTemperature')
+register('SBSensor', 'temperature', '{3}', 4, prefix='TMON_', strip='TMON_')
+
+# Supplies, with the same layout as the temperatures
+register('Voltage0', 'voltage', 'TM{4}_0', 5)
+register('Voltage1', 'voltage', 'TM{4}_1', 5)
+register('Current0', 'current', 'TM{4}_0', 5)
+register('Current1', 'current', 'TM{4}_1', 5)
+for dacq in ('DACQ1', 'DACQ2'):
+    register(dacq, 'voltage', dacq, 4, sub='Voltage')
+    register(dacq, 'current', dacq, 4, sub='Current')
+register('SBSensor', 'voltage', '{3}', 4, prefix='VMON_', strip='VMON_')
+register('SBSensor', 'current', '{3}', 4, prefix='IMON_', strip='IMON_')
+
+# HV readbacks, per module
+register('HV', 'hv_voltage', 'TM{4}', 5, sub='GetVoltage')
+register('HV', 'hv_current', 'TM{4}', 5, sub='GetCurrent')
+
+# Chiller status
+register('Chiller', 'status', 'chiller', 4, sub='GetStatus', convert=_onoff)
+register('Chiller', 'status', 'chiller_alarm', 4, sub='GetAlarm',
+         convert=_onoff)
@@ -1,27 +1,528 @@
 from datetime import datetime, timedelta
-from copy import deepcopy
+from threading import Lock
 import pandas as pd
 import numpy as np
+from chec_operator.readers.backfill import parse_parallel, parse_range
+from chec_operator.readers.compressed import CompressedFile, file_size
+from chec_operator.readers.index import MonitorIndex
+from chec_operator.readers.remote import RemoteSources
+from chec_operator.readers.sources import MonitorSources
+from chec_operator.readers.timestamp import TimestampParser
+from chec_operator.readers.line_types import LineParser
+from chec_operator.readers.rolling import RollingStats, STATISTICS
+
+# Stable slots of the known measurements and components: their codes in a
+# MonitorContainer are their index here. The TM slots match the patch order
+# of the camera display (TM{j}_{i} -> 2j + i).
+MEASUREMENTS = ['temperature', 'voltage', 'current', 'hv_voltage',
+                'hv_current', 'status']
+COMPONENTS = (['TM{}_{}'.format(j, i) for j in range(32) for i in range(2)] +
+              ['EX1', 'EX2', 'EX3', 'EX4', 'EX5', 'DACQ1', 'DACQ2',
+               'chiller_ambient', 'chiller_water'])
 
 
 class MonitorContainer:
-    def __init__(self, n_records):
+    """
+    Fixed-capacity buffer of the most recent monitor records, stored
+    column-wise in a structured numpy array.
+
+    The records live in a backing array of twice the capacity, and are
+    appended at the end of the occupied window. When the backing array is
+    full, the newest `n_records` are copied to the start of a fresh
+    backing array, so appending is amortised O(1) and the window is always
+    contiguous and in time order. `view` therefore needs no copy, and
+    views already handed out stay valid when the buffer is compacted.
+
+    Measurement and component names are stored as small integer codes,
+    looked up in `measurements` and `components`. The known ones
+    (`MEASUREMENTS` and `COMPONENTS`) have fixed codes, others are assigned
+    on first appearance.
+
+    The latest time and value of every component are also kept, as dense
+    arrays indexed by component code, see `latest`. So are the rolling
+    statistics of the components of the `rolling` measurements, updated
+    on append, see `rolling_stats`.
+    """
+    dtype = np.dtype([('time', 'datetime64[us]'),
+                      ('measurement', 'u1'),
+                      ('component', 'u2'),
+                      ('value', 'f8')])
+
+    def __init__(self, n_records, rolling=None, windows=(60, 600, 3600)):
         self.start_time = 0
-        index = np.arange(n_records)
-        columns = ['dt', 'measurement', 'component', 'value']
-        self.df = pd.DataFrame(np.nan, index=index, columns=columns)
+        self.capacity = n_records
+        self._data = np.zeros(2 * n_records, dtype=self.dtype)
+        self._start = 0
+        self._stop = 0
+        self.measurements = []
+        self.components = []
+        self._measurement_codes = dict()
+        self._component_codes = dict()
+        self.version = 0
+        for name in MEASUREMENTS:
+            self.measurement_code(name)
+        for name in COMPONENTS:
+            self.component_code(name)
+        shape = (len(MEASUREMENTS) + 4, len(COMPONENTS) + 32)
+        self._latest_time = np.full(shape, np.datetime64('NaT'),
+                                    dtype='datetime64[us]')
+        self._latest_value = np.full(shape, np.nan)
+        self._latest_shared = False
+        self.rolling = None
+        if rolling:
+            self.rolling = RollingStats([self.measurement_code(name)
+                                         for name in rolling], windows)
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def measurement_code(self, name):
+        code = self._measurement_codes.get(name)
+        if code is None:
+            code = len(self.measurements)
+            self.measurements.append(name)
+            self._measurement_codes[name] = code
+        return code
+
+    def component_code(self, name):
+        code = self._component_codes.get(name)
+        if code is None:
+            code = len(self.components)
+            self.components.append(name)
+            self._component_codes[name] = code
+        return code
+
+    def _compact(self, keep):
+        data = np.zeros(len(self._data), dtype=self.dtype)
+        data[:keep] = self._data[self._stop - keep:self._stop]
+        self._data = data
+        self._start = 0
+        self._stop = keep
+
+    def _own_latest(self, measurement, component):
+        """
+        Makes the latest arrays private to the container (they are shared
+        with the last snapshot until the next write) and large enough for
+        the codes.
+        """
+        n_m, n_c = self._latest_value.shape
+        shape = (max(n_m, 2 * measurement + 1), max(n_c, 2 * component + 1))
+        latest_time = np.full(shape, np.datetime64('NaT'),
+                              dtype='datetime64[us]')
+        latest_value = np.full(shape, np.nan)
+        latest_time[:n_m, :n_c] = self._latest_time
+        latest_value[:n_m, :n_c] = self._latest_value
+        self._latest_time = latest_time
+        self._latest_value = latest_value
+        self._latest_shared = False
+
+    def append(self, time, measurement, component, value):
+        """
+        Appends a record, dropping the oldest if the buffer is full.
+
+        Parameters
+        ----------
+        time : datetime or numpy.datetime64
+        measurement : int
+            Code from `measurement_code`.
+        component : int
+            Code from `component_code`.
+        value : float
+        """
+        if self._stop == len(self._data):
+            self._compact(self.capacity - 1)
+        self._data[self._stop] = (time, measurement, component, value)
+        self._stop += 1
+        if (self._latest_shared or
+                measurement >= self._latest_value.shape[0] or
+                component >= self._latest_value.shape[1]):
+            self._own_latest(measurement, component)
+        self._latest_time[measurement, component] = time
+        self._latest_value[measurement, component] = value
+        if self.rolling is not None:
+            self.rolling.extend(
+                [np.datetime64(time, 'us').astype(np.int64)],
+                [measurement], [component], [value])
+        if self._stop - self._start > self.capacity:
+            self._start += 1
+
+    def extend(self, times, measurements, components, values):
+        """
+        Appends a block of records, given column by column (arrays or
+        lists of equal length, with times as datetime64[us] or as integer
+        microseconds since the epoch).
+        """
+        times = np.asarray(times)
+        if times.dtype != np.dtype('datetime64[us]'):
+            times = times.astype(np.int64).view('datetime64[us]')
+        measurements = np.asarray(measurements, dtype=np.int64)
+        components = np.asarray(components, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if not n:
+            return
+
+        # Latest record of each (measurement, component) in the block
+        m_max = int(measurements.max())
+        c_max = int(components.max())
+        if (self._latest_shared or m_max >= self._latest_value.shape[0] or
+                c_max >= self._latest_value.shape[1]):
+            self._own_latest(m_max, c_max)
+        key = measurements * self._latest_value.shape[1] + components
+        _, last = np.unique(key[::-1], return_index=True)
+        last = n - 1 - last
+        m = measurements[last]
+        c = components[last]
+        self._latest_time[m, c] = times[last]
+        self._latest_value[m, c] = values[last]
+        if self.rolling is not None:
+            self.rolling.extend(times.view(np.int64), measurements,
+                                components, values)
+
+        if n > self.capacity:
+            times = times[-self.capacity:]
+            measurements = measurements[-self.capacity:]
+            components = components[-self.capacity:]
+            values = values[-self.capacity:]
+            n = self.capacity
+        if self._stop + n > len(self._data):
+            self._compact(min(self.capacity - n, len(self)))
+        block = self._data[self._stop:self._stop + n]
+        block['time'] = times
+        block['measurement'] = measurements
+        block['component'] = components
+        block['value'] = values
+        self._stop += n
+        self._start = max(self._start, self._stop - self.capacity)
 
     def update(self, row):
-        if not self.df['dt'].isnull().any():
-            self.df.shift(-1)
-        self.df.fillna(row, limit=1)
+        self.append(row['dt'],
+                    self.measurement_code(row['measurement']),
+                    self.component_code(row['component']),
+                    row['value'])
+
+    def view(self):
+        """
+        The buffered records in time order, as a view into the buffer
+        (no copy).
+        """
+        return self._data[self._start:self._stop]
+
+    def latest(self, measurement):
+        """
+        The time and value of the latest record of every component for
+        `measurement` (name or code).
+
+        Returns
+        -------
+        times : numpy.ndarray
+            datetime64[us], NaT for components without a record.
+        values : numpy.ndarray
+            Indexed by component code, NaN for components without a record.
+        """
+        return _latest(self._latest_time, self._latest_value,
+                       self._measurement_codes, measurement,
+                       len(self.components))
+
+    def rolling_stats(self, measurement):
+        """
+        Rolling statistics of every component for `measurement` (name or
+        code), None if it is not tracked.
+
+        Returns
+        -------
+        dict
+            'windows' (seconds), and 'count', 'mean', 'std', 'min' and
+            'max' arrays of shape (windows, components), indexed by
+            component code, with NaN for components without a record.
+        """
+        if self.rolling is None:
+            return None
+        return _rolling(self.rolling.freeze(), self._measurement_codes,
+                        measurement, self.rolling.windows,
+                        len(self.components))
+
+    def to_dataframe(self):
+        """
+        The buffered records as a `pandas.DataFrame` with the columns dt,
+        component and value, indexed by measurement.
+        """
+        return _to_dataframe(self.view(), self.measurements, self.components)
+
+    @property
+    def df(self):
+        return self.to_dataframe()
+
+    def snapshot(self):
+        """
+        Publishes the current contents as an immutable `MonitorSnapshot`,
+        in O(1).
+        """
+        self.version += 1
+        self._latest_shared = True
+        return MonitorSnapshot(self, self.version)
+
+
+class MonitorSnapshot:
+    """
+    Immutable view of a `MonitorContainer` at the moment it was published.
+
+    Only a reference to the container's backing array and the bounds of
+    its window are kept, nothing is copied. This is safe because the
+    container never modifies records once written: appends go beyond the
+    end of the window and compaction moves the records into a fresh
+    backing array (copy-on-write), leaving the snapshot's array untouched.
+    The records returned by `view` are read-only.
+
+    Snapshots are ordered by `version`, which increases with every publish.
+    """
+    def __init__(self, container, version):
+        self._data = container._data
+        self._start = container._start
+        self._stop = container._stop
+        self.version = version
+        self.start_time = container.start_time
+        # Codes are only ever added, so the names of the codes present in
+        # the snapshot never change
+        self.measurements = container.measurements
+        self.components = container.components
+        self._measurement_codes = container._measurement_codes
+        self._n_components = len(container.components)
+        self._latest_time = container._latest_time
+        self._latest_value = container._latest_value
+        self._rolling = dict()
+        self._windows = []
+        if container.rolling is not None:
+            self._rolling = container.rolling.freeze()
+            self._windows = container.rolling.windows
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def view(self):
+        records = self._data[self._start:self._stop]
+        records.flags.writeable = False
+        return records
+
+    def latest(self, measurement):
+        return _latest(self._latest_time, self._latest_value,
+                       self._measurement_codes, measurement,
+                       self._n_components)
+
+    def latest_table(self):
+        """
+        Time and value of the latest record of every measurement and
+        component, as read-only arrays indexed by their codes (possibly
+        larger than the number of names, with NaT and NaN beyond).
+        """
+        times = self._latest_time.view()
+        values = self._latest_value.view()
+        times.flags.writeable = False
+        values.flags.writeable = False
+        return times, values
+
+    def rolling_stats(self, measurement):
+        if not self._rolling:
+            return None
+        return _rolling(self._rolling, self._measurement_codes, measurement,
+                        self._windows, self._n_components)
+
+    def to_dataframe(self):
+        return _to_dataframe(self.view(), self.measurements, self.components)
+
+    @property
+    def df(self):
+        return self.to_dataframe()
+
+
+def _latest(latest_time, latest_value, measurement_codes, measurement,
+            n_components):
+    if not isinstance(measurement, int):
+        measurement = measurement_codes.get(measurement)
+    n_m, n_c = latest_value.shape
+    if measurement is not None and measurement < n_m and n_components <= n_c:
+        times = latest_time[measurement, :n_components]
+        values = latest_value[measurement, :n_components]
+    else:
+        # Measurement or components registered but not yet recorded
+        times = np.full(n_components, np.datetime64('NaT'),
+                        dtype='datetime64[us]')
+        values = np.full(n_components, np.nan)
+        if measurement is not None and measurement < n_m:
+            times[:n_c] = latest_time[measurement]
+            values[:n_c] = latest_value[measurement]
+    times.flags.writeable = False
+    values.flags.writeable = False
+    return times, values
+
+
+def _rolling(frozen, measurement_codes, measurement, windows,
+             n_components):
+    """
+    The frozen arrays of a measurement, trimmed to the known components.
+    """
+    if not isinstance(measurement, int):
+        measurement = measurement_codes.get(measurement)
+    arrays = frozen.get(measurement)
+    if arrays is None:
+        return None
+    stats = dict(windows=windows)
+    for name in STATISTICS:
+        array = arrays[name][:, :n_components]
+        if array.shape[1] < n_components:
+            pad = np.zeros((len(windows), n_components)) if name == 'count' \
+                else np.full((len(windows), n_components), np.nan)
+            pad[:, :array.shape[1]] = array
+            array = pad
+        array = array.view()
+        array.flags.writeable = False
+        stats[name] = array
+    return stats
+
+
+def _to_dataframe(records, measurements, components):
+    measurements = np.array(measurements + [''], dtype=object)
+    components = np.array(components + [''], dtype=object)
+    df = pd.DataFrame(dict(
+        measurement=measurements[records['measurement']],
+        dt=records['time'],
+        component=components[records['component']],
+        value=records['value'],
+    ))
+    return df.set_index('measurement')
+
+
+def _next_line_start(file, offset):
+    """
+    Offset of the first line that starts at or after `offset`.
+    """
+    if offset <= 0:
+        return 0
+    file.seek(offset - 1)
+    file.readline()
+    return file.tell()
+
+
+def _first_record_time(file, offset, stop, parser):
+    """
+    Time of the first record (a line starting with a timestamp) that starts
+    in [offset, stop), or None if there is none.
+    """
+    file.seek(_next_line_start(file, offset))
+    while file.tell() < stop:
+        line = file.readline()
+        if not line.endswith(b'\n'):
+            # Incomplete last line
+            return None
+        try:
+            return parser.parse(line.decode(errors='replace'))
+        except ValueError:
+            continue
+    return None
+
+
+def _scan_time(file, time, parser):
+    """
+    Offset of the first record at or after `time`, reading from the start.
+    """
+    file.seek(0)
+    offset = 0
+    while True:
+        line = file.readline()
+        if not line.endswith(b'\n'):
+            return offset
+        try:
+            if parser.parse(line.decode(errors='replace')) >= time:
+                return offset
+        except ValueError:
+            pass
+        offset = file.tell()
+
+
+def seek_time(file, time, parser, block=4096):
+    """
+    Byte offset in the time-ordered monitor `file` (opened in binary mode)
+    of a line boundary at or before the first record at or after `time`.
+
+    The offset is found by bisecting on byte offsets, resynchronising to
+    the next line boundary at each probe, so only O(log(size)) lines are
+    read. The bisection stops once the range is smaller than `block`
+    bytes, the remaining lines are for the caller to filter.
+
+    zstd compressed files are scanned forward instead, as every backward
+    probe would decompress them from the start of the frame again.
+    """
+    position = file.tell()
+    if isinstance(file, CompressedFile) and file.codec == 'zstd':
+        offset = _scan_time(file, time, parser)
+        file.seek(position)
+        return offset
+    file.seek(0, 2)
+    lo = 0
+    hi = file.tell()
+    while hi - lo > block:
+        mid = (lo + hi) // 2
+        t = _first_record_time(file, mid, hi, parser)
+        if t is not None and t < time:
+            lo = mid
+        else:
+            hi = mid
+    offset = _next_line_start(file, lo)
+    file.seek(position)
+    return offset
 
 
 class MonitorReader:
-    def __init__(self, path):
+    """
+    Parses monitor files into a `MonitorContainer` holding the last 12
+    hours, publishing a snapshot of it as `container` after every
+    monitoring event.
+
+    `path` may be a file, a directory or a glob pattern, see
+    `MonitorSources`: the lines of all the matching files are merged in
+    time order, and new files are followed as they appear.
+
+    If a `MonitorArchive` is given, every parsed record is also appended
+    to it along with the read offset of every file. On opening, the window
+    is backfilled from the archive and each file is read from its saved
+    offset, so nothing already archived is parsed again.
+
+    If a `MonitorHistory` is given, every parsed (and archived) record is
+    added to its aggregates.
+
+    With `processes` > 1, files with more than `parallel_min_bytes` to read
+    on opening are parsed in chunks by a pool of that many processes.
+
+    The sidecar `MonitorIndex` of each file is loaded if present and kept
+    up to date as the file is read, and built the first time it is needed
+    otherwise. `read_range` uses it to read any time range of the files
+    by seeking straight to it.
+
+    With a `transport` (see `RemoteSources`), `path` is a file on the
+    host at the other end, which is streamed from a `MonitorServer`
+    instead. Remote files have no indexes nor parallel backfill.
+    """
+    # Smaller backlogs are not worth starting the worker processes for
+    parallel_min_bytes = 4 * 2**20
+
+    def __init__(self, path, archive=None, history=None, processes=1,
+                 transport=None):
         self._path = None
+        self.archive = archive
+        self.transport = transport
+        self.history = history
+        self.processes = processes
 
-        self.file = None
+        self.sources = None
+        self.indexes = dict()
+        self._index_lock = Lock()
+        self.timestamps = TimestampParser()
+        # Parsed records not yet in the building container, column by
+        # column: times (us since epoch), measurements, components, values
+        self._pending = ([], [], [], [])
+        # Records in the building container not yet in the archive and
+        # history
+        self._unstored = ([], [], [], [])
         self.lines = None
         self.container = None
 
@@ -29,7 +530,11 @@ class MonitorReader:
         self.earliest_record = datetime.now() - timedelta(hours=h)
         self.max_records = h * 60 * 60
 
-        self.building_container = MonitorContainer(self.max_records)
+        self.building_container = MonitorContainer(self.max_records,
+                                                   rolling=['temperature'])
+        bc = self.building_container
+        self._line_parser = LineParser(self.timestamps, bc.measurement_code,
+                                       bc.component_code)
 
         self.path = path
 
@@ -40,91 +545,172 @@ class MonitorReader:
     @path.setter
     def path(self, val):
         self._path = val
-        self.file = open(val, "r")
-        self.init_file(self.file)
+        if self.sources is not None:
+            self.sources.close()
+        with self._index_lock:
+            self.indexes = dict()
+        if self.transport is not None:
+            self.sources = RemoteSources(self.transport, self.timestamps)
+        else:
+            self.sources = MonitorSources(val, self.timestamps)
+        self.init_file(self.sources)
 
-    def init_file(self, file):
-        print("Initialising monitor file, ignoring entries before: {}"
+    def backfill(self):
+        """
+        Fills the building container with the archived records inside the
+        window, and the history with all of them.
+
+        Returns
+        -------
+        numpy.datetime64
+            Time of the last archived record, NaT if there is none.
+        """
+        archive = self.archive
+        if archive is None or not len(archive):
+            return np.datetime64('NaT')
+        if self.history is not None:
+            self.history.backfill(archive)
+        bc = self.building_container
+        records = archive.read(self.earliest_record)
+        if len(records['time']):
+            m_lookup = np.array([bc.measurement_code(name)
+                                 for name in archive.measurements])
+            c_lookup = np.array([bc.component_code(name)
+                                 for name in archive.components])
+            bc.extend(records['time'],
+                      m_lookup[records['measurement']],
+                      c_lookup[records['component']],
+                      records['value'])
+            self.container = bc.snapshot()
+        print("Backfilled {} records from archive {}"
+              .format(len(records['time']), archive.path))
+        return archive.stop
+
+    def init_file(self, sources):
+        print("Initialising monitor files, ignoring entries before: {}"
               .format(self.earliest_record))
-        lines = self.file.readlines()
-        if lines:
-            for line in lines:
-                data = line.replace('\n', '').split(" ")
-                try:
-                    dt = datetime.strptime("{} {}".format(data[0], data[1]),
-                                           "%Y-%m-%d %H:%M:%S:%f")
-                    if dt < self.earliest_record:
-                        continue
-                    else:
-                        self.parse_line(line)
-                except IndexError:
-                    pass
-        print("Monitor file initialised")
+        resume = np.datetime64(self.earliest_record, 'us')
+        archived = self.backfill()
+        if not np.isnat(archived) and archived >= resume:
+            # Records up to the last archived one are already in
+            resume = archived + np.timedelta64(1, 'us')
+        offsets = dict()
+        if self.archive is not None:
+            offsets = self.archive.load_offsets()
+        if isinstance(sources, RemoteSources):
+            sources.resume(offsets, resume)
+        for key in sources.scan():
+            self._load_index(key)
+        for key, tailer in sources.tailers.items():
+            saved = offsets.get(key)
+            size = file_size(tailer.file)
+            if (saved is not None and saved['offset'] <= size and
+                    saved['start'] == sources.starts[key].isoformat()):
+                tailer.seek(saved['offset'])
+                # The records appended to the archive after the offsets
+                # were last saved (e.g. before a crash) are read again
+                sources.skip_before(key, resume)
+            else:
+                # Skip straight to the window, rather than parsing
+                # everything before it
+                index = self.indexes.get(key)
+                if index is not None:
+                    tailer.seek(index.seek(resume))
+                else:
+                    tailer.seek(seek_time(tailer.file,
+                                          resume.astype(datetime),
+                                          self.timestamps))
+                sources.skip_before(key, resume)
+        if self.processes > 1:
+            self.parallel_backfill(sources, resume)
+        self.refresh()
+        print("Monitor files initialised")
+
+    def parallel_backfill(self, sources, resume):
+        """
+        Parses the backlog of the files with more than `parallel_min_bytes`
+        left to read in parallel, merges the records in time order into
+        the building container (and the stores), and moves the files'
+        read positions past it.
+        """
+        blocks = []
+        for rank, (key, tailer) in enumerate(sources.tailers.items()):
+            if isinstance(tailer.file, CompressedFile):
+                # Each worker would decompress from the start of the file
+                continue
+            start = tailer.position
+            stop = file_size(tailer.file)
+            if stop - start < self.parallel_min_bytes:
+                continue
+            results = parse_parallel(tailer.path, start, stop,
+                                     self.processes)
+            for result in results:
+                blocks.append((rank, result))
+            tailer.seek(results[-1]['end'])
+            # Records before `resume` are dropped here rather than by the
+            # sources
+            sources.skip_before(key, None)
+        if not blocks:
+            return
+
+        bc = self.building_container
+        columns = ([], [], [], [])
+        ranks = []
+        errors = 0
+        for rank, result in blocks:
+            m_lookup = np.array([bc.measurement_code(name)
+                                 for name in result['measurements']] + [0])
+            c_lookup = np.array([bc.component_code(name)
+                                 for name in result['components']] + [0])
+            columns[0].append(result['time'])
+            columns[1].append(m_lookup[result['measurement']])
+            columns[2].append(c_lookup[result['component']])
+            columns[3].append(result['value'])
+            ranks.append(np.full(len(result['time']), rank))
+            errors += result['errors']
+            if result['start_time'] is not None:
+                bc.start_time = result['start_time']
+        times, measurements, components, values = \
+            [np.concatenate(c) for c in columns]
+        ranks = np.concatenate(ranks)
+        inside = times >= resume.astype(np.int64)
+        # Merge the files in time order, keeping the file order of equal
+        # times and the line order within a file
+        order = np.lexsort((np.arange(len(times)), ranks, times))
+        order = order[inside[order]]
+        times = times[order]
+        measurements = measurements[order]
+        components = components[order]
+        values = values[order]
+
+        bc.extend(times, measurements, components, values)
+        for store in (self.archive, self.history):
+            if store is not None:
+                store.append(times, measurements, components, values,
+                             bc.measurements, bc.components)
+        if self.archive is not None:
+            self.archive.save_offsets(sources.offsets())
+        self.container = bc.snapshot()
+        if errors:
+            print("[WARNING] {} monitor lines could not be parsed"
+                  .format(errors))
+        print("Parsed {} records with {} processes"
+              .format(len(times), self.processes))
 
     def parse_line(self, line):
         try:
-            bc = self.building_container
-            if 'Start Monitoring' in line:
-                start = line.replace('\n', '').split(" ")
-                sdt = datetime.strptime("{} {}".format(start[2], start[3]),
-                                        "%Y-%m-%d %H:%M:%S:%f")
-                bc.start_time = sdt
-                return
-            if 'Number of packets' in line:
-                return
-            if 'Monitoring Event Done' in line:
-                self.container = deepcopy(bc)
-                return
-            data = line.replace('\n', '').split(" ")
-            dt = datetime.strptime("{} {}".format(data[0], data[1]),
-                                   "%Y-%m-%d %H:%M:%S:%f")
-            type = data[2]
-            if type == 'Temperature0':
-                d = dict(dt=dt,
-                         measurement='temperature',
-                         component='TM{}_{}'.format(data[4], '0'),
-                         value=float(data[5]))
-                bc.update(d)
-            elif type == 'Temperature1':
-                d = dict(dt=dt,
-                         measurement='temperature',
-                         component='TM{}_{}'.format(data[4], '1'),
-                         value=float(data[5]))
-                bc.update(d)
-            elif type == 'DACQ1':
-                if data[3] == 'Temperature':
-                    d = dict(dt=dt,
-                             measurement='temperature',
-                             component='DACQ1',
-                             value=float(data[4]))
-                    bc.update(d)
-            elif type == 'DACQ2':
-                if data[3] == 'Temperature':
-                    d = dict(dt=dt,
-                             measurement='temperature',
-                             component='DACQ2',
-                             value=float(data[4]))
-                    bc.update(d)
-            elif type == 'Chiller':
-                if data[3] == 'GetAmbientTemperature':
-                    d = dict(dt=dt,
-                             measurement='temperature',
-                             component='chiller_ambient',
-                             value=float(data[4]))
-                    bc.update(d)
-                elif data[3] == 'GetWaterTemperature':
-                    d = dict(dt=dt,
-                             measurement='temperature',
-                             component='chiller_water',
-                             value=float(data[4]))
-                    bc.update(d)
-            elif type == 'SBSensor':
-                if 'TMON_EX' in data[3]:
-                    d = dict(dt=dt,
-                             measurement='temperature',
-                             component=data[3].replace('TMON_', ''),
-                             value=float(data[4]))
-                    bc.update(d)
+            kind, parsed = self._line_parser.parse(line)
+            if kind == LineParser.RECORD:
+                times, measurements, components, values = self._pending
+                times.append(parsed[0])
+                measurements.append(parsed[1])
+                components.append(parsed[2])
+                values.append(parsed[3])
+            elif kind == LineParser.START:
+                self.building_container.start_time = parsed
+            elif kind == LineParser.EVENT_DONE:
+                self.flush()
+                self.container = self.building_container.snapshot()
         except ValueError:
             print("ValueError on following line:")
             print(line)
@@ -134,12 +720,138 @@ class MonitorReader:
             print(line)
             return
 
-    def refresh(self):
-        # line = self.file.readline()
-        # if line:
-        #     self.parse_line(line)
+    def flush(self):
+        """
+        Moves the parsed records into the building container.
+        """
+        if self._pending[0]:
+            bc = self.building_container
+            bc.extend(*self._pending)
+            if self.archive is not None or self.history is not None:
+                for column, pending in zip(self._unstored, self._pending):
+                    column.extend(pending)
+            self._pending = ([], [], [], [])
 
-        lines = self.file.readlines()
+    def write_stores(self):
+        """
+        Appends the records parsed since the last call to the archive and
+        the history, which is done once per read rather than per
+        monitoring event.
+        """
+        if self._unstored[0]:
+            bc = self.building_container
+            for store in (self.archive, self.history):
+                if store is not None:
+                    store.append(*self._unstored, bc.measurements,
+                                 bc.components)
+            self._unstored = ([], [], [], [])
+
+    def refresh(self):
+        for key in self.sources.scan():
+            self._load_index(key)
+        lines = self.sources.read()
         if lines:
             for line in lines:
                 self.parse_line(line)
+            self.flush()
+            self.write_stores()
+            if self.archive is not None:
+                self.archive.save_offsets(self.sources.offsets())
+            self.update_indexes()
+
+    def _load_index(self, key):
+        tailer = self.sources.tailers[key]
+        index = MonitorIndex.load(tailer.path, TimestampParser())
+        if index is not None:
+            with self._index_lock:
+                self.indexes[key] = index
+
+    def update_indexes(self):
+        """
+        Brings the loaded indexes up to date with their files, dropping
+        those of the files no longer followed.
+        """
+        with self._index_lock:
+            for key in list(self.indexes):
+                tailer = self.sources.tailers.get(key)
+                if tailer is None:
+                    del self.indexes[key]
+                    continue
+                index = self.indexes[key]
+                index.rename(tailer.path)
+                index.update()
+
+    def index(self, key):
+        """
+        The up to date index of file `key`, built if it has none.
+        """
+        with self._index_lock:
+            index = self.indexes.get(key)
+            if index is None:
+                path = self.sources.tailers[key].path
+                index = MonitorIndex(path, TimestampParser())
+                self.indexes[key] = index
+            index.update()
+            return index
+
+    def sessions(self):
+        """
+        Start time, file and offset of every monitoring session in the
+        followed files.
+        """
+        sessions = []
+        for key in list(self.sources.tailers):
+            index = self.index(key)
+            sessions.extend((t, index.path, o) for t, o in index.sessions())
+        return sorted(sessions)
+
+    def read_range(self, start, stop):
+        """
+        The records with start <= time < stop in the followed files, read
+        by seeking straight to them through the files' indexes.
+
+        Returns
+        -------
+        pandas.DataFrame
+            As `MonitorContainer.to_dataframe`.
+        """
+        t0 = np.datetime64(start, 'us').astype(np.int64)
+        t1 = np.datetime64(stop, 'us').astype(np.int64)
+        m_codes = dict()
+        c_codes = dict()
+        columns = ([], [], [], [])
+        for key in list(self.sources.tailers):
+            index = self.index(key)
+            lo, hi = index.range(start, stop)
+            if hi <= lo:
+                continue
+            result = parse_range(index.path, lo, hi)
+            m_lookup = np.array([m_codes.setdefault(n, len(m_codes))
+                                 for n in result['measurements']] + [0])
+            c_lookup = np.array([c_codes.setdefault(n, len(c_codes))
+                                 for n in result['components']] + [0])
+            inside = (result['time'] >= t0) & (result['time'] < t1)
+            columns[0].append(result['time'][inside])
+            columns[1].append(m_lookup[result['measurement'][inside]])
+            columns[2].append(c_lookup[result['component'][inside]])
+            columns[3].append(result['value'][inside])
+        measurements = list(m_codes)
+        components = list(c_codes)
+        if columns[0]:
+            times, m, c, values = [np.concatenate(column)
+                                   for column in columns]
+        else:
+            times, m, c, values = [np.zeros(0, dtype=np.int64)] * 3 + \
+                                  [np.zeros(0)]
+        order = np.argsort(times, kind='stable')
+        records = dict(time=times[order].view('datetime64[us]'),
+                       measurement=m[order], component=c[order],
+                       value=values[order])
+        return _to_dataframe(records, measurements, components)
+
+    def wait(self, timeout=None):
+        """
+        Blocks until a monitor file is written to or created, or for at
+        most `timeout` seconds.
+        """
+        return self.sources.wait(timeout)
@@ -0,0 +1,647 @@
+import json
+import os
+import select
+import shlex
+import socket
+import struct
+import subprocess
+import sys
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from os.path import abspath, dirname, join
+from threading import Thread
+from time import time, sleep
+import numpy as np
+from chec_operator.readers.compressed import CompressedFile, open_monitor, \
+    file_size
+from chec_operator.readers.sources import MonitorSources, file_start_time
+from chec_operator.readers.tail import Inotify
+from chec_operator.readers.timestamp import TimestampParser
+
+# Frames are a type byte and the payload length, followed by the payload.
+# Client to server:
+#   RESUME  json: key, start and offset of the last line received, and the
+#           earliest time wanted (us since epoch) if they cannot be resumed
+#           from
+#   ACK     total bytes of lines received on the connection
+# Server to client:
+#   FILE    json: key, path, start time and offset of the file the next
+#           lines come from, and whether it was positioned by time
+#   DATA    offset in the file of the lines, offset after them, then the
+#           lines, compressed by the zlib stream of the connection
+#   HEARTBEAT sent when idle, so a dead connection is noticed
+#   ERROR   text
+_HEADER = struct.Struct('!cI')
+_OFFSETS = struct.Struct('!QQ')
+_ACK = struct.Struct('!Q')
+RESUME = b'R'
+ACK = b'A'
+FILE = b'F'
+DATA = b'D'
+HEARTBEAT = b'H'
+ERROR = b'E'
+
+
+def _frame(kind, payload=b''):
+    return _HEADER.pack(kind, len(payload)) + payload
+
+
+def _write(fd, data):
+    view = memoryview(data)
+    while view:
+        n = os.write(fd, view)
+        view = view[n:]
+
+
+class _FrameReader:
+    """
+    Splits the bytes received on a connection into frames.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+
+    def frames(self):
+        frames = []
+        i = 0
+        buffer = self.buffer
+        while len(buffer) - i >= _HEADER.size:
+            kind, length = _HEADER.unpack_from(buffer, i)
+            end = i + _HEADER.size + length
+            if len(buffer) < end:
+                break
+            frames.append((kind, bytes(buffer[i + _HEADER.size:end])))
+            i = end
+        del buffer[:i]
+        return frames
+
+
+class MonitorServer:
+    """
+    Streams a monitor file to a `RemoteSources` over a connection given as
+    a pair of file descriptors: the two ends of a pipe (e.g. the stdin and
+    stdout of a process started by ssh, see `serve`), or a socket twice
+    (see `listen`).
+
+    Only complete lines are sent, compressed by a zlib stream that is
+    flushed at the end of every frame. The file is followed like `tail
+    -F`: truncation restarts it from its start, and once a replaced file
+    (rotation) has been sent to its end the new file is sent from its
+    start.
+
+    The stream is flow controlled by the client: no more than `window`
+    bytes of lines are sent ahead of those the client acknowledged. The
+    file is read no faster than the client consumes it, so neither side
+    buffers more than that whatever the backlog, and a slow link or
+    client does not make the server grow.
+
+    A connection starts with the client asking to resume from the file
+    (identified by device and inode, looked up in the file's directory if
+    it was renamed by rotation) and offset of its last received line. If
+    they are no longer valid, the current file is sent from the first
+    record at or after the time the client gives, found by bisection.
+
+    Parameters
+    ----------
+    path : str
+    rfd, wfd : int
+        File descriptors the client's frames are read from and the
+        server's frames written to.
+    window : int
+        Bytes of lines sent ahead of the client's acknowledgement.
+    level : int
+        zlib compression level.
+    heartbeat : float
+        Seconds without anything to send before a heartbeat is sent.
+    poll_interval : float
+        Seconds between polls of the file when inotify is not available.
+    """
+    chunk_size = 2**16
+
+    def __init__(self, path, rfd, wfd, window=2**22, level=1, heartbeat=5,
+                 poll_interval=0.1):
+        self.path = path
+        self.rfd = rfd
+        self.wfd = wfd
+        self.window = window
+        self.heartbeat = heartbeat
+        self.poll_interval = poll_interval
+        self.parser = TimestampParser()
+        self._compress = zlib.compressobj(level)
+        self._frames = _FrameReader()
+        self.file = None
+        self.key = None
+        self.position = 0
+        self._partial = b''
+        self.sent = 0
+        self.acked = 0
+        self._last_send = time()
+        self.inotify = None
+        try:
+            self.inotify = Inotify(path)
+        except (OSError, AttributeError):
+            pass
+
+    def _send(self, kind, payload=b''):
+        _write(self.wfd, _frame(kind, payload))
+        self._last_send = time()
+
+    def _receive(self):
+        """
+        Handles the frames from the client, returning False once it has
+        closed the connection.
+        """
+        data = os.read(self.rfd, 2**16)
+        if not data:
+            return False
+        self._frames.feed(data)
+        for kind, payload in self._frames.frames():
+            if kind == ACK:
+                self.acked = _ACK.unpack(payload)[0]
+            elif kind == RESUME:
+                self._resume(json.loads(payload.decode()))
+        return True
+
+    def _find(self, key):
+        """
+        Path of the file `key` (device:inode), renamed or not, else None.
+        """
+        directory = dirname(abspath(self.path))
+        for name in [self.path] + [join(directory, n)
+                                   for n in os.listdir(directory)]:
+            try:
+                if MonitorSources.file_key(os.stat(name)) == key:
+                    return name
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _open(self, path, offset=0, by_time=False):
+        if self.file is not None:
+            self.file.close()
+        self.file = open_monitor(path)
+        self.key = MonitorSources.file_key(os.fstat(self.file.fileno()))
+        self.file.seek(offset)
+        self.position = offset
+        self._partial = b''
+        self._send(FILE, json.dumps(dict(
+            key=self.key, path=path, offset=offset, by_time=by_time,
+            start=file_start_time(path, self.parser).isoformat()
+        )).encode())
+
+    def _resume(self, request):
+        key = request.get('key')
+        path = self._find(key) if key else None
+        if path is not None:
+            start = file_start_time(path, self.parser).isoformat()
+            with open_monitor(path) as f:
+                size = file_size(f)
+            if start == request.get('start') and request['offset'] <= size:
+                self._open(path, request['offset'])
+                return
+        if not os.path.exists(self.path):
+            self._send(ERROR, "{} not found".format(self.path).encode())
+            return
+        offset = 0
+        by_time = request.get('time') is not None
+        if by_time:
+            # Imported here as the monitor module imports this one
+            from chec_operator.readers.monitor import seek_time
+            with open_monitor(self.path) as f:
+                time_ = np.datetime64(request['time'], 'us')
+                offset = seek_time(f, time_.astype(datetime), self.parser)
+        self._open(self.path, offset, by_time)
+
+    def _rotated(self):
+        try:
+            return MonitorSources.file_key(os.stat(self.path)) != self.key
+        except FileNotFoundError:
+            return False
+
+    def _read(self):
+        """
+        The next complete lines of the file, at most the space left in the
+        window (unless a single line is longer), and their offset.
+
+        Returns None at the end of the file or if the window is full.
+        """
+        space = self.window - (self.sent - self.acked)
+        if space <= 0:
+            return None
+        if (not isinstance(self.file, CompressedFile) and
+                file_size(self.file) < self.file.tell()):
+            print("[INFO] {} truncated, sending from start"
+                  .format(self.path))
+            self._open(self.path)
+        data = self._partial
+        while True:
+            chunk = self.file.read(min(self.chunk_size, space))
+            data += chunk
+            end = data.rfind(b'\n') + 1
+            if end or not chunk:
+                break
+        self._partial = data[end:]
+        if not end:
+            return None
+        offset = self.position
+        self.position += end
+        return offset, data[:end]
+
+    def _send_data(self, offset, end, data):
+        payload = self._compress.compress(data)
+        payload += self._compress.flush(zlib.Z_SYNC_FLUSH)
+        self._send(DATA, _OFFSETS.pack(offset, end) + payload)
+        self.sent += len(data)
+
+    def _switch(self):
+        """
+        Sends the end of a replaced file, then follows the new file.
+        """
+        while True:
+            block = self._read()
+            if block is None:
+                break
+            self._send_data(block[0], block[0] + len(block[1]), block[1])
+        if self._partial:
+            # The last line of a replaced file will not be completed
+            end = self.position + len(self._partial)
+            self._send_data(self.position, end, self._partial + b'\n')
+        print("[INFO] {} rotated, sending new file".format(self.path))
+        self._open(self.path)
+
+    def _serve(self):
+        while True:
+            if self.file is not None:
+                while True:
+                    block = self._read()
+                    if block is None:
+                        break
+                    offset, data = block
+                    self._send_data(offset, offset + len(data), data)
+                full = self.sent - self.acked >= self.window
+                if not full and self._rotated():
+                    self._switch()
+                    continue
+            else:
+                full = True
+            fds = [self.rfd]
+            if not full and self.inotify is not None:
+                fds.append(self.inotify.fd)
+            timeout = self._last_send + self.heartbeat - time()
+            if not full and self.inotify is None:
+                timeout = min(timeout, self.poll_interval)
+            readable = select.select(fds, [], [], max(timeout, 0))[0]
+            if self.inotify is not None and self.inotify.fd in readable:
+                self.inotify.drain()
+            if self.rfd in readable and not self._receive():
+                return
+            if time() - self._last_send >= self.heartbeat:
+                self._send(HEARTBEAT)
+
+    def run(self):
+        """
+        Serves the client until it disconnects.
+        """
+        try:
+            self._serve()
+        except (BrokenPipeError, ConnectionError):
+            pass
+        finally:
+            if self.file is not None:
+                self.file.close()
+            if self.inotify is not None:
+                self.inotify.close()
+
+
+def serve(path, **kwargs):
+    """
+    Serves `path` to a single client over stdin and stdout, which is how
+    `SSHTransport` starts the server on the remote host. Anything printed
+    goes to stderr rather than into the stream.
+    """
+    wfd = os.dup(1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    MonitorServer(path, 0, wfd, **kwargs).run()
+
+
+def listen(path, host='', port=0, **kwargs):
+    """
+    Serves `path` to any number of clients over TCP, one thread per
+    connection, until interrupted.
+    """
+    server = socket.create_server((host, port))
+    print("Serving {} on {}:{}".format(path, *server.getsockname()[:2]))
+    sys.stdout.flush()
+
+    def run(connection):
+        with connection:
+            fd = connection.fileno()
+            MonitorServer(path, fd, fd, **kwargs).run()
+
+    with server:
+        while True:
+            connection = server.accept()[0]
+            t = Thread(target=run, args=(connection,))
+            t.daemon = True
+            t.start()
+
+
+class _SocketConnection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.received = 0
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+    def recv(self, size):
+        data = self.sock.recv(size)
+        self.received += len(data)
+        return data
+
+    def close(self):
+        self.sock.close()
+
+
+class _PipeConnection:
+    def __init__(self, process):
+        self.process = process
+        self.received = 0
+
+    def fileno(self):
+        return self.process.stdout.fileno()
+
+    def send(self, data):
+        _write(self.process.stdin.fileno(), data)
+
+    def recv(self, size):
+        data = os.read(self.process.stdout.fileno(), size)
+        self.received += len(data)
+        return data
+
+    def close(self):
+        for f in (self.process.stdin, self.process.stdout):
+            try:
+                f.close()
+            except OSError:
+                pass
+        self.process.terminate()
+        try:
+            self.process.wait(5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class SocketTransport:
+    """
+    Connects to a `MonitorServer` listening on a TCP port (see `listen`).
+    """
+    def __init__(self, host, port, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.name = "{}:{}".format(host, port)
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return _SocketConnection(sock)
+
+
+class CommandTransport:
+    """
+    Starts a command serving a monitor file on its stdin and stdout (see
+    `serve`), e.g. a local stand-in server.
+    """
+    def __init__(self, command, name=None):
+        self.command = command
+        self.name = name or ' '.join(command)
+
+    def connect(self):
+        process = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, bufsize=0)
+        return _PipeConnection(process)
+
+
+class SSHTransport(CommandTransport):
+    """
+    Runs the server over ssh on the host holding the monitor file, which
+    needs chec_operator installed for `python`. ssh must be able to log in
+    without a password prompt (e.g. with a key).
+    """
+    def __init__(self, host, path, python='python'):
+        code = ("from chec_operator.readers.remote import serve; "
+                "serve({!r})".format(path))
+        command = ['ssh', '-o', 'BatchMode=yes',
+                   '-o', 'ServerAliveInterval=10', host,
+                   python, '-c', shlex.quote(code)]
+        super().__init__(command, host)
+
+
+class RemoteSources:
+    """
+    The lines of a monitor file on another host, streamed by a
+    `MonitorServer` through `transport`, in place of the `MonitorSources`
+    of a `MonitorReader`.
+
+    The lines are received compressed, and acknowledged as they are
+    returned by `read`, which lets the server send more (see
+    `MonitorServer`). If the connection drops, or stays silent for longer
+    than `timeout` seconds, it is reopened after a delay growing from
+    `retry[0]` to `retry[1]` seconds, and the stream resumes after the
+    last line returned. The position is part of `offsets`, so with an
+    archive it also survives restarts.
+
+    Parameters
+    ----------
+    transport : `SocketTransport`, `CommandTransport` or `SSHTransport`
+    parser : `TimestampParser`
+    timeout : float
+    retry : tuple
+    """
+    def __init__(self, transport, parser, timeout=30, retry=(1, 60)):
+        self.transport = transport
+        self.parser = parser
+        self.timeout = timeout
+        self.retry = retry
+        # No local files, for the parts of `MonitorReader` that use them
+        self.tailers = OrderedDict()
+        self.starts = dict()
+        self.key = None
+        self.path = None
+        self.start = None
+        self.offset = 0
+        self._resume_time = None
+        self._skip_before = None
+        self.connection = None
+        self._frames = None
+        self._decompress = None
+        self._received = 0
+        self._last_receive = 0
+        self._lines = []
+        self._delay = retry[0]
+        self._retry_at = 0
+
+    def _prefix(self):
+        return "{}|".format(self.transport.name)
+
+    def resume(self, offsets, time):
+        """
+        Sets where the stream starts: from the position saved in `offsets`
+        (as returned by `offsets`) if the server can resume it, else from
+        the first record at or after `time` (datetime64[us]).
+        """
+        self._resume_time = time
+        # As for local files, what was archived after the position was
+        # last saved is not wanted again
+        self._skip_before = time
+        prefix = self._prefix()
+        for key, saved in offsets.items():
+            if key.startswith(prefix):
+                self.key = key[len(prefix):]
+                self.start = saved['start']
+                self.offset = saved['offset']
+
+    def _connect(self):
+        if time() < self._retry_at:
+            return
+        try:
+            self.connection = self.transport.connect()
+            time_ = None
+            if self._resume_time is not None:
+                time_ = int(np.datetime64(self._resume_time, 'us')
+                            .astype(np.int64))
+            request = dict(key=self.key, start=self.start,
+                           offset=self.offset, time=time_)
+            self.connection.send(_frame(RESUME, json.dumps(request)
+                                        .encode()))
+        except OSError as e:
+            self._drop(e)
+            return
+        self._frames = _FrameReader()
+        self._decompress = zlib.decompressobj()
+        self._received = 0
+        self._last_receive = time()
+
+    def _drop(self, reason):
+        print("[WARNING] Connection to {} lost ({}), retrying in {} s"
+              .format(self.transport.name, reason, self._delay))
+        if self.connection is not None:
+            self.connection.close()
+        self.connection = None
+        self._retry_at = time() + self._delay
+        self._delay = min(2 * self._delay, self.retry[1])
+
+    def _handle(self, kind, payload):
+        if kind == DATA:
+            offset, end = _OFFSETS.unpack_from(payload)
+            data = self._decompress.decompress(payload[_OFFSETS.size:])
+            if offset != self.offset:
+                print("[WARNING] {} skipped from offset {} to {}"
+                      .format(self.path, self.offset, offset))
+            self._lines.extend(data.decode(errors='replace')
+                               .split('\n')[:-1])
+            self.offset = end
+            self._received += len(data)
+            self._delay = self.retry[0]
+        elif kind == FILE:
+            info = json.loads(payload.decode())
+            if info['by_time']:
+                self._skip_before = np.datetime64(self._resume_time, 'us')
+            if info['key'] != self.key:
+                print("[INFO] Reading {} from {}"
+                      .format(info['path'], self.transport.name))
+            self.key = info['key']
+            self.path = info['path']
+            self.start = info['start']
+            self.offset = info['offset']
+        elif kind == ERROR:
+            raise ConnectionError(payload.decode(errors='replace'))
+
+    def _receive(self):
+        """
+        Handles the frames received so far, without blocking.
+        """
+        connection = self.connection
+        while select.select([connection], [], [], 0)[0]:
+            data = connection.recv(2**16)
+            if not data:
+                raise ConnectionError("closed by server")
+            self._last_receive = time()
+            self._frames.feed(data)
+            for kind, payload in self._frames.frames():
+                self._handle(kind, payload)
+        if time() - self._last_receive > self.timeout:
+            raise ConnectionError("nothing received for {} s"
+                                  .format(self.timeout))
+
+    def scan(self):
+        return []
+
+    def skip_before(self, key, time):
+        self._skip_before = time
+
+    def read(self):
+        """
+        The lines received since the last call, which are acknowledged.
+        """
+        if self.connection is None and not self._lines:
+            self._connect()
+        if self.connection is not None:
+            try:
+                self._receive()
+            except (OSError, ConnectionError, zlib.error) as e:
+                self._drop(e)
+        lines = self._lines
+        self._lines = []
+        if self.connection is not None and lines:
+            try:
+                self.connection.send(_frame(ACK, _ACK.pack(self._received)))
+            except OSError as e:
+                self._drop(e)
+        if lines and self._skip_before is not None:
+            times = self.parser.parse_many(lines)
+            inside = times >= self._skip_before
+            if not inside.any():
+                return []
+            lines = lines[int(np.argmax(inside)):]
+            self._skip_before = None
+        return lines
+
+    def offsets(self):
+        if self.key is None:
+            return dict()
+        return {self._prefix() + self.key: dict(offset=self.offset,
+                                                start=self.start)}
+
+    def wait(self, timeout=None):
+        """
+        Blocks until lines are received, for at most `timeout` seconds.
+        """
+        if self._lines:
+            return True
+        if self.connection is None:
+            self._connect()
+        if self.connection is None:
+            delay = self._retry_at - time()
+            if timeout is not None:
+                delay = min(delay, timeout)
+            sleep(max(delay, 0))
+            return False
+        if timeout is None:
+            timeout = self.timeout
+        return bool(select.select([self.connection], [], [],
+                                  min(timeout, self.timeout))[0])
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
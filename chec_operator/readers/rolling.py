@@ -0,0 +1,228 @@
+from bisect import bisect_right
+import numpy as np
+
+US = 1000000
+STATISTICS = ['count', 'mean', 'std', 'min', 'max']
+
+
+class _MonotonicQueue:
+    """
+    Candidates for the minimum (or, with `sign` -1, the maximum) of the
+    recent samples of a series: the samples not followed by a smaller
+    value, so the values increase with time and the minimum over any
+    trailing window is its first candidate inside the window.
+    """
+    def __init__(self, sign=1):
+        self.sign = sign
+        self.times = []
+        self.values = []
+        self.head = 0
+
+    def push(self, t, x):
+        x = self.sign * x
+        values = self.values
+        while len(values) > self.head and values[-1] >= x:
+            values.pop()
+            self.times.pop()
+        self.times.append(t)
+        values.append(x)
+
+    def expire(self, limit):
+        while self.times[self.head] <= limit:
+            self.head += 1
+        if self.head > 1024 and 2 * self.head > len(self.times):
+            del self.times[:self.head]
+            del self.values[:self.head]
+            self.head = 0
+
+    def first_after(self, limit):
+        i = bisect_right(self.times, limit, self.head)
+        return self.sign * self.values[i]
+
+
+class _Series:
+    """
+    Samples of one series over the longest window, with the sum and sum of
+    squares of each window kept up to date as samples enter and leave.
+    Values are stored relative to the first one, to keep the variance
+    accurate.
+    """
+    def __init__(self, widths):
+        self.widths = widths
+        self.times = []
+        self.values = []
+        self.starts = [0] * len(widths)
+        self.sums = [0.] * len(widths)
+        self.sumsqs = [0.] * len(widths)
+        self.shift = None
+        self.min = _MonotonicQueue(1)
+        self.max = _MonotonicQueue(-1)
+
+    def add(self, t, v):
+        if self.shift is None:
+            self.shift = v
+        x = v - self.shift
+        times = self.times
+        values = self.values
+        times.append(t)
+        values.append(x)
+        for i, width in enumerate(self.widths):
+            s = self.starts[i]
+            total = self.sums[i] + x
+            total_sq = self.sumsqs[i] + x * x
+            limit = t - width
+            while times[s] <= limit:
+                y = values[s]
+                total -= y
+                total_sq -= y * y
+                s += 1
+            self.starts[i] = s
+            self.sums[i] = total
+            self.sumsqs[i] = total_sq
+        self.min.push(t, x)
+        self.max.push(t, x)
+        limit = t - self.widths[-1]
+        self.min.expire(limit)
+        self.max.expire(limit)
+
+        # Drop the samples that left the longest window
+        head = self.starts[-1]
+        if head > 1024 and 2 * head > len(times):
+            del times[:head]
+            del values[:head]
+            self.starts = [s - head for s in self.starts]
+
+    def statistics(self):
+        """
+        Count, mean, std, min and max of each window, flattened.
+        """
+        stats = []
+        n = len(self.times)
+        last = self.times[-1]
+        shift = self.shift
+        lo = self.min
+        hi = self.max
+        for i, width in enumerate(self.widths):
+            count = n - self.starts[i]
+            mean = self.sums[i] / count
+            var = max(self.sumsqs[i] / count - mean * mean, 0.)
+            limit = last - width
+            stats.extend((count, shift + mean, var ** 0.5,
+                          shift + lo.first_after(limit),
+                          shift + hi.first_after(limit)))
+        return stats
+
+
+class RollingStats:
+    """
+    Rolling count, mean, standard deviation, min and max of every
+    component of the tracked measurements, over trailing windows of
+    `windows` seconds (ending at each series' latest sample).
+
+    Each sample updates the windows in amortised O(1): the running sums
+    are adjusted for the samples entering and leaving each window, and the
+    min and max come from monotonic queues. The statistics are published
+    as arrays of shape (windows, components) indexed by component code,
+    which are copied on write once handed out by `freeze`, so a snapshot
+    holding them never sees them change.
+
+    Parameters
+    ----------
+    measurements : list
+        Codes of the tracked measurements.
+    windows : list
+        Window lengths in seconds.
+    """
+    def __init__(self, measurements, windows=(60, 600, 3600)):
+        self.windows = list(windows)
+        self._widths = [int(w * US) for w in self.windows]
+        self.measurements = list(measurements)
+        self._series = dict()
+        self._arrays = {m: self._empty(64) for m in self.measurements}
+        self._shared = False
+
+    def _empty(self, n_components):
+        shape = (len(self.windows), n_components)
+        arrays = {name: np.full(shape, np.nan) for name in STATISTICS}
+        arrays['count'][:] = 0
+        return arrays
+
+    def _own(self, component):
+        """
+        Makes the arrays private (and large enough for `component`) before
+        they are written to.
+        """
+        n = self._arrays[self.measurements[0]]['mean'].shape[1]
+        if not self._shared and component < n:
+            return
+        size = max(n, 2 * component + 1) if component >= n else n
+        for m, arrays in self._arrays.items():
+            new = self._empty(size)
+            for name in STATISTICS:
+                new[name][:, :n] = arrays[name]
+            self._arrays[m] = new
+        self._shared = False
+
+    def extend(self, times, measurements, components, values):
+        """
+        Adds a block of samples (times in us since epoch, in time order
+        for each series); those of untracked measurements are ignored.
+        """
+        measurements = np.asarray(measurements)
+        tracked = np.isin(measurements, self.measurements)
+        values = np.asarray(values)
+        tracked &= ~np.isnan(values)
+        if not tracked.any():
+            return
+        idx = np.flatnonzero(tracked)
+        times = np.asarray(times)[idx]
+        measurements = measurements[idx]
+        components = np.asarray(components)[idx]
+        values = values[idx]
+        if len(idx) > 1:
+            # Only the samples within the longest window of the last sample
+            # of their series in the block count
+            keys = measurements * (int(components.max()) + 1) + components
+            _, inverse = np.unique(keys, return_inverse=True)
+            last = np.zeros(inverse.max() + 1, dtype=np.int64)
+            np.maximum.at(last, inverse, times)
+            keep = times > last[inverse] - self._widths[-1]
+            if not keep.all():
+                times = times[keep]
+                measurements = measurements[keep]
+                components = components[keep]
+                values = values[keep]
+
+        touched = dict()
+        series = self._series
+        widths = self._widths
+        for t, m, c, v in zip(times.tolist(), measurements.tolist(),
+                              components.tolist(), values.tolist()):
+            key = (m, c)
+            s = series.get(key)
+            if s is None:
+                s = _Series(widths)
+                series[key] = s
+            s.add(t, v)
+            touched[key] = s
+
+        self._own(max(c for _, c in touched))
+        n_windows = len(widths)
+        for m in self.measurements:
+            keys = [key for key in touched if key[0] == m]
+            if not keys:
+                continue
+            columns = [c for _, c in keys]
+            stats = np.array([touched[key].statistics() for key in keys])
+            stats = stats.reshape(len(keys), n_windows, len(STATISTICS))
+            arrays = self._arrays[m]
+            for k, name in enumerate(STATISTICS):
+                arrays[name][:, columns] = stats[:, :, k].T
+
+    def freeze(self):
+        """
+        The current arrays, per measurement code, which are no longer
+        written to.
+        """
+        self._shared = True
+        return dict(self._arrays)
@@ -0,0 +1,223 @@
+import os
+from collections import OrderedDict
+from datetime import datetime
+from glob import glob, has_magic
+from os.path import isdir, isfile, dirname, basename, abspath, join
+from time import sleep
+import numpy as np
+from chec_operator.readers.compressed import open_monitor, file_size, \
+    supported, TABLE_SUFFIX
+from chec_operator.readers.tail import FileTailer, Inotify
+
+
+def file_start_time(path, parser, header_size=64 * 1024):
+    """
+    Time of the first "Start Monitoring" line of a monitor file or, failing
+    that, of its first record, falling back to its modification time. Only
+    the first `header_size` bytes are read.
+    """
+    with open_monitor(path) as f:
+        header = f.read(header_size)
+    for line in header.decode(errors='replace').split('\n')[:-1]:
+        try:
+            if 'Start Monitoring' in line:
+                start = line.split(" ")
+                return parser.parse("{} {}".format(start[2], start[3]))
+            return parser.parse(line)
+        except (ValueError, IndexError):
+            continue
+    return datetime.fromtimestamp(os.stat(path).st_mtime)
+
+
+class MonitorSources:
+    """
+    The monitor files matching a path, which may be a single file, a
+    directory (all the files in it) or a glob pattern.
+
+    Files are identified by their inode rather than their name, so a file
+    renamed by rotation is read to its end, and the new file replacing it
+    is read from its start, without reading anything twice. New matching
+    files are picked up by `scan`. The files are ordered by the timestamp
+    of their first "Start Monitoring" line, and `read` merges their new
+    lines in time order, so files covering overlapping times still give a
+    time-ordered stream. gzip and zstd compressed files (e.g. rotated logs
+    compressed by housekeeping) are read decompressed.
+
+    Parameters
+    ----------
+    path : str
+    parser : `TimestampParser`
+    poll_interval : float
+        Seconds between polls when inotify is not available.
+    """
+    # Bytes read from the start of a file to find its start time
+    header_size = 64 * 1024
+    # Files kept alongside the monitor files that are not monitor files
+    ignored_suffixes = ('.idx', '.tmp', TABLE_SUFFIX)
+
+    def __init__(self, path, parser, poll_interval=0.1):
+        self.path = path
+        self.parser = parser
+        self.poll_interval = poll_interval
+        if isdir(path):
+            self.directory, self.pattern = path, '*'
+        else:
+            self.directory = dirname(abspath(path))
+            self.pattern = basename(path)
+        self.tailers = OrderedDict()
+        self.starts = dict()
+        # Files that cannot be read (zstd without zstandard)
+        self._unsupported = set()
+        # Per file, records before this time are dropped on the next read
+        self._skip_before = dict()
+        self.inotify = None
+        try:
+            self.inotify = Inotify(self.directory, self.pattern)
+        except (OSError, AttributeError) as e:
+            print("[WARNING] inotify unavailable ({}), polling {} every {} s"
+                  .format(e, path, poll_interval))
+
+    def _match(self):
+        if isdir(self.path) or has_magic(self.path):
+            pattern = join(self.directory, self.pattern)
+            paths = [p for p in glob(pattern)
+                     if isfile(p) and not basename(p).startswith('.') and
+                     not p.endswith(self.ignored_suffixes)]
+        else:
+            paths = [self.path] if isfile(self.path) else []
+        return paths
+
+    @staticmethod
+    def file_key(stat):
+        return "{}:{}".format(stat.st_dev, stat.st_ino)
+
+    def _start_time(self, path):
+        return file_start_time(path, self.parser, self.header_size)
+
+    def scan(self):
+        """
+        Opens the matching files not yet followed, and closes the followed
+        files that no longer match once they have been read to their end.
+
+        Returns
+        -------
+        list
+            Keys of the newly opened files.
+        """
+        matched = dict()
+        for path in self._match():
+            try:
+                matched[self.file_key(os.stat(path))] = path
+            except FileNotFoundError:
+                continue
+        new = []
+        for key, path in matched.items():
+            if key in self._unsupported:
+                continue
+            if key not in self.tailers:
+                if not supported(path):
+                    print("[WARNING] zstandard is not installed, ignoring {}"
+                          .format(path))
+                    self._unsupported.add(key)
+                    continue
+                tailer = FileTailer(path, self.poll_interval,
+                                    use_inotify=False, follow=False)
+                if tailer.file is None:
+                    continue
+                self.tailers[key] = tailer
+                self.starts[key] = self._start_time(path)
+                new.append(key)
+            else:
+                self.tailers[key].path = path
+        for key in list(self.tailers):
+            if key not in matched and key not in new:
+                tailer = self.tailers[key]
+                if tailer.position >= file_size(tailer.file):
+                    tailer.close()
+                    del self.tailers[key]
+                    del self.starts[key]
+        if new:
+            order = sorted(self.tailers, key=lambda k: self.starts[k])
+            self.tailers = OrderedDict((k, self.tailers[k]) for k in order)
+        return new
+
+    def skip_before(self, key, time):
+        """
+        Drops the records of file `key` before `time` (datetime64[us]) on
+        the next read.
+        """
+        self._skip_before[key] = time
+
+    def read(self):
+        """
+        The new complete lines of all the files, merged in time order.
+        Lines that are not records keep their place after the record
+        preceding them in their file.
+        """
+        if self.inotify is not None:
+            # Events for what is about to be read would otherwise make the
+            # next `wait` return straight away
+            self.inotify.drain()
+        per_file = []
+        for key, tailer in self.tailers.items():
+            lines = tailer.read_lines()
+            if not lines:
+                continue
+            times = None
+            skip = self._skip_before.pop(key, None)
+            if skip is not None:
+                times = self.parser.parse_many(lines)
+                inside = times >= skip
+                if not inside.any():
+                    continue
+                first = int(np.argmax(inside))
+                lines = lines[first:]
+                times = times[first:]
+            per_file.append((lines, times))
+        if len(per_file) == 1:
+            return per_file[0][0]
+        if not per_file:
+            return []
+
+        keys = []
+        for lines, times in per_file:
+            if times is None:
+                times = self.parser.parse_many(lines)
+            # Non-record lines (NaT, the smallest int64) take the time of
+            # the preceding record
+            keys.append(np.maximum.accumulate(times.view(np.int64)))
+        all_lines = [line for lines, _ in per_file for line in lines]
+        file_rank = np.concatenate([np.full(len(k), i)
+                                    for i, k in enumerate(keys)])
+        order = np.lexsort((np.arange(len(all_lines)), file_rank,
+                            np.concatenate(keys)))
+        return [all_lines[i] for i in order]
+
+    def offsets(self):
+        """
+        Read offset and start time of each followed file, keyed by file.
+        """
+        return {key: dict(offset=tailer.position,
+                          start=self.starts[key].isoformat())
+                for key, tailer in self.tailers.items()}
+
+    def wait(self, timeout=None):
+        """
+        Blocks until a matching file is written to or created, for at most
+        `timeout` seconds.
+        """
+        if self.inotify is not None:
+            return self.inotify.wait(timeout)
+        if timeout is not None:
+            sleep(min(timeout, self.poll_interval))
+        else:
+            sleep(self.poll_interval)
+        return True
+
+    def close(self):
+        for tailer in self.tailers.values():
+            tailer.close()
+        self.tailers = OrderedDict()
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
@@ -0,0 +1,245 @@
+import ctypes
+import ctypes.util
+import os
+from fnmatch import fnmatch
+import select
+import struct
+from time import sleep, time
+from chec_operator.readers.compressed import CompressedFile, open_monitor, \
+    file_size
+
+# inotify(7) flags
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    """
+    Minimal ctypes binding to the Linux inotify API, watching a directory
+    for changes to a single file name within it, or to the names matching
+    `pattern` if given (`path` is then the directory). The directory is
+    watched rather than the file itself so that a replacement file (log
+    rotation) is noticed as well.
+
+    Raises OSError if inotify is not available.
+    """
+    mask = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+            IN_MOVED_TO | IN_CREATE | IN_DELETE)
+
+    def __init__(self, path, pattern=None):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify not supported")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if pattern is None:
+            directory, name = os.path.split(os.path.abspath(path))
+            self.name = os.fsencode(name)
+            self.pattern = None
+        else:
+            directory = path
+            self.name = None
+            self.pattern = pattern
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(directory),
+                                    self.mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def drain(self):
+        """
+        Discards the pending events, returning True if any concern the file.
+        """
+        relevant = False
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return relevant
+            if not buf:
+                return relevant
+            i = 0
+            while i + _EVENT.size <= len(buf):
+                _, _, _, length = _EVENT.unpack_from(buf, i)
+                i += _EVENT.size
+                name = buf[i:i + length].rstrip(b'\0')
+                i += length
+                if self.pattern is None:
+                    if name == self.name:
+                        relevant = True
+                elif fnmatch(os.fsdecode(name), self.pattern):
+                    relevant = True
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the file is changed or `timeout` seconds have passed.
+
+        Returns
+        -------
+        bool
+            True if the file was changed.
+        """
+        end = None if timeout is None else time() + timeout
+        while True:
+            remaining = None if end is None else max(0, end - time())
+            readable = select.select([self.fd], [], [], remaining)[0]
+            if readable and self.drain():
+                return True
+            if end is not None and time() >= end:
+                return False
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class FileTailer:
+    """
+    Follows a growing text file, like `tail -F`.
+
+    New bytes are read incrementally from the last position, and only
+    complete lines are returned: an incomplete last line is held back
+    until its newline has been written. Truncation of the file restarts
+    reading from its beginning, and replacement of the file (rotation) is
+    followed to the new file once the old one has been read to its end.
+    gzip and zstd compressed files are read decompressed.
+
+    `wait` blocks on inotify until the file is written to, falling back to
+    sleeping for `poll_interval` when inotify is not available.
+
+    Parameters
+    ----------
+    path : str
+    poll_interval : float
+        Seconds between polls when inotify is not available.
+    use_inotify : bool
+    follow : bool
+        Follow the path to a replacement file. If False the file opened
+        first is read until closed, whatever happens to the path.
+    """
+    def __init__(self, path, poll_interval=0.1, use_inotify=True,
+                 follow=True):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.follow = follow
+        self.file = None
+        self.inode = None
+        self._partial = b''
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = Inotify(path)
+            except (OSError, AttributeError) as e:
+                print("[WARNING] inotify unavailable ({}), polling {} every "
+                      "{} s".format(e, path, poll_interval))
+        self._open()
+
+    def _open(self):
+        try:
+            self.file = open_monitor(self.path)
+        except FileNotFoundError:
+            self.file = None
+            self.inode = None
+            return
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self._partial = b''
+
+    @property
+    def position(self):
+        """
+        Offset in the file of the first byte not yet returned as a line.
+        """
+        if self.file is None:
+            return 0
+        return self.file.tell() - len(self._partial)
+
+    def seek(self, offset):
+        """
+        Continues reading from `offset`, which should be the start of a line.
+        """
+        if self.file is not None:
+            self.file.seek(offset)
+            self._partial = b''
+
+    def _rotated(self):
+        if not self.follow:
+            return False
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            return False
+
+    def _split(self, data):
+        data = self._partial + data
+        lines = data.split(b'\n')
+        self._partial = lines.pop()
+        return [l.decode(errors='replace') for l in lines]
+
+    def read_lines(self):
+        """
+        Returns the complete lines (without their newline) written since the
+        last call.
+        """
+        if self.inotify is not None:
+            # Events for what is about to be read would otherwise make the
+            # next `wait` return straight away
+            self.inotify.drain()
+        if self.file is None:
+            self._open()
+            if self.file is None:
+                return []
+        lines = []
+        # Compressed files are not written to
+        if (not isinstance(self.file, CompressedFile) and
+                file_size(self.file) < self.file.tell()):
+            print("[INFO] {} truncated, reading from start".format(self.path))
+            self.file.seek(0)
+            self._partial = b''
+        lines.extend(self._split(self.file.read()))
+        if self._rotated():
+            # Finish the old file before switching to its replacement
+            lines.extend(self._split(self.file.read()))
+            if self._partial:
+                lines.append(self._partial.decode(errors='replace'))
+            print("[INFO] {} rotated, following new file".format(self.path))
+            self.file.close()
+            self._open()
+            if self.file is not None:
+                lines.extend(self._split(self.file.read()))
+        return lines
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the file may have new data to read, for at most
+        `timeout` seconds.
+        """
+        if self.inotify is not None:
+            return self.inotify.wait(timeout)
+        if timeout is not None:
+            sleep(min(timeout, self.poll_interval))
+        else:
+            sleep(self.poll_interval)
+        return True
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
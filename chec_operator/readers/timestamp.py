@@ -0,0 +1,178 @@
+from datetime import datetime
+import numpy as np
+
+# Layout of the monitor timestamps: "%Y-%m-%d %H:%M:%S:%f"
+#                                    0123456789012345678901234567
+#                                    2017-05-04 13:01:02:123456
+DATE_LENGTH = 10
+FRACTION_START = 20
+FRACTION_DIGITS = 6
+TIMESTAMP_LENGTH = FRACTION_START + FRACTION_DIGITS
+_SEPARATORS = {4: '-', 7: '-', 10: ' ', 13: ':', 16: ':', 19: ':'}
+_DIGITS = [i for i in range(FRACTION_START) if i not in _SEPARATORS]
+_MONTH_DAYS = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def _days_from_civil(y, m, d):
+    """
+    Days since 1970-01-01 of the (proleptic Gregorian) date y-m-d, for
+    integer arrays or scalars.
+    """
+    y = y - (m <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (m + np.where(m > 2, -3, 9)) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _number(s):
+    """
+    Value of `s` if it is made of ASCII digits only (no sign, spaces or
+    underscores, which `int` would accept), else raises ValueError.
+    """
+    if not (s.isdigit() and s.isascii()):
+        raise ValueError("invalid number {!r} in time data".format(s))
+    return int(s)
+
+
+def _days_in_month(y, m):
+    """
+    Number of days of month m (1-12, 0 for other values) of year y, for
+    integer arrays or scalars.
+    """
+    leap = (y % 4 == 0) & ((y % 100 != 0) | (y % 400 == 0))
+    return _MONTH_DAYS[np.clip(m, 0, 12)] + (leap & (m == 2))
+
+
+class TimestampParser:
+    """
+    Decoder for the timestamps that start the monitor file lines, a faster
+    equivalent of `datetime.strptime(s, "%Y-%m-%d %H:%M:%S:%f")`.
+
+    The fields are sliced at their fixed positions instead of matching a
+    format. As consecutive lines almost always share their date, the
+    decoded date of the previous line is kept and reused.
+    """
+    def __init__(self):
+        self._date_str = None
+        self._date = None
+        self._date_us = None
+
+    def _fields(self, s):
+        if (s[4] != '-' or s[7] != '-' or s[10] != ' ' or s[13] != ':' or
+                s[16] != ':' or s[19] != ':'):
+            raise ValueError("time data {!r} does not match the monitor "
+                             "timestamp format".format(s[:TIMESTAMP_LENGTH]))
+        date_str = s[:DATE_LENGTH]
+        if date_str != self._date_str:
+            date = (_number(s[0:4]), _number(s[5:7]), _number(s[8:10]))
+            if (not 1 <= date[1] <= 12 or
+                    not 1 <= date[2] <= _days_in_month(date[0], date[1])):
+                raise ValueError("invalid date in time data {!r}"
+                                 .format(s[:DATE_LENGTH]))
+            self._date = date
+            self._date_us = int(_days_from_civil(*date)) * 86400000000
+            self._date_str = date_str
+        end = s.find(' ', FRACTION_START)
+        if end < 0:
+            end = len(s.rstrip('\n'))
+        fraction = s[FRACTION_START:end]
+        if (not 0 < len(fraction) <= FRACTION_DIGITS or
+                not (fraction.isdigit() and fraction.isascii())):
+            raise ValueError("invalid fraction in time data {!r}"
+                             .format(s[:end]))
+        microsecond = int(fraction) * 10 ** (FRACTION_DIGITS - len(fraction))
+        return (_number(s[11:13]), _number(s[14:16]), _number(s[17:19]),
+                microsecond)
+
+    def parse(self, s):
+        """
+        Decodes the timestamp at the start of `s` (further text is
+        ignored).
+
+        Returns
+        -------
+        datetime
+
+        Raises
+        ------
+        ValueError
+            If `s` does not start with a timestamp.
+        """
+        try:
+            hour, minute, second, microsecond = self._fields(s)
+        except IndexError:
+            raise ValueError("time data {!r} too short".format(s))
+        return datetime(*self._date, hour, minute, second, microsecond)
+
+    def parse_us(self, s):
+        """
+        As `parse`, but returns the time as integer microseconds since the
+        epoch (the representation of datetime64[us]).
+        """
+        try:
+            hour, minute, second, microsecond = self._fields(s)
+        except IndexError:
+            raise ValueError("time data {!r} too short".format(s))
+        if hour > 23 or minute > 59 or second > 59:
+            raise ValueError("invalid time in time data {!r}"
+                             .format(s[:TIMESTAMP_LENGTH]))
+        return (self._date_us + ((hour * 60 + minute) * 60 + second) *
+                1000000 + microsecond)
+
+    @staticmethod
+    def parse_many(lines):
+        """
+        Decodes the timestamps at the start of each of `lines` at once.
+
+        Returns
+        -------
+        numpy.ndarray
+            datetime64[us] array, NaT where a line does not start with a
+            timestamp.
+        """
+        n = len(lines)
+        if not n:
+            return np.zeros(0, dtype='datetime64[us]')
+        # Each line as a row of unicode code points, up to the character
+        # after the longest fraction (0 past the end of the line)
+        width = TIMESTAMP_LENGTH + 1
+        chars = np.array(lines, dtype='U{}'.format(width))
+        chars = chars.view(np.uint32).reshape(n, width)
+        digits = chars.astype(np.int64) - ord('0')
+        is_digit = (digits >= 0) & (digits <= 9)
+
+        valid = is_digit[:, _DIGITS].all(axis=1)
+        for i, c in _SEPARATORS.items():
+            valid &= chars[:, i] == ord(c)
+
+        def number(start, stop):
+            value = np.zeros(n, dtype=np.int64)
+            for i in range(start, stop):
+                value = value * 10 + digits[:, i]
+            return value
+
+        # The fraction has 1 to 6 digits, followed by the end of the line or
+        # a space, and is right-padded with zeros
+        fraction_digits = is_digit[:, FRACTION_START:TIMESTAMP_LENGTH]
+        fraction_digits = np.cumprod(fraction_digits, axis=1).astype(bool)
+        length = fraction_digits.sum(axis=1)
+        after = chars[np.arange(n), FRACTION_START + length]
+        valid &= (length > 0) & np.isin(after, [0, ord(' '), ord('\n')])
+        scale = 10 ** np.arange(FRACTION_DIGITS - 1, -1, -1)
+        fraction = digits[:, FRACTION_START:TIMESTAMP_LENGTH] * scale
+        microsecond = np.where(fraction_digits, fraction, 0).sum(axis=1)
+
+        year, month, day = number(0, 4), number(5, 7), number(8, 10)
+        hour, minute, second = number(11, 13), number(14, 16), number(17, 19)
+        valid &= (month >= 1) & (month <= 12) & (day >= 1)
+        valid &= day <= _days_in_month(year, month)
+        valid &= (hour < 24) & (minute < 60) & (second < 60)
+
+        days = _days_from_civil(year, month, day)
+        seconds = days * 86400 + hour * 3600 + minute * 60 + second
+        us = seconds * 1000000 + microsecond
+        times = us.view('datetime64[us]')
+        times[~valid] = np.datetime64('NaT')
+        return times
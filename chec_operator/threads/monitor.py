@@ -1,13 +1,39 @@
 from chec_operator.readers.monitor import MonitorReader
-from time import sleep
+from chec_operator.readers.archive import MonitorArchive
+from chec_operator.readers.history import MonitorHistory
+from chec_operator.readers.remote import SSHTransport
+from chec_operator.readers.alarms import AlarmEngine, read_limits, \
+    default_limits_path
 
 MONITOR_CONTAINER = None
+MONITOR_HISTORY = None
+MONITOR_ALARMS = None
 
 
-def watch_monitor(file):
+def watch_monitor(file, archive_path=None, processes=1, limits_path=None,
+                  alarm_log=None, ssh=None):
     global MONITOR_CONTAINER
-    reader = MonitorReader(file)
+    global MONITOR_HISTORY
+    global MONITOR_ALARMS
+    alarms = AlarmEngine(read_limits(limits_path or default_limits_path()),
+                         alarm_log)
+    MONITOR_ALARMS = alarms
+    archive = None
+    if archive_path:
+        archive = MonitorArchive(archive_path)
+    history = MonitorHistory()
+    MONITOR_HISTORY = history
+    transport = None
+    if ssh:
+        # `file` is then on the host `ssh` connects to
+        transport = SSHTransport(ssh, file)
+    reader = MonitorReader(file, archive, history, processes, transport)
     while True:
         reader.refresh()
+        if reader.container is not None and \
+                reader.container is not MONITOR_CONTAINER:
+            alarms.evaluate(reader.container)
         MONITOR_CONTAINER = reader.container
-        sleep(0.1)
+        # Wakes as soon as the file is written to, the timeout only bounds
+        # how long a missed notification can go unnoticed
+        reader.wait(timeout=5)
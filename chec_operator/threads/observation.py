@@ -1,16 +1,29 @@
 import threading
-from time import sleep, ctime, time
+from time import ctime, time
 from datetime import datetime
 from chec_operator.utils.enums import CameraState
 
 
 class ObservingThread(threading.Thread):
+    """
+    Reusable worker that ends observations once their duration or trigger
+    count is reached. A single instance serves consecutive observations:
+    `begin` starts one and `wait_for_end` blocks until it has finished.
 
-    def __init__(self, parent_handler, timedelta, triggerdelta):
+    Rather than polling, the worker sleeps until the time deadline. When a
+    trigger limit is set, the backplane trigger count is sampled every
+    `trigger_cadence` seconds, and the observed trigger rate is used to
+    predict the crossing so the next sample can be taken close to it.
+    """
+
+    def __init__(self, parent_handler, trigger_cadence=1.0,
+                 min_trigger_cadence=0.05):
         print("Creating observation thread")
         self.parent_handler = parent_handler
-        self.timedelta = timedelta
-        self.triggerdelta = triggerdelta
+        self.trigger_cadence = trigger_cadence
+        self.min_trigger_cadence = min_trigger_cadence
+        self.timedelta = None
+        self.triggerdelta = 0
         self.starttime = 0
         self.starttrigger = 0
         self.currenttimedelta = 0
@@ -18,60 +31,122 @@ class ObservingThread(threading.Thread):
         self.get_trigger = self.parent_handler.get_backplane_trigger_count
 
         super(ObservingThread, self).__init__()
+        self.daemon = True
+        self._observation_begin = threading.Event()
         self._observation_interrupt = threading.Event()
+        self._observation_end = threading.Event()
+        self._observation_end.set()
         self.observation_reached_end = False
         self.running = False
         self.lock = threading.Lock()
 
-    def _check_time(self):
-        if self.timedelta:
-            self.currenttimedelta = datetime.now() - self.starttime
-            return self.currenttimedelta >= self.timedelta
-        else:
-            return False
-
-    def _check_trigger(self):
-        if self.triggerdelta:
-            self.currenttriggerdelta = self.get_trigger() - self.starttrigger
-            return self.currenttriggerdelta >= self.triggerdelta
-        else:
-            return False
+    def begin(self, timedelta, triggerdelta):
+        """
+        Starts an observation that ends after `timedelta` or `triggerdelta`
+        backplane triggers, whichever comes first (either may be 0/None).
+        """
+        self._observation_end.wait()
+        self.timedelta = timedelta
+        self.triggerdelta = triggerdelta
+        self.observation_reached_end = False
+        # Claimed by whichever ends the observation first: the worker on
+        # reaching the end, or an interrupt
+        self.lock = threading.Lock()
+        self._observation_interrupt.clear()
+        self._observation_end.clear()
+        if not self.is_alive():
+            self.start()
+        self._observation_begin.set()
 
     def observation_ended(self):
-        return self._observation_interrupt.isSet()
+        return self._observation_interrupt.is_set()
 
     def interrupt_observation(self):
+        # Fails when the worker has already reached the end, it is then
+        # the one returning the camera to READY and must not be waited for
         if self.lock.acquire(False):
             print("[WARNING] Interrupting observation thread!")
             self._observation_interrupt.set()
-            self.join()
+            self._observation_end.wait()
 
     def run(self):
-        self.running = True
+        while True:
+            self._observation_begin.wait()
+            self._observation_begin.clear()
+            self.running = True
+            try:
+                self._observe()
+            except Exception as e:
+                # The worker serves the following observations, so a failed
+                # one must not end it
+                print("[ERROR] Observation failed: {}".format(e))
+            finally:
+                self.running = False
+                self._observation_end.set()
+            print("Observation Ended")
+
+    def _next_trigger_sample(self, now):
+        """
+        Time of the next trigger count sample: at the regular cadence, or
+        earlier if the current trigger rate predicts that the limit will be
+        crossed sooner.
+        """
+        elapsed = now - self._start
+        wait = self.trigger_cadence
+        if self.currenttriggerdelta > 0 and elapsed > 0:
+            rate = self.currenttriggerdelta / elapsed
+            remaining = self.triggerdelta - self.currenttriggerdelta
+            wait = min(wait, remaining / rate)
+        return now + max(wait, self.min_trigger_cadence)
+
+    def _observe(self):
+        self._start = time()
         self.starttime = datetime.now()
+        self.currenttimedelta = 0
+        self.currenttriggerdelta = 0
         self.starttrigger = self.get_trigger()
         print("[INFO] Starting observation thread, "
               "start time = {}, timedelta = {} s, triggerdelta = {}"
               .format(ctime(time()), self.timedelta, self.triggerdelta))
 
-        while not self.observation_ended():
-            if self._check_time() or self._check_trigger():
-                self._finish_run()
-                break
+        deadline = None
+        if self.timedelta:
+            deadline = self._start + self.timedelta.total_seconds()
+        next_sample = None
+        if self.triggerdelta:
+            next_sample = self._start
 
-        self.running = False
-        print("Observation Ended")
+        while True:
+            now = time()
+            self.currenttimedelta = datetime.now() - self.starttime
+            if deadline is not None and now >= deadline:
+                break
+            if next_sample is not None and now >= next_sample:
+                current = self.get_trigger() - self.starttrigger
+                self.currenttriggerdelta = current
+                if current >= self.triggerdelta:
+                    break
+                next_sample = self._next_trigger_sample(time())
+            wake = [t for t in (deadline, next_sample) if t is not None]
+            if not wake:
+                # Nothing to wait for, only an interrupt can end it
+                self._observation_interrupt.wait()
+                return
+            if self._observation_interrupt.wait(max(0, min(wake) - time())):
+                return
+        self._finish_run()
 
     def _finish_run(self):
-        if self.lock.acquire(False):
-            print("[INFO] Observation thread complete, "
-                  "end time = {}, duration = {}, triggers {} (end) {} (actual)"
-                  .format(ctime(time()), self.currenttimedelta,
-                          self.currenttriggerdelta,
-                          self.get_trigger() - self.starttrigger))
-            self.observation_reached_end = True
-            self.parent_handler.go_to_state(CameraState.READY)
+        if not self.lock.acquire(False):
+            return
+        print("[INFO] Observation thread complete, "
+              "end time = {}, duration = {}, triggers {} (end) {} (actual)"
+              .format(ctime(time()), self.currenttimedelta,
+                      self.currenttriggerdelta,
+                      self.get_trigger() - self.starttrigger))
+        self.observation_reached_end = True
+        self.parent_handler.go_to_state(CameraState.READY)
 
     def wait_for_end(self):
-        self.join()
+        self._observation_end.wait()
         print("Observation Ended")
@@ -1,21 +1,70 @@
 from chec_operator.camera_server.communicator import Communicator, DummyCommunicator
-from chec_operator.peripherals.pulse_generator import PulseGeneratorCommunicator
+from chec_operator.camera_server.async_communicator import \
+    AsyncCommunicatorFacade
+from chec_operator.camera_server.cache import CachedCommunicator
+from chec_operator.camera_server.scheduler import ScheduledCommunicator
+from chec_operator.peripherals.pulse_generator import \
+    PulseGeneratorCommunicator
 from chec_operator.camera_server.handler import ServerHandler
+from chec_operator.camera_server.pool import CameraPool
+from threading import RLock
 from time import sleep
 
 SERVER_HANDLER = None
+CAMERA_POOL = None
 
 
-def poll_state(dummy, lock):
-    global SERVER_HANDLER
-    pulse_gen = PulseGeneratorCommunicator()
+def create_communicator(dummy, use_asyncio=False, filepath_interval=30):
     if dummy:
         communicator = DummyCommunicator()
+    elif use_asyncio:
+        communicator = AsyncCommunicatorFacade()
     else:
         communicator = Communicator()
+    communicator = CachedCommunicator(communicator, filepath_interval)
+    return ScheduledCommunicator(communicator)
+
+
+def poll_state(dummy, lock, use_asyncio=False, filepath_interval=30):
+    global SERVER_HANDLER
+    pulse_gen = PulseGeneratorCommunicator()
+    communicator = create_communicator(dummy, use_asyncio, filepath_interval)
+    if not dummy:
         pulse_gen.connect()
 
     SERVER_HANDLER = ServerHandler(communicator, pulse_gen, lock)
     while True:
         SERVER_HANDLER.refresh()
         sleep(1)
+
+
+def poll_pool(cameras, dummy, lock, use_asyncio=False, filepath_interval=30):
+    """
+    Polls several cameras in parallel.
+
+    Parameters
+    ----------
+    cameras : list
+        (name, ip) pair for each camera. The first camera is the primary,
+        which is driven by `lock` and exposed as SERVER_HANDLER.
+    """
+    global SERVER_HANDLER, CAMERA_POOL
+    pulse_gen = PulseGeneratorCommunicator()
+    if not dummy:
+        pulse_gen.connect()
+
+    handlers = []
+    for i, (name, ip) in enumerate(cameras):
+        communicator = create_communicator(dummy, use_asyncio,
+                                           filepath_interval)
+        camera_lock = lock if i == 0 else RLock()
+        gui_name = None if i == 0 else name
+        handler = ServerHandler(communicator, pulse_gen, camera_lock, ip,
+                                gui_name)
+        handlers.append((name, handler))
+
+    CAMERA_POOL = CameraPool(handlers)
+    SERVER_HANDLER = CAMERA_POOL.primary
+    while True:
+        CAMERA_POOL.refresh()
+        sleep(1)
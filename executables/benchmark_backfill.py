@@ -0,0 +1,106 @@
+import argparse
+import os
+import tempfile
+from time import time
+from datetime import datetime, timedelta
+import numpy as np
+from chec_operator.readers.backfill import parse_parallel, default_processes
+
+
+def simulate_file(path, n, rate):
+    start = datetime(2017, 5, 4, 23, 0)
+    with open(path, 'w') as f:
+        f.write("Start Monitoring {}\n".format(
+            start.strftime("%Y-%m-%d %H:%M:%S:%f")))
+        for i in range(n):
+            dt = start + timedelta(seconds=i / rate)
+            f.write("{} Temperature{} TM {} {:.2f}\n".format(
+                dt.strftime("%Y-%m-%d %H:%M:%S:%f"), i % 2, (i // 2) % 32,
+                25 + (i % 7) / 10))
+            if i % 64 == 63:
+                f.write("Monitoring Event Done\n")
+
+
+def merge(results):
+    """
+    Concatenates the chunks' records as (time, measurement name, component
+    name, value) columns, to compare the results of different runs.
+    """
+    times = np.concatenate([r['time'] for r in results])
+    values = np.concatenate([r['value'] for r in results])
+    components = np.concatenate([np.array(r['components'])[r['component']]
+                                 for r in results if len(r['time'])])
+    return times, components, values
+
+
+def best_of(f, repeat):
+    t = []
+    for _ in range(repeat):
+        start = time()
+        result = f()
+        t.append(time() - start)
+    return min(t), result
+
+
+def main():
+    description = 'Benchmark the parallel backfill of a monitor file ' \
+                  'against the number of processes'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-f', '--file', dest='input_path', action='store',
+                        default=None, help='monitor file to parse (a file '
+                                           'is simulated if not given)')
+    parser.add_argument('-n', dest='n', action='store', type=int,
+                        default=1000000, help='number of simulated lines')
+    parser.add_argument('--rate', dest='rate', action='store', type=float,
+                        default=50, help='simulated lines per second')
+    parser.add_argument('-p', '--processes', dest='processes', nargs='+',
+                        type=int, default=None,
+                        help='process counts to benchmark (default: powers '
+                             'of 2 up to the number of CPUs)')
+    parser.add_argument('-r', '--repeat', dest='repeat', action='store',
+                        type=int, default=3, help='repetitions (best is '
+                                                  'reported)')
+
+    args = parser.parse_args()
+
+    path = args.input_path
+    tmp = None
+    if path is None:
+        tmp = tempfile.NamedTemporaryFile(suffix='.txt', delete=False)
+        tmp.close()
+        path = tmp.name
+        simulate_file(path, args.n, args.rate)
+    processes = args.processes
+    if processes is None:
+        processes = [1]
+        while processes[-1] * 2 <= default_processes():
+            processes.append(processes[-1] * 2)
+        if processes[-1] != default_processes():
+            processes.append(default_processes())
+
+    try:
+        size = os.path.getsize(path)
+        print("Parsing {} ({:.1f} MB), {} CPUs available"
+              .format(path, size / 2**20, default_processes()))
+        print("{:<12} {:>10} {:>10} {:>12}"
+              .format("processes", "time (s)", "speedup", "records/s"))
+        t_serial = None
+        expected = None
+        for p in processes:
+            t, results = best_of(lambda: parse_parallel(path, 0, size, p),
+                                 args.repeat)
+            records = merge(results)
+            if expected is None:
+                expected = records
+                t_serial = t
+            else:
+                assert all((a == b).all() for a, b in zip(records, expected))
+            print("{:<12} {:>10.3f} {:>9.1f}x {:>12.0f}"
+                  .format(p, t, t_serial / t, len(records[0]) / t))
+    finally:
+        if tmp is not None:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import argparse
+from time import time
+from os.path import dirname, realpath, join
+from chec_operator.camera_server.communicator import Communicator
+from chec_operator.camera_server.async_communicator import \
+    AsyncCommunicatorFacade
+
+
+def time_calls(f, n):
+    t = []
+    for _ in range(n):
+        start = time()
+        f()
+        t.append(time() - start)
+    t.sort()
+    return t[len(t) // 2], t[int(len(t) * 0.95)], max(t)
+
+
+def main():
+    description = 'Benchmark the camera server communicators against the ' \
+                  'control_cs emulator'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-n', dest='n', action='store', type=int,
+                        default=100, help='number of repetitions')
+    parser.add_argument('--asyncio', dest='use_asyncio', action='store_true',
+                        default=False, help='benchmark the asyncio '
+                                            'communicator')
+    parser.add_argument('--emulator-args', dest='emulator_args',
+                        action='store', default='',
+                        help='extra arguments for the emulator, e.g. '
+                             '"--default-latency 0.001 --fail-rate 0.01"')
+    parser.add_argument('--timeout', dest='timeout', action='store',
+                        type=float, default=1, help='command timeout')
+
+    args = parser.parse_args()
+
+    emulator = join(dirname(realpath(__file__)), 'control_cs_emulator.py')
+    exe = "python {} {}".format(emulator, args.emulator_args)
+
+    if args.use_asyncio:
+        c = AsyncCommunicatorFacade()
+    else:
+        c = Communicator()
+    c.timeout = args.timeout
+    c.connect(log_path='/dev/null', exe_path=exe)
+
+    def individual():
+        c.get_current_state()
+        c.get_allowed_transitions()
+        c.get_hv_status()
+        c.get_flasher_status()
+        c.get_data_sending_status()
+        c.get_config_filepath()
+        c.get_monitorconfig_filepath()
+        c.get_settings_filepath()
+        c.get_run_filepath()
+        c.get_hv_filepath()
+        c.get_led_filepath()
+        c.get_trigger_filepath()
+        c.get_trigger_type()
+
+    results = [
+        ("single query", time_calls(c.get_current_state, args.n)),
+        ("status, individual", time_calls(individual, args.n)),
+        ("status, pipelined", time_calls(c.get_status, args.n)),
+    ]
+    c.disconnect()
+
+    print("{:<20} {:>10} {:>10} {:>10}".format("", "p50 (ms)", "p95 (ms)",
+                                               "max (ms)"))
+    for name, (p50, p95, max_) in results:
+        print("{:<20} {:>10.3f} {:>10.3f} {:>10.3f}"
+              .format(name, p50 * 1e3, p95 * 1e3, max_ * 1e3))
+
+
+if __name__ == '__main__':
+    main()
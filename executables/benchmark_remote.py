@@ -0,0 +1,160 @@
+import argparse
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from os.path import dirname, join, realpath
+from threading import Thread
+from time import time
+from chec_operator.readers.remote import RemoteSources, SocketTransport, \
+    CommandTransport
+from chec_operator.readers.timestamp import TimestampParser
+
+SERVER = join(dirname(realpath(__file__)), 'serve_monitor.py')
+
+
+def simulate_file(path, n, rate):
+    start = datetime(2017, 5, 4, 23, 0)
+    with open(path, 'w') as f:
+        f.write("Start Monitoring {}\n".format(
+            start.strftime("%Y-%m-%d %H:%M:%S:%f")))
+        for i in range(n):
+            dt = start + timedelta(seconds=i / rate)
+            f.write("{} Temperature{} TM {} {:.2f}\n".format(
+                dt.strftime("%Y-%m-%d %H:%M:%S:%f"), i % 2, (i // 2) % 32,
+                25 + (i % 7) / 10))
+            if i % 64 == 63:
+                f.write("Monitoring Event Done\n")
+
+
+def digest(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data.count(b'\n'), hashlib.md5(data).hexdigest()
+
+
+def follow(transport, n_lines, drop_every, result):
+    """
+    Reads the whole file through `transport`, closing the connection every
+    `drop_every` reads to exercise resuming.
+    """
+    sources = RemoteSources(transport, TimestampParser(), retry=(0, 0))
+    sources.resume(dict(), None)
+    md5 = hashlib.md5()
+    n = 0
+    reads = 0
+    drops = 0
+    wire = 0
+    largest = 0
+    start = time()
+    while n < n_lines:
+        lines = sources.read()
+        if not lines:
+            sources.wait(1)
+            continue
+        data = ''.join(l + '\n' for l in lines).encode()
+        md5.update(data)
+        n += len(lines)
+        largest = max(largest, len(data))
+        reads += 1
+        if drop_every and reads % drop_every == 0:
+            wire += sources.connection.received
+            sources.close()
+            drops += 1
+    if sources.connection is not None:
+        wire += sources.connection.received
+    sources.close()
+    result.update(time=time() - start, lines=n, md5=md5.hexdigest(),
+                  drops=drops, wire=wire, largest=largest)
+
+
+def main():
+    description = 'Load test the remote monitor transport against a local ' \
+                  'stand-in server'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-f', '--file', dest='input_path', action='store',
+                        default=None, help='monitor file to serve (a file '
+                                           'is simulated if not given)')
+    parser.add_argument('-n', dest='n', action='store', type=int,
+                        default=1000000, help='number of simulated lines')
+    parser.add_argument('--rate', dest='rate', action='store', type=float,
+                        default=50, help='simulated lines per second')
+    parser.add_argument('-t', '--transport', dest='transport',
+                        choices=['pipe', 'socket'], default='pipe',
+                        help='stand-in server over a pipe (one process '
+                             'per client) or a socket (one process)')
+    parser.add_argument('-c', '--clients', dest='clients', action='store',
+                        type=int, default=1, help='concurrent clients')
+    parser.add_argument('--window', dest='window', action='store', type=int,
+                        default=2**22,
+                        help='bytes sent ahead of the acknowledgement')
+    parser.add_argument('--level', dest='level', action='store', type=int,
+                        default=1, help='zlib compression level')
+    parser.add_argument('--drop-every', dest='drop_every', action='store',
+                        type=int, default=0,
+                        help='close the connection every this many reads')
+
+    args = parser.parse_args()
+
+    path = args.input_path
+    tmp = None
+    if path is None:
+        tmp = tempfile.NamedTemporaryFile(suffix='.txt', delete=False)
+        tmp.close()
+        path = tmp.name
+        simulate_file(path, args.n, args.rate)
+    n_lines, expected = digest(path)
+    size = os.path.getsize(path)
+    command = [sys.executable, SERVER, '-f', path,
+               '--window', str(args.window), '--level', str(args.level)]
+
+    server = None
+    try:
+        if args.transport == 'socket':
+            server = subprocess.Popen(command + ['--listen', '127.0.0.1:0'],
+                                      stdout=subprocess.PIPE,
+                                      universal_newlines=True)
+            port = int(re.search(r':(\d+)$',
+                                 server.stdout.readline().strip()).group(1))
+            transport = SocketTransport('127.0.0.1', port)
+        else:
+            transport = CommandTransport(command, 'stand-in')
+
+        print("Serving {} ({:.1f} MB, {} lines) to {} client(s) over a {}"
+              .format(path, size / 2**20, n_lines, args.clients,
+                      args.transport))
+        results = [dict() for _ in range(args.clients)]
+        threads = [Thread(target=follow,
+                          args=(transport, n_lines, args.drop_every, r))
+                   for r in results]
+        start = time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time() - start
+
+        print("{:<8} {:>9} {:>8} {:>10} {:>12} {:>12}"
+              .format("client", "time (s)", "MB/s", "wire/file",
+                      "largest read", "resumed ok"))
+        for i, r in enumerate(results):
+            ok = r['lines'] == n_lines and r['md5'] == expected
+            print("{:<8} {:>9.2f} {:>8.1f} {:>10.3f} {:>12} {:>12}"
+                  .format(i, r['time'], size / 2**20 / r['time'],
+                          r['wire'] / size, r['largest'],
+                          "{} ({} drops)".format(ok, r['drops'])))
+        print("Total {:.1f} MB/s".format(args.clients * size / 2**20 /
+                                         elapsed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if tmp is not None:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import argparse
+from time import time
+from datetime import datetime, timedelta
+import numpy as np
+from chec_operator.readers.timestamp import TimestampParser
+
+
+def simulate_lines(n, rate):
+    start = datetime(2017, 5, 4, 23, 0)
+    lines = []
+    for i in range(n):
+        dt = start + timedelta(seconds=i / rate)
+        lines.append("{} Temperature0 TM {} {:.2f}\n".format(
+            dt.strftime("%Y-%m-%d %H:%M:%S:%f"), i % 32, 25 + (i % 7) / 10))
+    return lines
+
+
+def strptime_path(lines):
+    out = []
+    for line in lines:
+        data = line.replace('\n', '').split(" ")
+        out.append(datetime.strptime("{} {}".format(data[0], data[1]),
+                                     "%Y-%m-%d %H:%M:%S:%f"))
+    return out
+
+
+def best_of(f, repeat):
+    t = []
+    for _ in range(repeat):
+        start = time()
+        result = f()
+        t.append(time() - start)
+    return min(t), result
+
+
+def main():
+    description = 'Benchmark the monitor timestamp parser against strptime'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-f', '--file', dest='input_path', action='store',
+                        default=None, help='monitor file to parse (lines '
+                                           'are simulated if not given)')
+    parser.add_argument('-n', dest='n', action='store', type=int,
+                        default=200000, help='number of simulated lines')
+    parser.add_argument('--rate', dest='rate', action='store', type=float,
+                        default=50, help='simulated lines per second')
+    parser.add_argument('-r', '--repeat', dest='repeat', action='store',
+                        type=int, default=3, help='repetitions (best is '
+                                                  'reported)')
+
+    args = parser.parse_args()
+
+    if args.input_path:
+        with open(args.input_path) as f:
+            lines = [l for l in f if l[:1].isdigit()]
+    else:
+        lines = simulate_lines(args.n, args.rate)
+    print("Parsing {} lines".format(len(lines)))
+
+    t_strptime, expected = best_of(lambda: strptime_path(lines), args.repeat)
+
+    def fast():
+        p = TimestampParser()
+        return [p.parse(line) for line in lines]
+    t_fast, result = best_of(fast, args.repeat)
+    assert result == expected
+
+    t_batch, times = best_of(lambda: TimestampParser.parse_many(lines),
+                             args.repeat)
+    assert (times == np.array(expected, dtype='datetime64[us]')).all()
+
+    print("{:<30} {:>10} {:>10}".format("", "time (s)", "speedup"))
+    for name, t in [("strptime", t_strptime),
+                    ("TimestampParser.parse", t_fast),
+                    ("TimestampParser.parse_many", t_batch)]:
+        print("{:<30} {:>10.3f} {:>9.1f}x".format(name, t, t_strptime / t))
+
+
+if __name__ == '__main__':
+    main()
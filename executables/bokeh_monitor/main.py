@@ -1,8 +1,13 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
 import numpy as np
-from bokeh.models import ColumnDataSource, Button, TapTool, Range1d
+from bokeh.models import ColumnDataSource, Button, TapTool, Range1d, Select
+from bokeh.models import DataTable, TableColumn
 from bokeh.plotting import figure, curdoc
-from bokeh.layouts import layout
+from bokeh.layouts import layout, widgetbox
 from chec_operator.threads import monitor as monitor_thread
+from chec_operator.readers.monitor import COMPONENTS
+from chec_operator.readers.alarms import LEVEL_NAMES
 from chec_operator.bokeh.camera import ModuleTriangleDisplay
 from chec_operator.geometry.modules import get_module_corner_triangle_coords
 
@@ -43,6 +48,8 @@ class TemperatureDisplay(InteractiveModuleTriangleDisplay):
         self.current_mc = None
         self.mask_counts = np.zeros(self.n_patches)
         self.last_image = np.ma.zeros(self.n_patches)
+        self.last_times = np.full(self.n_patches, np.datetime64('NaT'),
+                                  dtype='datetime64[us]')
 
     def _get_patch_coordinates(self):
         x, y = get_module_corner_triangle_coords()
@@ -51,8 +58,7 @@ class TemperatureDisplay(InteractiveModuleTriangleDisplay):
         cdsource_text_d = dict(x=[], y=[], text=[])
 
         # Add extra components
-        components = ['EX1', 'EX2', 'EX3', 'EX4', 'EX5',
-                      'DACQ1', 'DACQ2', 'chiller_ambient', 'chiller_water']
+        components = COMPONENTS[64:]
         bins = [5, 2]
         range_ = [[-0.2, 0.2], [0.2, 0.3]]
         _, x_edges, y_edges = np.histogram2d([], [], bins=bins, range=range_)
@@ -73,50 +79,19 @@ class TemperatureDisplay(InteractiveModuleTriangleDisplay):
         if not mc == self.current_mc and mc is not None:
             self.current_mc = mc
             self.mask_counts += 1
-            df = mc.df
-            try:
-                subdf = df.loc[['temperature']].set_index(['component'])
-            except KeyError:
-                return
+            # The component slots are in patch order
+            times, values = mc.latest('temperature')
+            times = times[:self.n_patches]
+            values = values[:self.n_patches]
+            n = len(values)
 
             image = self.last_image
-            for i in range(2):
-                for j in range(32):
-                    component = "TM{}_{}".format(j, i)
-                    try:
-                        patch = i+(2*j)
-                        image[patch] = (subdf.loc[component]['value'])
-                        self.mask_counts[patch] = 0
-                    except KeyError:
-                        pass
-
-            for i in range(5):
-                component = "EX{}".format(i+1)
-                try:
-                    image[64+i] = subdf.loc[component]['value']
-                    self.mask_counts[64+i] = 0
-                except KeyError:
-                    pass
-            try:
-                image[64+5] = subdf.loc['DACQ1']['value']
-                self.mask_counts[64 + 5] = 0
-            except KeyError:
-                pass
-            try:
-                image[64+6] = subdf.loc['DACQ2']['value']
-                self.mask_counts[64 + 6] = 0
-            except KeyError:
-                pass
-            try:
-                image[64+7] = subdf.loc['chiller_ambient']['value']
-                self.mask_counts[64 + 7] = 0
-            except KeyError:
-                pass
-            try:
-                image[64+8] = subdf.loc['chiller_water']['value']
-                self.mask_counts[64 + 8] = 0
-            except KeyError:
-                pass
+            last_times = self.last_times[:n]
+            updated = ~np.isnat(times) & (np.isnat(last_times) |
+                                          (times > last_times))
+            image[:n][updated] = values[updated]
+            self.mask_counts[:n][updated] = 0
+            self.last_times[:n][updated] = times[updated]
 
             self.image = image
             self.image.mask = self.mask_counts//10
@@ -126,6 +101,7 @@ class CategoryPlotter:
     def __init__(self, component_list, title='', y_range=(-5, 50)):
 
         self.component_list = component_list
+        self.slots = [COMPONENTS.index(c) for c in component_list]
 
         self.lines = []
         self.texts = []
@@ -174,8 +150,9 @@ class CategoryPlotter:
 
         self.layout = self.fig
 
-    def _update(self, subdf):
-        subdf = subdf.set_index(['component'])
+    def _update(self, times, values):
+        times = times[self.slots]
+        values = values[self.slots]
 
         # Update TMs
         cdsource_d = dict()
@@ -183,26 +160,22 @@ class CategoryPlotter:
         max_ = None
         x_min = None
         x_max = None
-        for c in self.component_list:
+        for c, t, v in zip(self.component_list, times, values):
             key_t = '{}_time'.format(c)
             key_v = '{}_value'.format(c)
             key_n = '{}_name'.format(c)
-            try:
-                t = subdf.loc[c]['dt']
-                v = subdf.loc[c]['value']
+            if not np.isnat(t):
                 if min_ is None or min_ > v:
                     min_ = v
                     x_min = t
                 elif max_ is None or max_ < v:
                     max_ = v
                     x_max = t
-            except KeyError:
+            else:
                 t = np.ma.zeros(1)
                 t.mask = True
                 v = np.ma.zeros(1)
                 v.mask = True
-                # t = self.cdsource.data[key_t][-1]
-                # v = self.cdsource.data[key_v][-1]
             cdsource_d[key_t] = [t]
             cdsource_d[key_v] = [v]
             cdsource_d[key_n] = [c]
@@ -238,8 +211,7 @@ class TemperaturePlotters(CategoryPlotter):
         for i in range(2):
             for j in range(32):
                 component_list.append("TM{}_{}".format(j, i))
-        component_list.extend(['EX1', 'EX2', 'EX3', 'EX4', 'EX5',
-                      'DACQ1', 'DACQ2', 'chiller_ambient', 'chiller_water'])
+        component_list.extend(COMPONENTS[64:])
         title = 'Temperature (degrees C)'
         super().__init__(component_list, title)
 
@@ -251,25 +223,164 @@ class TemperaturePlotters(CategoryPlotter):
         mc = monitor_thread.MONITOR_CONTAINER
         if not mc == self.current_mc and mc is not None:
             self.current_mc = mc
-            df = mc.df
-            try:
-                subdf = df.loc[['temperature']]
-            except KeyError:
-                return
-            super()._update(subdf)
+            super()._update(*mc.latest('temperature'))
+
+
+class HistoryPlotter:
+    """
+    Min/max band and mean of the components shown in the live plotter over
+    a selectable time range, decimated to the plot width by the monitor
+    history.
+    """
+    ranges = OrderedDict([('1 hour', timedelta(hours=1)),
+                          ('12 hours', timedelta(hours=12)),
+                          ('1 day', timedelta(days=1)),
+                          ('1 week', timedelta(weeks=1)),
+                          ('30 days', timedelta(days=30))])
+
+    def __init__(self, plotter, measurement='temperature', title=''):
+        self.plotter = plotter
+        self.measurement = measurement
+
+        self.select = Select(title="History range", value='12 hours',
+                             options=list(self.ranges.keys()))
+        self.select.on_change('value', lambda attr, old, new: self.update())
+
+        self.fig = figure(plot_width=800, plot_height=400, title=title,
+                          x_axis_type="datetime", y_axis_location="right",
+                          toolbar_location="left",
+                          tools="xpan,xwheel_zoom,xbox_zoom,reset")
+        self.cdsource_band = ColumnDataSource(data=dict(xs=[], ys=[]))
+        self.cdsource_mean = ColumnDataSource(data=dict(xs=[], ys=[]))
+        self.fig.patches('xs', 'ys', source=self.cdsource_band,
+                         color='red', alpha=0.2, line_alpha=0)
+        self.fig.multi_line('xs', 'ys', source=self.cdsource_mean)
+
+        self.layout = layout([[widgetbox(self.select)], [self.fig]])
+
+    def update(self):
+        history = monitor_thread.MONITOR_HISTORY
+        if history is None:
+            return
+        components = [c for c, line in zip(self.plotter.component_list,
+                                            self.plotter.lines)
+                      if line.visible]
+        stop = datetime.now()
+        start = stop - self.ranges[self.select.value]
+        series = history.query(self.measurement, components, start, stop,
+                               self.fig.plot_width)
+        band = dict(xs=[], ys=[])
+        mean = dict(xs=[], ys=[])
+        for s in series.values():
+            if not len(s['time']):
+                continue
+            t = s['time'].astype('datetime64[ms]').astype(np.int64)
+            band['xs'].append(np.concatenate([t, t[::-1]]))
+            band['ys'].append(np.concatenate([s['max'], s['min'][::-1]]))
+            mean['xs'].append(t)
+            mean['ys'].append(s['mean'])
+        self.cdsource_band.data = band
+        self.cdsource_mean.data = mean
+
+
+class AlarmTable:
+    """
+    The latest alarm events, newest first.
+    """
+    def __init__(self, n_rows=200):
+        self.n_rows = n_rows
+        self.last = 0
+        keys = ['time', 'level', 'measurement', 'component', 'value',
+                'change']
+        self.cdsource = ColumnDataSource(data={k: [] for k in keys})
+        columns = [TableColumn(field=k, title=k.capitalize()) for k in keys]
+        self.table = DataTable(source=self.cdsource, columns=columns,
+                               width=800, height=200)
+        self.layout = widgetbox(self.table)
+
+    def update(self):
+        alarms = monitor_thread.MONITOR_ALARMS
+        if alarms is None:
+            return
+        events = alarms.events_since(self.last)
+        if not events:
+            return
+        self.last = events[-1].number
+        events = events[::-1][:self.n_rows]
+        new = dict(
+            time=[str(e.time) for e in events],
+            level=[LEVEL_NAMES[e.level] for e in events],
+            measurement=[e.measurement for e in events],
+            component=[e.component for e in events],
+            value=['{:.3g}'.format(e.value) for e in events],
+            change=['{} -> {}{}'.format(
+                LEVEL_NAMES[e.previous], LEVEL_NAMES[e.level],
+                ', ' + e.reason if e.reason else '') for e in events],
+        )
+        data = self.cdsource.data
+        self.cdsource.data = {k: (new[k] + list(data[k]))[:self.n_rows]
+                              for k in new}
+
+
+class RollingTable:
+    """
+    Rolling mean, standard deviation, min and max of the temperatures over
+    a selectable window, kept up to date by the monitor container.
+    """
+    def __init__(self, measurement='temperature'):
+        self.measurement = measurement
+        self.current_mc = None
+        self.select = Select(title="Rolling window", value='1 min',
+                             options=['1 min', '10 min', '1 hour'])
+        self.select.on_change('value',
+                              lambda attr, old, new: self.update(True))
+        keys = ['component', 'count', 'mean', 'std', 'min', 'max']
+        self.cdsource = ColumnDataSource(data={k: [] for k in keys})
+        columns = [TableColumn(field=k, title=k.capitalize()) for k in keys]
+        self.table = DataTable(source=self.cdsource, columns=columns,
+                               width=800, height=300)
+        self.layout = widgetbox(self.select, self.table)
+
+    def update(self, force=False):
+        mc = monitor_thread.MONITOR_CONTAINER
+        if mc is None or (mc == self.current_mc and not force):
+            return
+        self.current_mc = mc
+        stats = mc.rolling_stats(self.measurement)
+        if stats is None:
+            return
+        window = self.select.options.index(self.select.value)
+        if window >= len(stats['windows']):
+            return
+        count = stats['count'][window]
+        slots = np.flatnonzero(count)
+        data = dict(component=[mc.components[c] for c in slots],
+                    count=count[slots].astype(int).tolist())
+        for name in ['mean', 'std', 'min', 'max']:
+            data[name] = ['{:.2f}'.format(v)
+                          for v in stats[name][window][slots]]
+        self.cdsource.data = data
 
 
 def main():
     p_temperature = TemperaturePlotters()
+    p_history = HistoryPlotter(p_temperature,
+                               title='Temperature history (degrees C)')
 
     l_temperature = p_temperature.layout
     l_temperature_display = p_temperature.camera.layout
+    l_history = p_history.layout
+    t_alarms = AlarmTable()
+    t_rolling = RollingTable()
 
     # Widgets
 
     # Setup layout
     l = layout([
-        [l_temperature, l_temperature_display]
+        [l_temperature, l_temperature_display],
+        [l_history],
+        [t_alarms.layout],
+        [t_rolling.layout]
     ])
 
     def temperature_update():
@@ -277,6 +388,9 @@ def main():
         p_temperature.camera.update()
 
     curdoc().add_periodic_callback(temperature_update, 100)
+    curdoc().add_periodic_callback(p_history.update, 5000)
+    curdoc().add_periodic_callback(t_alarms.update, 1000)
+    curdoc().add_periodic_callback(t_rolling.update, 1000)
     curdoc().add_root(l)
     curdoc().title = "Monitor"
 
@@ -8,12 +8,33 @@ def on_server_loaded(server_context):
     description = 'Parser for thread creator'
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument('-f', '--file', dest='monitor_path', action='store',
-                        default=None, help='path to the monitor file')
+                        default=None,
+                        help='monitor file, or directory or glob of monitor '
+                             'files')
+    parser.add_argument('--archive', dest='archive_path', action='store',
+                        default=None, help='directory of the monitor archive '
+                                           'to backfill from and append to')
+    parser.add_argument('-p', '--processes', dest='processes', action='store',
+                        type=int, default=1,
+                        help='processes parsing the monitor file backlog on '
+                             'start')
+    parser.add_argument('--alarms', dest='limits_path', action='store',
+                        default=None,
+                        help='alarm limits file (default: '
+                             'chec_operator/config/alarms.cfg)')
+    parser.add_argument('--alarm-log', dest='alarm_log', action='store',
+                        default=None, help='file the alarm events are '
+                                           'appended to')
     parser.add_argument('--ssh', dest='ssh', action='store',
-                        default=None, help='connect to file via ssh')
+                        default=None,
+                        help='[user@]host to follow the monitor file on, '
+                             'over ssh (needs chec_operator installed '
+                             'there)')
 
     args = parser.parse_known_args()[0]
 
-    t = Thread(target=monitor_thread.watch_monitor, args=(args.monitor_path,))
+    t = Thread(target=monitor_thread.watch_monitor,
+               args=(args.monitor_path, args.archive_path, args.processes,
+                     args.limits_path, args.alarm_log, args.ssh))
     t.setDaemon(True)
     t.start()
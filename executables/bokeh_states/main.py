@@ -1,4 +1,5 @@
-from bokeh.models import Button, RadioButtonGroup, Div, Select, TextInput
+from bokeh.models import Button, RadioButtonGroup, Div, Select, TextInput, \
+    CheckboxGroup
 from bokeh.plotting import curdoc
 from bokeh.layouts import layout, widgetbox
 from chec_operator.threads import server as server_thread
@@ -518,6 +519,106 @@ class FileButtons:
                 button.label = "{}: {}".format(type_.upper(), path)
 
 
+class CameraPoolButtons:
+    def __init__(self):
+        self.pool = server_thread.CAMERA_POOL
+        self.handler = server_thread.SERVER_HANDLER
+
+        t_pool = Div(text="<h1><u>Cameras</u></h1>")
+        names = self.pool.names
+        self.w_select = CheckboxGroup(labels=names,
+                                      active=list(range(len(names))))
+        self.d_status = Div(text="", width=600)
+
+        self.b_state_dict = {}
+        for state in self.handler.known_states:
+            b = Button(label="SELECTED TO {}".format(state.name), width=200)
+            f = partial(self.transition, state)
+            b.on_click(f)
+            self.b_state_dict[state] = b
+
+        wb_list = [
+            [t_pool],
+            [self.w_select, self.d_status],
+            [widgetbox(list(self.b_state_dict.values()))],
+        ]
+        self.layout = layout(wb_list)
+
+    def selected(self):
+        return [self.pool.names[i] for i in self.w_select.active]
+
+    def transition(self, new_state):
+        for button in self.b_state_dict.values():
+            button.disabled = True
+        self.pool.go_to_state(new_state, self.selected())
+
+    def update(self):
+        html = "<table><tr><th>Camera</th><th>State</th><th>HV</th>" \
+               "<th>Data Sending</th></tr>"
+        for name, status in self.pool.get_status().items():
+            if status is None:
+                continue
+            html += "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>" \
+                .format(name, status.state.name, status.hv.name,
+                        status.data_sending.name)
+        html += "</table>"
+        self.d_status.text = html
+
+        selected = self.selected()
+        common = self.pool.get_common_transitions(selected)
+        aggregate = self.pool.get_aggregate_state(selected)
+        for state, button in self.b_state_dict.items():
+            if state == aggregate:
+                button.button_type = 'success'
+                button.disabled = True
+            elif state in common:
+                button.button_type = 'primary'
+                button.disabled = False
+            else:
+                button.button_type = 'default'
+                button.disabled = True
+
+
+class CommandStatsDisplay:
+    def __init__(self):
+        self.handler = server_thread.SERVER_HANDLER
+
+        t_stats = Div(text="<h1><u>Camera Server Latency</u></h1>")
+        self.d_stats = Div(text="", width=800)
+        t_queue = Div(text="<h3>Time waiting in the command queue</h3>")
+        self.d_queue = Div(text="", width=800)
+
+        wb_list = [
+            [t_stats],
+            [self.d_stats],
+            [t_queue],
+            [self.d_queue],
+        ]
+        self.layout = layout(wb_list)
+
+    @staticmethod
+    def _table(rows):
+        header = ["Command", "Count", "Timeouts", "Errors", "Mean (ms)",
+                  "p50 (ms)", "p95 (ms)", "p99 (ms)", "Max (ms)"]
+        html = "<table><tr>"
+        html += "".join("<th>{}</th>".format(h) for h in header)
+        html += "</tr>"
+        for row in rows:
+            cells = [row['command'], row['count'], row['timeouts'],
+                     row['errors']]
+            cells += ["{:.1f}".format(row[k] * 1e3) for k in
+                      ['mean', 'p50', 'p95', 'p99', 'max']]
+            html += "<tr>"
+            html += "".join("<td>{}</td>".format(c) for c in cells)
+            html += "</tr>"
+        html += "</table>"
+        return html
+
+    def update(self):
+        self.d_stats.text = self._table(self.handler.get_command_stats())
+        self.d_queue.text = self._table(self.handler.get_queue_stats())
+
+
 def main():
 
     # Wait for state to be set
@@ -537,6 +638,7 @@ def main():
     w_runs = RunButtons()
     w_expert = ExpertButtons()
     w_files = FileButtons()
+    w_stats = CommandStatsDisplay()
 
     w_connection = ConnectionButtons(w_secondary)
 
@@ -547,20 +649,28 @@ def main():
     l_runs = w_runs.layout
     l_expert = w_expert.layout
     l_files = w_files.layout
+    l_stats = w_stats.layout
 
     # Setup layout
-    l = layout([
+    rows = [
         [l_connection],
         [l_states, l_secondary, l_runs],
         [l_expert],
-        [l_files]
-    ])
+        [l_files],
+        [l_stats]
+    ]
+    if server_thread.CAMERA_POOL:
+        w_pool = CameraPoolButtons()
+        rows.insert(2, [w_pool.layout])
+        curdoc().add_periodic_callback(w_pool.update, 500)
+    l = layout(rows)
 
     curdoc().add_periodic_callback(w_states.update, 100)
     curdoc().add_periodic_callback(w_secondary.update, 100)
     curdoc().add_periodic_callback(w_runs.update, 100)
     curdoc().add_periodic_callback(w_expert.update, 100)
     curdoc().add_periodic_callback(w_files.update, 100)
+    curdoc().add_periodic_callback(w_stats.update, 1000)
     curdoc().add_root(l)
     curdoc().title = "States"
 
@@ -9,12 +9,29 @@ def on_server_loaded(server_context):
     add = parser.add_argument
     add('--dummy', dest='dummy', action='store_true', default=False,
         help='create a dummy communicator (no connection to server)')
+    add('--asyncio', dest='use_asyncio', action='store_true', default=False,
+        help='use the asyncio communicator, which enforces a timeout on '
+             'every camera server command')
+    add('--filepath-interval', dest='filepath_interval', action='store',
+        type=float, default=30,
+        help='seconds between revalidations of the cached file paths')
+    add('--camera', dest='cameras', action='append', default=[],
+        help='name=ip of a camera to operate (may be repeated to operate '
+             'several cameras, the first is the primary)')
 
     args = parser.parse_known_args()[0]
 
     comm_lock = RLock()
 
-    args = (args.dummy, comm_lock)
-    t = Thread(target=state_thread.poll_state, args=args)
+    if args.cameras:
+        cameras = [tuple(c.split('=', 1)) for c in args.cameras]
+        target = state_thread.poll_pool
+        args = (cameras, args.dummy, comm_lock, args.use_asyncio,
+                args.filepath_interval)
+    else:
+        target = state_thread.poll_state
+        args = (args.dummy, comm_lock, args.use_asyncio,
+                args.filepath_interval)
+    t = Thread(target=target, args=args)
     t.setDaemon(True)
     t.start()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+"""
+Emulates the stdin/stdout protocol of control_cs so that `Communicator` can
+be exercised end to end without a camera. It accepts the same command line
+as control_cs (ip, -f log and --trust), so it can be used as the exe of a
+`Communicator.connect`, e.g.
+
+    c.connect(exe_path="python executables/control_cs_emulator.py "
+                       "--latency state=0.01 --fail-rate 0.01")
+"""
+import argparse
+import random
+import sys
+from time import sleep
+from chec_operator.utils.enums import CameraState, OnOffState, \
+    CameraTriggerSettings
+
+cs = CameraState
+ALLOWED_TRANSITIONS = {
+    cs.DISCONNECTED: [],
+    cs.UNKNOWN: [cs.SAFE],
+    cs.OFF: [cs.SAFE],
+    cs.SAFE: [cs.STANDBY, cs.OFF],
+    cs.STANDBY: [cs.READY, cs.MAINTENANCE, cs.SAFE, cs.STANDBY],
+    cs.READY: [cs.OBSERVING, cs.CALIBRATION, cs.MAINTENANCE, cs.SAFE,
+               cs.READY],
+    cs.OBSERVING: [cs.READY, cs.SAFE],
+    cs.CALIBRATION: [cs.READY, cs.SAFE],
+    cs.MAINTENANCE: [cs.READY, cs.SAFE],
+    cs.FAULT: [cs.MAINTENANCE]
+}
+
+# get command -> set command for each configuration file
+FILE_COMMANDS = {
+    'getconfig': 'configfile',
+    'getmon': 'monfile',
+    'getset': 'setfile',
+    'getrun': 'runfile',
+    'gethv': 'hvfile',
+    'getled': 'ledfile',
+    'gettrigger': 'trifile',
+}
+
+SWITCH_COMMANDS = {
+    'hvon': ('hv', OnOffState.ON),
+    'hvoff': ('hv', OnOffState.OFF),
+    'enflasher': ('flasher', OnOffState.ON),
+    'disflasher': ('flasher', OnOffState.OFF),
+    'daon': ('data_sending', OnOffState.ON),
+    'daoff': ('data_sending', OnOffState.OFF),
+}
+
+
+class CameraServerEmulator:
+    def __init__(self, args):
+        self.prompt = 'CS> '
+        self.done = 'done'
+        self.latency = args.default_latency
+        self.latencies = dict()
+        for item in args.latency:
+            cmd, seconds = item.split('=')
+            self.latencies[cmd] = float(seconds)
+        self.jitter = args.jitter
+        self.transition_time = args.transition_time
+        self.fail_rate = args.fail_rate
+        self.fail_cmds = set(args.fail_cmd)
+        self.fail_mode = args.fail_mode
+        self.hang_time = args.hang_time
+        self.noise_rate = args.noise_rate
+        self.random = random.Random(args.seed)
+
+        self.state = CameraState.SAFE
+        self.switches = dict(hv=OnOffState.OFF,
+                             flasher=OnOffState.OFF,
+                             data_sending=OnOffState.OFF)
+        self.trigger = CameraTriggerSettings.INTERNAL
+        self.default_files = {k: '/emulator/config/{}.cfg'.format(v)
+                              for k, v in FILE_COMMANDS.items()}
+        self.files = dict(self.default_files)
+        self._pending_log = []
+
+    def write(self, text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    def _sleep(self, cmd):
+        seconds = self.latencies.get(cmd, self.latency)
+        if self.jitter:
+            seconds += self.random.uniform(-self.jitter, self.jitter)
+        if seconds > 0:
+            sleep(seconds)
+
+    def _fails(self, cmd):
+        if self.fail_cmds and cmd not in self.fail_cmds:
+            return False
+        return self.random.random() < self.fail_rate
+
+    def _get(self, cmd):
+        if cmd == 'state':
+            return "Current state: {}".format(self.state.name.lower())
+        if cmd == 'transition':
+            return " ".join(s.name.lower()
+                            for s in ALLOWED_TRANSITIONS[self.state])
+        if cmd == 'hvch':
+            return "HV: {}".format(int(self.switches['hv']))
+        if cmd == 'flch':
+            return "Flasher: {}".format(int(self.switches['flasher']))
+        if cmd == 'dach':
+            return "Data sending: {}".format(
+                int(self.switches['data_sending']))
+        if cmd == 'trch':
+            return "Trigger type: {}".format(int(self.trigger))
+        if cmd in FILE_COMMANDS:
+            return "File: {}".format(self.files[cmd])
+        return None
+
+    def _set(self, cmd, arg):
+        if cmd in SWITCH_COMMANDS:
+            switch, value = SWITCH_COMMANDS[cmd]
+            self.switches[switch] = value
+            return True
+        if cmd.startswith('to') and cmd[2:].upper() in CameraState.__members__:
+            req_state = CameraState[cmd[2:].upper()]
+            if self.transition_time:
+                sleep(self.transition_time)
+            if req_state in ALLOWED_TRANSITIONS[self.state]:
+                self.state = req_state
+            else:
+                self.log("Transition refused: {} -> {}"
+                         .format(self.state.name, req_state.name))
+            return True
+        for get_cmd, set_cmd in FILE_COMMANDS.items():
+            if cmd == set_cmd:
+                fp = arg if arg else self.default_files[get_cmd]
+                self.files[get_cmd] = fp
+                if set_cmd == 'trifile':
+                    if "external" in fp.lower():
+                        self.trigger = CameraTriggerSettings.EXTERNAL
+                    elif "threshold" in fp.lower():
+                        self.trigger = CameraTriggerSettings.INTERNAL
+                return True
+        return False
+
+    def log(self, msg):
+        # Held back until the reply is complete, so it never follows a prompt
+        self._pending_log.append("[LOG] {}\n".format(msg))
+
+    def flush_log(self):
+        for line in self._pending_log:
+            self.write(line)
+        self._pending_log = []
+
+    def respond(self, line):
+        """
+        Replies to a single command. Returns False if the reply was dropped.
+        """
+        parts = line.split(maxsplit=1)
+        cmd = parts[0]
+        arg = parts[1] if len(parts) > 1 else ''
+        self._sleep(cmd)
+
+        response = self._get(cmd)
+        if response is None and not self._set(cmd, arg):
+            self.log("Unknown command: {}".format(cmd))
+
+        if self._fails(cmd):
+            if self.fail_mode == 'drop':
+                return False
+            elif self.fail_mode == 'garble':
+                self.write("garbled reply\n")
+                if response is not None:
+                    self.write("garbled reply\n")
+                return True
+            elif self.fail_mode == 'hang':
+                sleep(self.hang_time)
+
+        if response is not None:
+            self.write("{}\n".format(response))
+        self.write("{}\n".format(self.done))
+        return True
+
+    def run(self, ip, log_path):
+        self.write("Camera server emulator\n")
+        self.write("Connecting to camera at {}\n".format(ip))
+        self.write("Logging to {}\n".format(log_path))
+        self.write(self.prompt)
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            if line == 'exit':
+                break
+            if not self.respond(line):
+                # Dropped: no reply and no new prompt
+                continue
+            if self.noise_rate and self.random.random() < self.noise_rate:
+                self.log("Unsolicited message")
+            self.flush_log()
+            self.write(self.prompt)
+
+
+def main():
+    description = 'Emulate the control_cs camera server protocol'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('ip', nargs='?', default='0.0.0.0',
+                        help='camera ip (ignored)')
+    parser.add_argument('-f', dest='log_path', action='store', default='',
+                        help='log path (ignored)')
+    parser.add_argument('--trust', dest='trust', action='store_true',
+                        help='ignored, accepted for compatibility')
+    parser.add_argument('--default-latency', dest='default_latency',
+                        action='store', type=float, default=0,
+                        help='seconds taken to answer any command')
+    parser.add_argument('--latency', dest='latency', action='append',
+                        default=[], help='per-command latency, cmd=seconds '
+                                         '(may be repeated)')
+    parser.add_argument('--jitter', dest='jitter', action='store',
+                        type=float, default=0,
+                        help='uniform random jitter added to the latency')
+    parser.add_argument('--transition-time', dest='transition_time',
+                        action='store', type=float, default=0,
+                        help='extra seconds taken by state transitions')
+    parser.add_argument('--fail-rate', dest='fail_rate', action='store',
+                        type=float, default=0,
+                        help='probability that a command fails')
+    parser.add_argument('--fail-cmd', dest='fail_cmd', action='append',
+                        default=[], help='restrict failures to this command '
+                                         '(may be repeated)')
+    parser.add_argument('--fail-mode', dest='fail_mode', action='store',
+                        default='drop', choices=['drop', 'garble', 'hang'],
+                        help='how a failing command misbehaves')
+    parser.add_argument('--hang-time', dest='hang_time', action='store',
+                        type=float, default=30,
+                        help='seconds a reply is delayed in hang mode')
+    parser.add_argument('--noise-rate', dest='noise_rate', action='store',
+                        type=float, default=0,
+                        help='probability of an unsolicited log line after '
+                             'each reply')
+    parser.add_argument('--seed', dest='seed', action='store', type=int,
+                        default=None, help='random seed')
+
+    args = parser.parse_args()
+
+    CameraServerEmulator(args).run(args.ip, args.log_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import argparse
+from chec_operator.readers.remote import serve, listen
+
+
+def main():
+    description = 'Serve a monitor file to remote monitor GUIs, over ' \
+                  'stdin/stdout (as started by ssh) or a TCP port'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-f', '--file', dest='monitor_path', action='store',
+                        required=True, help='monitor file to serve')
+    parser.add_argument('--listen', dest='listen', action='store',
+                        default=None,
+                        help='[host:]port to listen on, instead of serving '
+                             'a single client over stdin/stdout')
+    parser.add_argument('--window', dest='window', action='store', type=int,
+                        default=2**22,
+                        help='bytes sent ahead of the client '
+                             'acknowledgement')
+    parser.add_argument('--level', dest='level', action='store', type=int,
+                        default=1, help='zlib compression level')
+
+    args = parser.parse_args()
+
+    kwargs = dict(window=args.window, level=args.level)
+    if args.listen is None:
+        serve(args.monitor_path, **kwargs)
+    else:
+        host, _, port = args.listen.rpartition(':')
+        listen(args.monitor_path, host, int(port), **kwargs)
+
+
+if __name__ == '__main__':
+    main()